@@ -0,0 +1,6 @@
+"""Performance benchmarks.
+
+These are not part of the test suite; run them as modules, e.g.
+
+    python -m benchmarks.market_store --orders 300000
+"""
@@ -0,0 +1,70 @@
+"""Synthetic market data shared by the benchmarks."""
+import datetime
+import random
+import time
+import tracemalloc
+
+from evetele import storage
+
+
+def esi_orders(n, **kwargs):
+    """List of `n` ESI-shaped market order records for one region."""
+    return list(iter_esi_orders(n, **kwargs))
+
+
+def iter_esi_orders(n, n_systems=100, n_locations=500, n_types=5000,
+                    seed=0):
+    """Generate `n` ESI-shaped market order records for one region."""
+    rng = random.Random(seed)
+    systems = [30000000 + i for i in range(n_systems)]
+    locations = [(60000000 + i, rng.choice(systems))
+                 for i in range(n_locations)]
+    epoch = datetime.datetime(2018, 7, 1)
+    for i in range(n):
+        location_id, system_id = rng.choice(locations)
+        is_buy_order = rng.random() < 0.4
+        issued = epoch + datetime.timedelta(seconds=rng.randrange(10**6))
+        volume_total = rng.randrange(1, 10**5)
+        yield {
+            'duration': rng.choice([30, 90]),
+            'is_buy_order': is_buy_order,
+            'issued': issued.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'location_id': location_id,
+            'min_volume': 1,
+            'order_id': 5000000000 + i,
+            'price': round(rng.uniform(1, 10**6), 2),
+            'range': (rng.choice(storage.ORDER_RANGES)
+                      if is_buy_order else 'region'),
+            'system_id': system_id,
+            'type_id': rng.randrange(n_types),
+            'volume_remain': rng.randrange(1, volume_total + 1),
+            'volume_total': volume_total,
+        }
+
+
+def time_call(func, *args, **kwargs):
+    """Call `func` and return (result, seconds), without tracing."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def measure(func, *args, **kwargs):
+    """Call `func` and return (result, seconds, bytes retained)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    retained, __ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained
+
+
+def report(label, seconds, nbytes=None, n=None):
+    """Print a single benchmark result line."""
+    parts = ['{:<40}'.format(label), '{:9.3f} s'.format(seconds)]
+    if n is not None:
+        parts.append('{:12,.0f} rows/s'.format(n / seconds))
+    if nbytes is not None:
+        parts.append('{:10.1f} MiB'.format(nbytes / 2**20))
+    print('  '.join(parts))
@@ -0,0 +1,62 @@
+"""Throughput of the parallel market export importer.
+
+Builds a gzipped tar archive of synthetic regional exports and
+imports it with `archive.ArchiveImporter` using increasing numbers of
+worker processes. The CPU time of the importing process itself, which
+the workers can't share, is reported too.
+"""
+import argparse
+import os
+import tarfile
+import tempfile
+import time
+
+from evetele import archive
+
+from ._data import report, time_call
+from .market_log import write_log
+
+
+def write_archive(path, files, orders):
+    """Write a .tar.gz of `files` exports of `orders` orders each.
+
+    Exports are successive snapshots of the same orders.
+    """
+    directory = os.path.dirname(path)
+    with tarfile.open(path, 'w:gz') as archive_file:
+        for i in range(files):
+            name = 'The Forge-Tritanium-2018.07.{:02d} {:06d}.txt'.format(
+                1 + i // 24, (i % 24) * 10000
+            )
+            member = os.path.join(directory, name)
+            write_log(member, orders)
+            archive_file.add(member, arcname=name)
+            os.remove(member)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=32)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'Marketlogs.tar.gz')
+        write_archive(path, args.files, args.orders)
+        rows = args.files * args.orders
+
+        print('{:,} exports of {:,} orders'.format(args.files,
+                                                   args.orders))
+        for workers in args.workers:
+            importer = archive.ArchiveImporter(workers=workers)
+            cpu = time.process_time()
+            __, elapsed = time_call(importer.run, path)
+            cpu = time.process_time() - cpu
+            report('{} worker(s)'.format(workers), elapsed, n=rows)
+            report('  CPU time in this process', cpu)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Memory footprint of the market order classes.
+
+Compares `storage.TreeOrderStore` holding `trade.MarketOrderSnapshot`
+(the default) with `trade.CompactMarketOrderSnapshot`, and the
+columnar store for reference, for a single region update, and the
+time to scan the tree stores' orders.
+"""
+import argparse
+import time
+
+from evetele import storage, trade, util
+
+from ._data import iter_esi_orders, measure, report
+
+
+REGION_ID = 10000002
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=500000)
+    args = parser.parse_args(argv)
+
+    t = util.get_utc_datetime()
+    stores = [
+        ('tree/MarketOrderSnapshot', storage.TreeOrderStore),
+        ('tree/CompactMarketOrderSnapshot',
+         lambda: storage.TreeOrderStore(
+             order_class=trade.CompactMarketOrderSnapshot
+         )),
+        ('columnar', storage.ColumnarOrderStore),
+    ]
+
+    print('{:,} orders in one region'.format(args.orders))
+    for name, factory in stores:
+        # Records are generated lazily so any the store retains are
+        # counted against it.
+        store = factory()
+        __, elapsed, retained = measure(store.update, REGION_ID,
+                                        iter_esi_orders(args.orders), t)
+        report(name, elapsed, retained, args.orders)
+        if isinstance(store, storage.ColumnarOrderStore):
+            # Orders are materialised on access; see market_store.
+            continue
+
+        orders = store.orders_by_id(REGION_ID)
+        start = time.perf_counter()
+        sum(order['price'] * order['volume_remain']
+            for order in orders.values())
+        report('{} scan'.format(name), time.perf_counter() - start,
+               n=args.orders)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Breadth-first searches over `static.JumpGraph`.
+
+Uses a synthetic stargate network the size of New Eden (about 8,000
+systems): a random spanning tree plus extra random connections, with
+random security statuses.
+"""
+import argparse
+import random
+import time
+
+from evetele import static
+
+from ._data import report
+
+
+def synthetic_network(n_systems, n_extra, seed=0):
+    rng = random.Random(seed)
+    adjacency = {30000000 + i: set() for i in range(n_systems)}
+    systems = list(adjacency)
+    for i, system_id in enumerate(systems[1:], 1):
+        other = systems[rng.randrange(i)]
+        adjacency[system_id].add(other)
+        adjacency[other].add(system_id)
+    for __ in range(n_extra):
+        a, b = rng.sample(systems, 2)
+        adjacency[a].add(b)
+        adjacency[b].add(a)
+    security = {system_id: rng.uniform(-1, 1) for system_id in systems}
+    return adjacency, security
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--systems', type=int, default=8000)
+    parser.add_argument('--extra-jumps', type=int, default=3000)
+    parser.add_argument('--searches', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    adjacency, security = synthetic_network(args.systems,
+                                            args.extra_jumps)
+    start = time.perf_counter()
+    graph = static.JumpGraph.from_adjacency(adjacency, security)
+    report('build', time.perf_counter() - start)
+
+    rng = random.Random(1)
+    systems = list(adjacency)
+    sources = [rng.choice(systems) for __ in range(args.searches)]
+    for highsec in (False, True):
+        start = time.perf_counter()
+        for source in sources:
+            graph.distances(source, highsec=highsec)
+        elapsed = time.perf_counter() - start
+        report('{} single-source BFS (highsec={})'.format(
+            args.searches, highsec), elapsed)
+        print('  {:.2f} ms per search'.format(
+            1000 * elapsed / args.searches))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Parsing speed of client market log exports.
+
+Compares the original `csv.DictReader` parser of
+`local.MarketLogFile` with the current compiled column plan, building
+`SimpleMarketOrder` objects, and with `read_columns`, building NumPy
+arrays, on a synthetic regional export. Lazy mode is timed opening
+the export and selecting the orders of one type.
+
+`read_columns` splits the whole export at once and converts each
+column in one call, so it should beat building order objects; the
+speed-up over the compiled plan is reported.
+"""
+import argparse
+import ast
+import csv
+import os
+import tempfile
+from decimal import Decimal
+
+from evetele import local, trade, util
+
+from ._data import iter_esi_orders, measure, report, time_call
+
+
+HEADER = (
+    'orderID,typeID,charID,charName,regionID,regionName,stationID,'
+    'stationName,range,bid,price,volEntered,volRemaining,issueDate,'
+    'orderState,minVolume,accountID,duration,isCorp,solarSystemID,'
+    'solarSystemName,escrow,'
+)
+
+# Client range values for the ESI ranges.
+RANGES = {'station': -1, 'solarsystem': 0, 'region': 32767}
+
+
+def write_log(path, n):
+    """Write `n` synthetic orders in the client's export format."""
+    with open(path, 'w') as f:
+        f.write(HEADER + '\n')
+        for order in iter_esi_orders(n):
+            f.write(','.join(str(value) for value in (
+                order['order_id'], order['type_id'], 1234567890,
+                'ACharacter', 10000002, 'The Forge',
+                order['location_id'], 'Station',
+                RANGES.get(order['range'], order['range']),
+                order['is_buy_order'], order['price'],
+                order['volume_total'],
+                '{:.1f}'.format(order['volume_remain']),
+                order['issued'].replace('T', ' ')[:-1] + '.000', 0,
+                order['min_volume'], 1234567, order['duration'],
+                False, order['system_id'], 'System', 0.0,
+            )) + ',\n')
+
+
+def legacy_orders(path):
+    """The original per-field DictReader parser, for comparison."""
+    field_mapping = {
+        'bid': {'name': 'is_buy_order', 'cast': ast.literal_eval},
+        'issueDate': {'name': 'issued', 'cast': lambda s: s + 'Z'},
+        'orderID': {'cast': int},
+        'price': {'cast': Decimal},
+        'regionID': {'cast': int},
+        'solarSystemID': {'name': 'system_id', 'cast': int},
+        'stationID': {'name': 'location_id', 'cast': int},
+        'typeID': {'cast': int},
+    }
+    orders = []
+    with open(path, 'r') as f:
+        for record in csv.DictReader(f):
+            data = {}
+            for field, value in record.items():
+                mapping = field_mapping.get(field, {})
+                name = mapping.get('name',
+                                   util.camelcase_to_snakecase(field))
+                cast = mapping.get('cast', lambda v: v)
+                data[name] = cast(value)
+            orders.append(trade.SimpleMarketOrder(data))
+    return orders
+
+
+def filter_lazy(path):
+    """Open an export lazily and select the orders of one type."""
+    with local.MarketLogFile(path=path, lazy=True) as log_file:
+        return log_file.filter(type_id=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'The Forge-Export.txt')
+        write_log(path, args.orders)
+
+        print('{:,} orders in one export'.format(args.orders))
+        timings = {}
+        for name, parse in (
+                ('DictReader (original)', legacy_orders),
+                ('compiled plan', lambda p: local.MarketLogFile(path=p)),
+                ('read_columns',
+                 lambda p: local.MarketLogFile.read_columns(path=p)),
+                ('lazy, filter one type', filter_lazy)):
+            # Memory tracing slows the allocation heavy parsers
+            # unevenly, so time a separate, untraced run.
+            __, elapsed = time_call(parse, path)
+            __, __, retained = measure(parse, path)
+            report(name, elapsed, retained, args.orders)
+            timings[name] = elapsed
+        print('read_columns is {:.1f}x as fast as the compiled plan'.format(
+            timings['compiled plan'] / timings['read_columns']
+        ))
+
+
+if __name__ == '__main__':
+    main()
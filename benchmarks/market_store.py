@@ -0,0 +1,83 @@
+"""Memory and throughput of the market order stores.
+
+Compares `storage.TreeOrderStore` (nested dicts of
+`MarketOrderSnapshot` lists) with `storage.ColumnarOrderStore` for a
+single region update, a full scan and leaf lookups.
+"""
+import argparse
+import random
+import time
+
+from evetele import storage, util
+
+from ._data import esi_orders, iter_esi_orders, measure, report
+
+
+REGION_ID = 10000002
+
+
+def scan_tree(store):
+    # Value of all sell orders, walking every leaf.
+    total = 0.0
+    for system_node in store[REGION_ID].values():
+        for location_node in system_node.values():
+            for orders in location_node.values():
+                for order in orders:
+                    if not order.is_buy_order:
+                        total += order['price'] * order['volume_remain']
+    return total
+
+
+def scan_columnar(store):
+    # Value of all sell orders, vectorised over the region's columns.
+    columns = store.columns(REGION_ID)
+    sell = ~columns['is_buy_order']
+    return float((columns['price'][sell]
+                  * columns['volume_remain'][sell]).sum())
+
+
+def lookups(store, keys):
+    region_node = store[REGION_ID]
+    return sum(len(region_node[s][l][t]) for s, l, t in keys)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=300000)
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    records = esi_orders(args.orders)
+    t = util.get_utc_datetime()
+    rng = random.Random(1)
+    keys = [(r['system_id'], r['location_id'], r['type_id'])
+            for r in rng.sample(records, args.lookups)]
+
+    print('{:,} orders in one region'.format(args.orders))
+    for name, cls, scan in [('tree', storage.TreeOrderStore, scan_tree),
+                            ('columnar', storage.ColumnarOrderStore,
+                             scan_columnar)]:
+        # Memory retained by the store, including any record dicts it
+        # keeps hold of (records are generated lazily for this).
+        __, __, retained = measure(cls().update, REGION_ID,
+                                   iter_esi_orders(args.orders), t)
+
+        store = cls()
+        start = time.perf_counter()
+        store.update(REGION_ID, records, t)
+        report('{} update'.format(name), time.perf_counter() - start,
+               retained, args.orders)
+
+        start = time.perf_counter()
+        scan(store)
+        report('{} scan'.format(name), time.perf_counter() - start,
+               n=args.orders)
+
+        start = time.perf_counter()
+        lookups(store, keys)
+        report('{} {} leaf lookups'.format(name, args.lookups),
+               time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
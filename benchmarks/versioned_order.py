@@ -0,0 +1,89 @@
+"""Snapshot lookups on `trade.VersionedMarketOrder`.
+
+Compares the time-ordered `trade.SnapshotTimeline` with the previous
+implementation, which sorted the snapshot dictionary on every access
+to the latest version.
+"""
+import argparse
+import datetime
+import random
+import time
+
+from evetele import trade, util
+
+from ._data import esi_orders, report
+
+
+class DictVersionedMarketOrder(trade.VersionedMarketOrder):
+    # The previous implementation: a plain dict, sorted on access.
+
+    def __init__(self):
+        self._snapshots = {}
+
+    @property
+    def snapshots(self):
+        return self._snapshots
+
+    @property
+    def latest(self):
+        return sorted(self.snapshots.items())[-1][1]
+
+    def at(self, t):
+        versions = [o for __, o in sorted(self.snapshots.items())
+                    if o.t <= t]
+        return versions[-1] if versions else None
+
+
+def build(cls, orders, versions, t0):
+    # One versioned order per record with `versions` snapshots each,
+    # added in time order.
+    result = []
+    step = datetime.timedelta(minutes=5)
+    for data in orders:
+        order = cls()
+        for i in range(versions):
+            order.add(data, t0 + i * step)
+        result.append(order)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--versions', type=int, default=300)
+    parser.add_argument('--lookups', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    records = esi_orders(args.orders)
+    t0 = util.get_utc_datetime()
+    rng = random.Random(1)
+    span = datetime.timedelta(minutes=5 * args.versions)
+    times = [t0 + rng.random() * span for __ in range(args.lookups)]
+
+    print('{:,} orders with {:,} versions each'.format(args.orders,
+                                                      args.versions))
+    for name, cls in [('dict', DictVersionedMarketOrder),
+                      ('timeline', trade.VersionedMarketOrder)]:
+        start = time.perf_counter()
+        orders = build(cls, records, args.versions, t0)
+        report('{} add'.format(name), time.perf_counter() - start,
+               n=args.orders * args.versions)
+
+        start = time.perf_counter()
+        for __ in range(args.lookups):
+            for order in orders:
+                order['price']
+                order.t
+        report('{} {} x latest'.format(name, args.lookups),
+               time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for t in times:
+            for order in orders:
+                order.at(t)
+        report('{} {} x at(t)'.format(name, args.lookups),
+               time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
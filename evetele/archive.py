@@ -0,0 +1,283 @@
+"""Bulk import of archived client market exports.
+
+`ArchiveImporter` reads market exports (regional exports and 'My
+Orders' exports, see `local.MarketLogFile`) from directories and
+tar, zip or gzip archives. It parses them and merges the orders into
+`trade.VersionedMarketOrder` histories in a pool of processes, keyed
+by order ID, with the time of each export as the snapshot time.
+"""
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import functools
+import gc
+import gzip
+import io
+import operator
+import os
+import pickle
+import tarfile
+import time
+import zipfile
+
+from . import local, trade
+from . import LoggingObject
+
+
+# An export to parse: its file name, time and where to read it. For
+# files `source` is the path, for zip members it is the archive path
+# and `member` the member name, and for tar members (which are read
+# sequentially by the importer) it is the content.
+_Task = collections.namedtuple('_Task', 'kind name t source member')
+
+# A parsed export: its orders split into shards, each pickled with the
+# export time, or the error that stopped it being read or parsed.
+_Export = collections.namedtuple('_Export', 'name t shards rows error')
+
+# Fields of the orders passed between processes as tuples: those of
+# `local.esi_record`, order ID first, and the region.
+_FIELDS = ('order_id', 'type_id', 'location_id', 'system_id',
+           'is_buy_order', 'price', 'volume_remain', 'volume_total',
+           'min_volume', 'duration', 'range', 'issued', 'region_id')
+
+_values = operator.itemgetter(*_FIELDS)
+
+# Raised reading an export from a file or archive.
+_READ_ERRORS = (EOFError, OSError, zipfile.BadZipFile)
+
+
+class ArchiveImporter(LoggingObject):
+    """Parallel importer of archived market exports.
+
+    Exports are parsed in worker processes. Plain and zipped files
+    are read by the workers; tar archives, which can only be read
+    efficiently in order, are read by the importer and the content
+    of each export is passed to a worker. The histories are then
+    built by the workers too, each taking a shard of the order IDs.
+    Throughput is logged and kept in `stats`.
+    """
+
+    _tar_suffixes = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+    def __init__(self, workers=None, regional=True, personal=True):
+        """
+        Parameters
+        ----------
+
+        workers : int, optional
+            Number of worker processes. Defaults to the number of
+            CPUs; with 1, exports are parsed in this process.
+
+        regional, personal : bool, optional
+            Import regional market exports and/or personal ('My
+            Orders') exports.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.regional = regional
+        self.personal = personal
+        self.stats = {}
+
+    def run(self, *sources):
+        """Import the exports in directories, archives or files.
+
+        Exports which can't be read or parsed are logged and skipped,
+        and counted in `stats`.
+
+        Parameters
+        ----------
+
+        sources : str
+            Paths of directories (searched recursively, including any
+            archives found), archives or exports, plain or gzipped.
+
+        Returns
+        -------
+
+        dict
+            Map of order ID to `trade.VersionedMarketOrder`.
+        """
+        start = time.perf_counter()
+        # Workers split the orders of each export into shards by order
+        # ID, then build the histories of a shard each. The shards are
+        # passed on pickled, so this process only collects the bytes
+        # and merges the histories.
+        shards = [[] for __ in range(self.workers)]
+        files = rows = skipped = 0
+        tasks = (task for source in sources
+                 for task in self._tasks(source))
+        executor = None
+        if self.workers > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                self.workers
+            )
+        try:
+            parse = functools.partial(_parse_export,
+                                      nshards=len(shards))
+            for export in self._map(executor, parse, tasks):
+                if export.error is not None:
+                    self._log.warning('Skipped %s: %s', export.name,
+                                      export.error)
+                    skipped += 1
+                    continue
+                for shard, orders in zip(shards, export.shards):
+                    shard.append(orders)
+                files += 1
+                rows += export.rows
+            histories = {}
+            with _gc_paused():
+                for shard_histories in self._map(
+                        executor, _build_histories, shards):
+                    histories.update(shard_histories)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            'files': files,
+            'skipped': skipped,
+            'rows': rows,
+            'orders': len(histories),
+            'seconds': elapsed,
+            'rows_per_second': rows / elapsed if elapsed else 0.0,
+        }
+        self._log.info('Imported %d rows from %d files in %.1f s '
+                       '(%.0f rows/s), skipped %d files', rows, files,
+                       elapsed, self.stats['rows_per_second'], skipped)
+        return histories
+
+    def _map(self, executor, function, items):
+        # Generate function(item) for each item, in order, in the
+        # executor's processes if there is one.
+        if executor is None:
+            yield from map(function, items)
+            return
+        # Bound the items in flight, which may hold file content.
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 4 * self.workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def _tasks(self, path):
+        # Generate tasks for the exports at a path.
+        if os.path.isdir(path):
+            for directory, subdirectories, names in os.walk(path):
+                subdirectories.sort()
+                for name in sorted(names):
+                    yield from self._tasks(os.path.join(directory, name))
+        elif path.endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                names = archive.namelist()
+            for name in names:
+                task = self._task('zip', name, path, name)
+                if task is not None:
+                    yield task
+        elif path.endswith(self._tar_suffixes):
+            with tarfile.open(path, 'r:*') as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    task = self._task('tar', member.name, None,
+                                      member.name)
+                    if task is not None:
+                        content = archive.extractfile(member).read()
+                        yield task._replace(source=content)
+        else:
+            task = self._task('file', path, path)
+            if task is not None:
+                yield task
+
+    def _task(self, kind, name, source, member=None):
+        # A task for an export, or None if `name` isn't that of an
+        # export to import.
+        basename = os.path.basename(name)
+        if basename.endswith('.gz'):
+            basename = basename[:-3]
+        export = local.parse_export_name(basename)
+        if export is None:
+            return None
+        names, t = export
+        personal = names == local.PERSONAL_ORDERS
+        if not (self.personal if personal else self.regional):
+            return None
+        if t is None:
+            # Modification times of archived files aren't a reliable
+            # stand-in for the export time.
+            self._log.warning('Skipped %s: no valid time in its name',
+                              name)
+            return None
+        return _Task(kind, name, t, source, member)
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # Building or unpickling the histories creates millions of objects,
+    # which trigger collections that traverse all of them again, though
+    # they hold no reference cycles.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _read(task):
+    if task.kind == 'file':
+        with open(task.source, 'rb') as f:
+            content = f.read()
+    elif task.kind == 'zip':
+        with zipfile.ZipFile(task.source) as archive:
+            content = archive.read(task.member)
+    else:
+        content = task.source
+    if task.name.endswith('.gz'):
+        content = gzip.decompress(content)
+    return content
+
+
+def _parse_export(task, nshards):
+    # Read and parse one export, in a worker process. Its orders are
+    # split into `nshards` lists by order ID, as tuples of `_FIELDS`,
+    # and each pickled with the export time. An export that can't be
+    # read or parsed gives its error instead.
+    shards = [[] for __ in range(nshards)]
+    rows = 0
+    try:
+        reader = csv.reader(io.StringIO(_read(task).decode('utf-8')))
+        parse = local.MarketLogFile.record_parser(next(reader, []))
+        for row in reader:
+            if not row:
+                continue
+            data = parse(row)
+            record = local.esi_record(data)
+            record['region_id'] = data['region_id']
+            shards[record['order_id'] % nshards].append(_values(record))
+            rows += 1
+    except _READ_ERRORS + local.PARSE_ERRORS as exc:
+        return _Export(task.name, task.t, None, 0, repr(exc))
+    shards = [pickle.dumps((task.t, orders), pickle.HIGHEST_PROTOCOL)
+              for orders in shards]
+    return _Export(task.name, task.t, shards, rows, None)
+
+
+def _build_histories(exports):
+    # Build the histories of the orders of one shard, in a worker
+    # process, from its pickled orders in each export.
+    with _gc_paused():
+        snapshots = collections.defaultdict(list)
+        for pickled in exports:
+            t, orders = pickle.loads(pickled)
+            for values in orders:
+                snapshots[values[0]].append(trade.MarketOrderSnapshot(
+                    dict(zip(_FIELDS, values)), t
+                ))
+        return {
+            order_id: trade.VersionedMarketOrder.from_snapshots(versions)
+            for order_id, versions in snapshots.items()
+        }
@@ -1,23 +1,92 @@
 """Simple adapter for PostgreSQL databases."""
 import collections
+import contextlib
 import getpass
+import itertools
+import json
+import threading
+import time
+import weakref
 
+import numpy as np
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 
-from . import config
+from . import config, util
+
+
+Column = collections.namedtuple('Column', 'name type nullable default')
+
+Index = collections.namedtuple('Index',
+                               'name columns unique primary definition')
 
 
 class Database(object):
-    """Handles database connections with some basic utility."""
+    """Handles database connections with some basic utility.
+
+    By default a single connection is opened per instance. If 'pool
+    max size' is set in the [PostgreSQLDB] config section (or `pooled`
+    is requested), connections are instead borrowed from a
+    thread-safe pool of 'pool min size' to 'pool max size'
+    connections for each query; threads wait for a free connection
+    when all are in use. See `pool_stats` for utilisation metrics.
+    """
 
     _pw_prompt = "Password for [{user}@{host}:{port}/{database}]: "
 
     _default_cursor_factory = psycopg2.extras.NamedTupleCursor
 
+    # [PostgreSQLDB] options that are not connection parameters.
+    _pool_options = ('pool min size', 'pool max size')
+
+    _default_pool_size = (1, 10)
+
+    # Names for server-side cursors.
+    _cursor_names = itertools.count()
+
+    def __init__(self, pooled=None, readonly=True):
+        """
+        Parameters
+        ----------
+
+        pooled : bool, optional
+            Use a connection pool. Defaults to pooling if a pool size
+            is configured.
+
+        readonly : bool, optional
+            Open read-only sessions (the default; the static data is
+            never modified). Writers such as `persist.OrderWriter`
+            need a database with `readonly=False`.
+        """
+        self._pooled = pooled
+        self.readonly = readonly
+        self._pool_lock = threading.Lock()
+        self._stats = collections.Counter()
+
     @property
     def conn_details(self):
-        return dict(config.items('PostgreSQLDB'))
+        return {key: value
+                for key, value in config.items('PostgreSQLDB')
+                if key not in self._pool_options}
+
+    @property
+    def pooled(self):
+        """Whether connections are borrowed from a pool."""
+        if self._pooled is None:
+            return (config.has_section('PostgreSQLDB')
+                    and config.has_option('PostgreSQLDB',
+                                          'pool max size'))
+        return self._pooled
+
+    @property
+    def pool_size(self):
+        """(min, max) number of pooled connections, from config."""
+        minconn, maxconn = self._default_pool_size
+        section = config['PostgreSQLDB']
+        minconn = int(section.get('pool min size', minconn))
+        maxconn = int(section.get('pool max size', maxconn))
+        return minconn, max(minconn, maxconn)
 
     @property
     def conn(self):
@@ -32,9 +101,114 @@ class Database(object):
                 cursor_factory=self.default_cursor_factory,
                 **self.conn_details
             )
-            connection.set_session(autocommit=True, readonly=True)
+            connection.set_session(autocommit=True,
+                                   readonly=self.readonly)
             return connection
 
+    @property
+    def pool(self):
+        """The connection pool (created on first use)."""
+        with self._pool_lock:
+            try:
+                return self._pool
+            except AttributeError:
+                minconn, maxconn = self.pool_size
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    minconn, maxconn,
+                    cursor_factory=self.default_cursor_factory,
+                    **self.conn_details
+                )
+                # Bounds borrowers so they wait rather than failing
+                # when the pool is exhausted.
+                self._pool_slots = threading.BoundedSemaphore(maxconn)
+                self._pool_max = maxconn
+                # Connections whose session has been set; weak so
+                # that connections discarded by the pool drop out.
+                self._configured = weakref.WeakSet()
+                return self._pool
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Context manager providing a connection for the duration.
+
+        In pooled mode a connection is borrowed from the pool (waiting
+        for one if necessary) and returned on exit; otherwise this is
+        the instance's single connection.
+        """
+        if not self.pooled:
+            yield self.conn
+            return
+
+        pool = self.pool
+        start = time.perf_counter()
+        self._pool_slots.acquire()
+        waited = time.perf_counter() - start
+        try:
+            connection = pool.getconn()
+            broken = False
+            self._record_borrow(waited)
+            try:
+                if connection not in self._configured:
+                    connection.set_session(autocommit=True,
+                                           readonly=self.readonly)
+                    self._configured.add(connection)
+                connection.cursor_factory = self.default_cursor_factory
+                yield connection
+            except psycopg2.OperationalError:
+                broken = True
+                raise
+            finally:
+                self._record_return()
+                # Discard broken connections rather than lending them
+                # out again.
+                pool.putconn(connection,
+                             close=broken or bool(connection.closed))
+        finally:
+            self._pool_slots.release()
+
+    def _record_borrow(self, waited):
+        with self._pool_lock:
+            stats = self._stats
+            stats['borrows'] += 1
+            stats['in_use'] += 1
+            stats['peak_in_use'] = max(stats['peak_in_use'],
+                                       stats['in_use'])
+            stats['wait_time'] += waited
+            stats['max_wait_time'] = max(stats['max_wait_time'], waited)
+
+    def _record_return(self):
+        with self._pool_lock:
+            self._stats['in_use'] -= 1
+
+    @property
+    def pool_stats(self):
+        """Dictionary of connection pool metrics.
+
+        borrows : number of connections borrowed
+        in_use, peak_in_use : connections currently (and at most) lent
+        utilisation : in_use as a fraction of the pool's max size
+        wait_time, max_wait_time : total and longest wait to borrow (s)
+        """
+        with self._pool_lock:
+            stats = {key: self._stats[key] for key in
+                     ('borrows', 'in_use', 'peak_in_use', 'wait_time',
+                      'max_wait_time')}
+            maxconn = getattr(self, '_pool_max', None)
+        stats['max_size'] = maxconn
+        stats['utilisation'] = (stats['in_use'] / maxconn
+                                if maxconn else 0.0)
+        return stats
+
+    def close(self):
+        """Close the pooled (or single) connections."""
+        with self._pool_lock:
+            pool = self.__dict__.pop('_pool', None)
+        if pool is not None:
+            pool.closeall()
+        connection = self.__dict__.pop('_conn', None)
+        if connection is not None:
+            connection.close()
+
     @property
     def default_cursor_factory(self):
         """Defines the default type of cursor returned by a query."""
@@ -42,24 +216,60 @@ class Database(object):
     @default_cursor_factory.setter
     def default_cursor_factory(self, value):
         self._default_cursor_factory = value
-        self.conn.cursor_factory = value
+        # Pooled connections pick this up when borrowed.
+        if not self.pooled:
+            self.conn.cursor_factory = value
 
-    @property
-    def schema(self):
-        """Dictionary describing the public schema."""
+    # Cached schema metadata dropped by `refresh_schema`.
+    _schema_properties = ('columns', 'schema', 'indexes')
+
+    def refresh_schema(self):
+        """Drop cached schema metadata, e.g. after an SDE import.
+
+        Metadata is queried again on next access.
+        """
+        for name in self._schema_properties:
+            self.__dict__.pop('_cached_{}'.format(name), None)
+
+    @util.cached_property
+    def columns(self):
+        """Dictionary of `Column` lists by table, in column order.
+
+        Covers the public schema and is cached; see `refresh_schema`.
+        """
         cursor = self.query(
-             """
+            """
             SELECT table_name
                  , column_name
                  , ordinal_position
+                 , data_type
+                 , is_nullable
+                 , column_default
               FROM information_schema.columns
              WHERE table_schema = 'public'
              ORDER BY (table_name, ordinal_position)
-            """
+            """,
+            cursor_factory=psycopg2.extensions.cursor
         )
+        columns = collections.defaultdict(list)
+        for (table_name, column_name, __, data_type, nullable,
+                default) in cursor.fetchall():
+            columns[table_name].append(
+                Column(column_name, data_type, nullable == 'YES',
+                       default)
+            )
+        return columns
+
+    @util.cached_property
+    def schema(self):
+        """Dictionary describing the public schema.
+
+        Maps table names to lists of column names. Cached; see
+        `refresh_schema`.
+        """
         schema = collections.defaultdict(list)
-        for table_name, column_name, __ in cursor.fetchall():
-            schema[table_name].append(column_name)
+        for table_name, columns in self.columns.items():
+            schema[table_name] = [column.name for column in columns]
         return schema
 
     @property
@@ -67,6 +277,95 @@ class Database(object):
         """List of tables in the public schema."""
         return list(self.schema.keys())
 
+    @util.cached_property
+    def indexes(self):
+        """Dictionary of `Index` lists by table in the public schema.
+
+        Cached; see `refresh_schema`.
+        """
+        cursor = self.query(
+            """
+            SELECT tables.relname
+                 , indexes.relname
+                 , array_agg(attributes.attname ORDER BY keys.position)
+                 , pg_index.indisunique
+                 , pg_index.indisprimary
+                 , pg_get_indexdef(pg_index.indexrelid)
+              FROM pg_index
+              JOIN pg_class AS indexes
+                ON indexes.oid = pg_index.indexrelid
+              JOIN pg_class AS tables
+                ON tables.oid = pg_index.indrelid
+              JOIN pg_namespace
+                ON pg_namespace.oid = tables.relnamespace
+             CROSS JOIN LATERAL unnest(pg_index.indkey)
+                   WITH ORDINALITY AS keys (attnum, position)
+              LEFT JOIN pg_attribute AS attributes
+                ON attributes.attrelid = tables.oid
+               AND attributes.attnum = keys.attnum
+             WHERE pg_namespace.nspname = 'public'
+             GROUP BY tables.relname, indexes.relname, pg_index.indexrelid
+                    , pg_index.indisunique, pg_index.indisprimary
+             ORDER BY tables.relname, indexes.relname
+            """,
+            cursor_factory=psycopg2.extensions.cursor
+        )
+        indexes = collections.defaultdict(list)
+        for (table_name, index_name, columns, unique, primary,
+                definition) in cursor.fetchall():
+            # Expression index keys have no column name.
+            indexes[table_name].append(
+                Index(index_name, tuple(columns), unique, primary,
+                      definition)
+            )
+        return indexes
+
+    @property
+    def primary_keys(self):
+        """Dictionary of primary key column tuples by table."""
+        return {table_name: index.columns
+                for table_name, indexes in self.indexes.items()
+                for index in indexes if index.primary}
+
+    def explain(self, sql, params=None, analyze=True, buffers=True):
+        """Execution plan of a statement, parsed from JSON.
+
+        Note that with `analyze` the statement is executed.
+
+        Parameters
+        ----------
+
+        sql : str
+            The statement, optionally parameterised.
+
+        params : sequence or dict, optional
+            Parameters for the statement.
+
+        analyze, buffers : bool, optional
+            Run `EXPLAIN` with the ANALYZE and BUFFERS options, to
+            report actual times and rows and shared buffer usage.
+
+        Returns
+        -------
+
+        dict
+            The plan, with the root node under 'Plan' and, when
+            analysed, 'Planning Time' and 'Execution Time' (ms). See
+            `plan_nodes` to walk the nodes.
+        """
+        options = [name for name, enabled in (('ANALYZE', analyze),
+                                              ('BUFFERS', buffers))
+                   if enabled]
+        options.append('FORMAT JSON')
+        cursor = self.query(
+            'EXPLAIN ({}) {}'.format(', '.join(options), sql), params,
+            cursor_factory=psycopg2.extensions.cursor
+        )
+        plan, = cursor.fetchone()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+
     def query(self, *args, cursor_factory=None, **kwargs):
         """Execute a SQL query against the database.
 
@@ -91,6 +390,120 @@ class Database(object):
             the type is a subclass of `cursor` defined by the
             `default_cursor_factory` property.
         """
-        cursor = self.conn.cursor(cursor_factory=cursor_factory)
-        cursor.execute(*args, **kwargs)
+        # Results are held client-side by the cursor, so a pooled
+        # connection can be returned as soon as the query has run.
+        with self.connection() as connection:
+            cursor = connection.cursor(cursor_factory=cursor_factory)
+            cursor.execute(*args, **kwargs)
         return cursor
+
+    def stream(self, sql, params=None, itersize=2000, columns=False,
+               cursor_factory=None, withhold=False):
+        """Execute a query and generate its results in batches.
+
+        Unlike `query`, results are kept on the server (in a named
+        cursor) and fetched `itersize` rows at a time, so memory use
+        does not grow with the size of the result set. The cursor
+        lives in a transaction, so rows are produced as they are
+        fetched; the transaction is committed once the results are
+        exhausted and rolled back if the generator is closed early or
+        fails. The connection is held, out of autocommit mode, until
+        then.
+
+        Parameters
+        ----------
+
+        sql : str
+            The statement, optionally parameterised.
+
+        params : sequence or dict, optional
+            Parameters for the statement.
+
+        itersize : int, optional
+            Number of rows per batch.
+
+        columns : bool, optional
+            Generate each batch as a dict of column name to NumPy
+            array rather than as a list of rows.
+
+        cursor_factory : psycopg2.extensions.cursor, optional
+            As for `query`; ignored if `columns` is set.
+
+        withhold : bool, optional
+            Declare the cursor WITH HOLD and keep the connection in
+            autocommit mode instead. The server then runs the query to
+            completion, storing the whole result, before the first
+            batch is returned.
+
+        Yields
+        ------
+
+        list or dict of numpy.ndarray
+            Each batch of results.
+        """
+        name = 'evetele_stream_{}'.format(next(self._cursor_names))
+        with self.connection() as connection:
+            if not withhold:
+                # Named cursors can't be used in autocommit mode
+                # without WITH HOLD.
+                connection.autocommit = False
+            completed = False
+            try:
+                cursor = connection.cursor(
+                    name, withhold=withhold,
+                    cursor_factory=(psycopg2.extensions.cursor
+                                    if columns else cursor_factory)
+                )
+                try:
+                    cursor.itersize = itersize
+                    cursor.execute(sql, params)
+                    while True:
+                        rows = cursor.fetchmany(itersize)
+                        if not rows:
+                            break
+                        if columns:
+                            names = [column[0]
+                                     for column in cursor.description]
+                            yield _column_arrays(names, rows)
+                        else:
+                            yield rows
+                    completed = True
+                finally:
+                    cursor.close()
+            finally:
+                if not withhold:
+                    if completed:
+                        connection.commit()
+                    else:
+                        connection.rollback()
+                    connection.autocommit = True
+
+
+def _column_arrays(names, rows):
+    # Transpose a batch of row tuples into a dict of column arrays.
+    # NULLs, or mixed types, give object arrays.
+    arrays = {}
+    for name, values in zip(names, zip(*rows)):
+        try:
+            array = np.array(values)
+        except ValueError:
+            array = np.array(values, dtype=object)
+        if array.ndim != 1:
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+        arrays[name] = array
+    return arrays
+
+
+def plan_nodes(plan):
+    """Generate (depth, node) for each node of an `explain` plan.
+
+    Nodes are generated depth first, starting with the root node at
+    depth 0.
+    """
+    stack = [(0, plan['Plan'])]
+    while stack:
+        depth, node = stack.pop()
+        yield depth, node
+        stack.extend((depth + 1, child)
+                     for child in reversed(node.get('Plans', ())))
@@ -1,12 +1,24 @@
 """Models for working with the EVE API, ESI."""
 import abc
+import asyncio
+import collections
+import concurrent.futures
+import email.utils
 import functools
 import getpass
+import hashlib
 import itertools
+import os
+import pickle
+import tempfile
+import threading
 
 import esipy
+import requests.adapters
+import requests.structures
 
 import evetele
+from evetele import util
 from evetele.util import cached_property
 
 
@@ -17,6 +29,154 @@ USER_AGENT_STRING = '{} {} ({})'.format(
 )
 
 
+class CachedResponse(object):
+    """A parsed ESI response retained by a `ResponseCache`.
+
+    Provides the `status`, `header` and `data` attributes of the
+    pyswagger response it was built from, so it can stand in for one.
+    """
+
+    def __init__(self, status, header, data, size=0):
+        self.status = status
+        self.header = requests.structures.CaseInsensitiveDict(header)
+        self.data = data
+        self.size = size
+
+    @classmethod
+    def from_response(cls, response):
+        """Build from a pyswagger.io.Response."""
+        return cls(response.status, response.header, response.data,
+                   size=len(response.raw or b''))
+
+    def _header_value(self, name):
+        value = self.header.get(name)
+        if isinstance(value, list):
+            value = value[0] if value else None
+        return value
+
+    @property
+    def etag(self):
+        """The ETag of the response, if any."""
+        return self._header_value('ETag')
+
+    @property
+    def expires(self):
+        """Expiry time (UTC) of the response, if any."""
+        value = self._header_value('Expires')
+        if value is None:
+            return None
+        try:
+            return email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+    @property
+    def fresh(self):
+        """The response has not expired yet."""
+        expires = self.expires
+        return expires is not None and util.get_utc_datetime() < expires
+
+    def revalidate(self, response):
+        """Update cache headers from a 304 (Not Modified) response."""
+        for name in ('Expires', 'ETag', 'Date', 'Last-Modified'):
+            if name in response.header:
+                self.header[name] = response.header[name]
+
+
+class ResponseCache(metaclass=abc.ABCMeta):
+    """Base class for caches of parsed ESI responses.
+
+    Entries are `CachedResponse` objects keyed by a string derived
+    from the endpoint and request parameters. The `stats` counter
+    records:
+
+      - hits: fresh responses served without a request
+      - misses: responses that had to be downloaded in full
+      - revalidations: stale responses confirmed unchanged (304)
+      - bytes_saved: body bytes not downloaded thanks to the above
+    """
+
+    def __init__(self):
+        self.stats = collections.Counter()
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Return the entry for `key`, or None."""
+        return None
+
+    @abc.abstractmethod
+    def set(self, key, entry):
+        """Store an entry."""
+
+    @abc.abstractmethod
+    def clear(self):
+        """Remove all entries."""
+
+
+class MemoryResponseCache(ResponseCache):
+    """In-memory cache retaining the `maxsize` most recent responses.
+    """
+
+    def __init__(self, maxsize=1024):
+        super().__init__()
+        self._entries = util.LRUCache(maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskResponseCache(ResponseCache):
+    """Cache persisting responses as pickle files in a directory.
+
+    By default, responses are kept in 'esi_cache' in the user data
+    directory so they survive between processes.
+    """
+
+    def __init__(self, directory=None):
+        super().__init__()
+        if directory is None:
+            directory = os.path.join(evetele.USER_DATA_DIR, 'esi_cache')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.pickle')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError):
+            # Corrupt or incompatible entry; treat as a miss.
+            return None
+
+    def set(self, key, entry):
+        # Write atomically so concurrent readers never see a partial
+        # file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                os.remove(os.path.join(self.directory, name))
+
+
 class ESIClient(object):
 
     class BadResponse(Exception):
@@ -25,6 +185,26 @@ class ESIClient(object):
             msg = "Bad response: {}".format(response.status)
             super().__init__(msg)
 
+    def __init__(self, pool_size=None, cache=None):
+        """Optionally size the HTTP connection pool and add a cache.
+
+        Parameters
+        ----------
+
+        pool_size : int, optional
+            Maximum number of connections kept open to the ESI host.
+            Defaults to the `requests` default (10), which is enough
+            unless requests are made from many threads at once.
+
+        cache : ResponseCache, optional
+            Cache for parsed responses. Responses that have not
+            expired are served from the cache; expired ones are
+            revalidated with their ETag and the parsed data re-used
+            if the server reports no change.
+        """
+        self.pool_size = pool_size
+        self.cache = cache
+
     @property
     def _app(self):
         # Lazily evaluated, cached esipy app instance
@@ -40,7 +220,23 @@ class ESIClient(object):
         return esipy.EsiClient(
             retry_requests=True,
             headers=self.headers,
-            raw_body_only=False # most of the time we'll parse
+            raw_body_only=False, # most of the time we'll parse
+            transport_adapter=self._transport_adapter
+        )
+
+    @property
+    def max_connections(self):
+        """Number of connections the HTTP connection pool keeps."""
+        return self.pool_size or requests.adapters.DEFAULT_POOLSIZE
+
+    @property
+    def _transport_adapter(self):
+        # Custom adapter only where the connection pool is resized.
+        if self.pool_size is None:
+            return None
+        return requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size
         )
 
     @cached_property
@@ -81,6 +277,92 @@ class ESIClient(object):
             resp = self.request(endpoint, **kwargs)
             return resp.data
 
+    def fetch_iter(self, endpoint, ordered=True, **kwargs):
+        """Iterate over the data from the specified endpoint.
+
+        For multipage endpoints, records are yielded page by page as
+        pages arrive rather than after every page has been fetched.
+        Only a small window of pages is requested ahead of the
+        consumer, so memory use is bounded by a few pages regardless
+        of the size of the resource.
+
+        Parameters
+        ----------
+
+        endpoint : str
+            Swagger endpoint descriptor.
+
+        ordered : bool, optional
+            Yield pages in page order (default). If false, pages are
+            yielded in the order they complete.
+
+        Any other keyword arguments are used as parameters in the
+        request.
+
+        Yields
+        ------
+
+        variable
+            Records from the response data. Non-paged responses that
+            are not lists are yielded as a single item.
+        """
+        operation = self._get_op(endpoint)
+        if operation_is_multipage(operation):
+            for __, response in self._iter_pages(endpoint, ordered,
+                                                 **kwargs):
+                yield from response.data
+
+        else:
+            data = self.request(endpoint, **kwargs).data
+            if isinstance(data, list):
+                yield from data
+            else:
+                yield data
+
+    def _iter_pages(self, endpoint, ordered, **kwargs):
+        # Generate (request, response) pairs for every page, keeping
+        # at most `window` page requests outstanding.
+        send_page = functools.partial(self._send, endpoint, **kwargs)
+        first = send_page(page=1)
+        self._check_page(first[1])
+        yield first
+
+        npages = first[1].header['X-Pages'][0]
+        pages = iter(range(2, npages + 1))
+        workers = self.max_connections
+        window = 2 * workers
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        pending = []
+
+        def submit():
+            page = next(pages, None)
+            if page is not None:
+                pending.append(pool.submit(send_page, page=page))
+
+        try:
+            for __ in range(window):
+                submit()
+            while pending:
+                if ordered:
+                    future = pending.pop(0)
+                else:
+                    done, __ = concurrent.futures.wait(
+                        pending,
+                        return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    future = done.pop()
+                    pending.remove(future)
+                submit()
+                pair = future.result()
+                self._check_page(pair[1])
+                yield pair
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _check_page(self, response):
+        if response.status not in (200, 304):
+            raise self.BadResponse(response)
+
     def request(self, endpoint, **kwargs):
         """Construct and perform a request.
 
@@ -97,8 +379,43 @@ class ESIClient(object):
 
         pyswagger.io.Response
         """
-        operation = self._get_op(endpoint)(**kwargs)
-        return self._client.request(operation)
+        return self._send(endpoint, **kwargs)[1]
+
+    def _send(self, endpoint, **kwargs):
+        # Perform a request, via the cache if there is one, and return
+        # the (request, response) pair. The response may be a
+        # CachedResponse.
+        operation = self._get_op(endpoint)
+        cache = self.cache
+        if cache is None:
+            req_and_resp = operation(**kwargs)
+            return req_and_resp[0], self._client.request(req_and_resp)
+
+        key = _cache_key(endpoint, kwargs)
+        entry = cache.get(key)
+        if entry is not None and entry.fresh:
+            cache.stats['hits'] += 1
+            cache.stats['bytes_saved'] += entry.size
+            return None, entry
+
+        params = dict(kwargs)
+        if (entry is not None and entry.etag is not None
+                and operation_has_parameter(operation, 'If-None-Match')):
+            params['If-None-Match'] = entry.etag
+        req_and_resp = operation(**params)
+        response = self._client.request(req_and_resp)
+
+        if response.status == 304 and entry is not None:
+            entry.revalidate(response)
+            cache.set(key, entry)
+            cache.stats['revalidations'] += 1
+            cache.stats['bytes_saved'] += entry.size
+            return req_and_resp[0], entry
+
+        cache.stats['misses'] += 1
+        if response.status == 200:
+            cache.set(key, CachedResponse.from_response(response))
+        return req_and_resp[0], response
 
     def multipage_request(self, endpoint, **kwargs):
         """Construct and perform a multipage request.
@@ -121,6 +438,9 @@ class ESIClient(object):
         list of (pyswagger.io.Request, pyswagger.io.Response)
             Request-response pairs for every page in the query.
         """
+        if self.cache is not None:
+            return self._cached_multipage_request(endpoint, **kwargs)
+
         fetch_page = functools.partial(
             self._get_op(endpoint),
             **kwargs
@@ -135,6 +455,137 @@ class ESIClient(object):
         else:
             raise self.BadResponse(response)
 
+    def _cached_multipage_request(self, endpoint, **kwargs):
+        # Pages are requested individually through the cache. The
+        # first page (possibly cached) gives the page count, which
+        # replaces the HEAD request.
+        return list(self._iter_pages(endpoint, True, **kwargs))
+
+
+class AsyncESIClient(object):
+    """Asyncio front end to an ESIClient.
+
+    Offers the `fetch`/`request`/`multipage_request` interface of
+    `ESIClient` as coroutines. Requests are still made by the wrapped
+    client, but on a bounded pool of worker threads, so the pages of
+    many endpoint calls (e.g. the order books of every region) are
+    fetched concurrently rather than one call at a time.
+
+    The pool is shared by everything fetched through an instance;
+    `max_connections` bounds the number of requests in flight at once.
+    """
+
+    _default_max_connections = 20
+
+    def __init__(self, client=None, max_connections=None):
+        """
+        Parameters
+        ----------
+
+        client : ESIClient, optional
+            Client used to make the requests. By default a new one is
+            created with a connection pool sized to match.
+
+        max_connections : int, optional
+            Maximum number of concurrent requests. Defaults to the
+            size of the client's connection pool, so no more requests
+            are made at once than it keeps connections for (or to 20
+            for a new client).
+        """
+        if client is None:
+            if max_connections is None:
+                max_connections = self._default_max_connections
+            client = ESIClient(pool_size=max_connections)
+        elif max_connections is None:
+            max_connections = client.max_connections
+        self._client = client
+        self.max_connections = max_connections
+
+    @cached_property
+    def _executor(self):
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_connections,
+            thread_name_prefix='esi'
+        )
+
+    async def _run(self, func, *args):
+        # Run a blocking call on the request pool.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def fetch(self, endpoint, **kwargs):
+        """Fetch data from the specified endpoint.
+
+        See `ESIClient.fetch`.
+        """
+        operation = self._client._get_op(endpoint)
+        if operation_is_multipage(operation):
+            req_resp_list = await self.multipage_request(endpoint,
+                                                         **kwargs)
+            data_generator = (pair[1].data for pair in req_resp_list)
+            return list(itertools.chain(*data_generator))
+
+        else:
+            resp = await self.request(endpoint, **kwargs)
+            return resp.data
+
+    async def fetch_many(self, calls):
+        """Fetch data from several endpoint calls concurrently.
+
+        Parameters
+        ----------
+
+        calls : iterable of (str, dict)
+            Endpoint and request parameters for each call.
+
+        Returns
+        -------
+
+        list
+            The data for each call (see `fetch`), in input order.
+        """
+        return await asyncio.gather(*(
+            self.fetch(endpoint, **kwargs) for endpoint, kwargs in calls
+        ))
+
+    async def request(self, endpoint, **kwargs):
+        """Construct and perform a request.
+
+        See `ESIClient.request`.
+        """
+        send = functools.partial(self._client._send, endpoint, **kwargs)
+        return (await self._run(send))[1]
+
+    async def multipage_request(self, endpoint, **kwargs):
+        """Construct and perform a multipage request.
+
+        The first page is requested to discover the number of pages,
+        then the rest are requested concurrently.
+
+        Returns
+        -------
+
+        list of (pyswagger.io.Request, pyswagger.io.Response)
+            Request-response pairs for every page, in page order.
+        """
+        send_page = functools.partial(self._client._send, endpoint,
+                                      **kwargs)
+        first = await self._run(functools.partial(send_page, page=1))
+        self._client._check_page(first[1])
+
+        npages = first[1].header['X-Pages'][0]
+        rest = await asyncio.gather(*(
+            self._run(functools.partial(send_page, page=i+1))
+            for i in range(1, npages)
+        ))
+        for __, response in rest:
+            self._client._check_page(response)
+        return [first] + list(rest)
+
+    def close(self):
+        """Shut down the request pool."""
+        self._executor.shutdown()
+
 
 class SecureESIClient(ESIClient):
     """Client allowing access to secured ESI endpoints.
@@ -156,7 +607,8 @@ class SecureESIClient(ESIClient):
             retry_requests=True,
             headers={'User-Agent': USER_AGENT_STRING},
             raw_body_only=False,
-            security=self._security
+            security=self._security,
+            transport_adapter=self._transport_adapter
         )
 
     @cached_property
@@ -266,11 +718,33 @@ class ESIClientWrapper(metaclass=abc.ABCMeta):
         """
         return self._client.fetch(endpoint, **kwargs)
 
+    def fetch_iter(self, endpoint, ordered=True, **kwargs):
+        """Iterate over the data from an endpoint.
+
+        See `ESIClient.fetch_iter`; the same client restrictions as
+        for `fetch` apply.
+        """
+        return self._client.fetch_iter(endpoint, ordered=ordered,
+                                       **kwargs)
+
 
 def operation_is_multipage(op):
     """Identify whether operation has a page parameter."""
     # This is a bit magic and touches pyswagger internals.
-    return 'page' in [_get_parameter_name(p) for p in op.parameters]
+    return operation_has_parameter(op, 'page')
+
+
+def operation_has_parameter(op, name):
+    """Identify whether operation accepts the named parameter."""
+    return name in [_get_parameter_name(p) for p in op.parameters]
+
+
+def _cache_key(endpoint, params):
+    # Stable cache key for an endpoint call.
+    return '{}?{}'.format(
+        endpoint,
+        '&'.join('{}={}'.format(k, v) for k, v in sorted(params.items()))
+    )
 
 
 def _get_parameter_name(parameter):
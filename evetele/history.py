@@ -0,0 +1,258 @@
+"""Persistent history of market order versions.
+
+`OrderHistoryStore` appends every order version reported by
+`market.Market` updates to per-day segment files of fixed-width
+binary records, so weeks of history can be queried without holding
+it in memory. Segments are memory-mapped when queried and
+`trade.VersionedMarketOrder` objects are only built on request.
+"""
+import datetime
+import os
+import re
+
+import numpy as np
+import pytz
+
+from . import storage, trade, util
+from . import USER_DATA_DIR
+
+
+FORMAT_VERSION = 1
+
+# One record per order version. Times are UTC: the snapshot time `t`
+# in microseconds and `issued` in seconds since the epoch. `removed`
+# marks the last known version of an order that has since vanished.
+RECORD_DTYPE = np.dtype([
+    ('t', '<i8'),
+    ('order_id', '<i8'),
+    ('type_id', '<i4'),
+    ('region_id', '<i4'),
+    ('system_id', '<i4'),
+    ('location_id', '<i8'),
+    ('price', '<f8'),
+    ('volume_remain', '<i4'),
+    ('volume_total', '<i4'),
+    ('min_volume', '<i4'),
+    ('issued', '<i8'),
+    ('duration', '<i2'),
+    ('range', 'i1'),
+    ('is_buy_order', '?'),
+    ('removed', '?'),
+])
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
+
+
+class OrderHistoryStore(object):
+    """Append-only, on-disk store of market order versions.
+
+    Records are appended to one segment file per UTC day (of the
+    snapshot time) in `directory`. Attach the store to a market to
+    record every new or changed order, and every removal, seen by its
+    updates.
+    """
+
+    _segment_pattern = re.compile(
+        r'^(\d{{4}}-\d{{2}}-\d{{2}})\.v{}\.seg$'.format(FORMAT_VERSION)
+    )
+
+    def __init__(self, directory=None):
+        """
+        Parameters
+        ----------
+
+        directory : str, optional
+            Location of the segment files. Defaults to 'history' in
+            the user data directory.
+        """
+        if directory is None:
+            directory = os.path.join(USER_DATA_DIR, 'history')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def attach(self, market):
+        """Record the changes from every update of `market`."""
+        market.add_listener(self.record)
+
+    def detach(self, market):
+        """Stop recording the changes from `market`."""
+        market.remove_listener(self.record)
+
+    def record(self, changes):
+        """Append the versions in a `market.OrderChanges`."""
+        live = list(changes.created.values())
+        live.extend(changes.changed.values())
+        removed = list(changes.removed.values())
+        rows = np.concatenate([
+            self._rows(live, changes.region_id, changes.t),
+            self._rows(removed, changes.region_id, changes.t,
+                       removed=True),
+        ])
+        self.append(rows)
+
+    def append(self, rows):
+        """Append an array of RECORD_DTYPE rows to their segments."""
+        if not len(rows):
+            return
+        days = rows['t'] // (86400 * 10**6)
+        for day in np.unique(days):
+            date = (_EPOCH + datetime.timedelta(days=int(day))).date()
+            with open(self._segment_path(date), 'ab') as f:
+                # Drop any partial record left by an interrupted write,
+                # which would misalign every record appended after it.
+                size = f.seek(0, os.SEEK_END)
+                partial = size % RECORD_DTYPE.itemsize
+                if partial:
+                    f.truncate(size - partial)
+                    f.seek(0, os.SEEK_END)
+                rows[days == day].tofile(f)
+
+    @staticmethod
+    def _rows(orders, region_id, t, removed=False):
+        # Build records from market order objects.
+        rows = np.zeros(len(orders), dtype=RECORD_DTYPE)
+        if not orders:
+            return rows
+        rows['t'] = _to_microseconds(t)
+        rows['region_id'] = region_id
+        rows['removed'] = removed
+        data = [order.data for order in orders]
+        for name in ('order_id', 'type_id', 'system_id', 'location_id',
+                     'price', 'volume_remain', 'volume_total',
+                     'min_volume', 'duration'):
+            rows[name] = [d.get(name, 0) for d in data]
+        rows['is_buy_order'] = [d.get('is_buy_order', False)
+                                for d in data]
+        rows['range'] = [storage._RANGE_CODES.get(d.get('range'), -1)
+                         for d in data]
+        rows['issued'] = storage.issued_array(
+            [d['issued'] for d in data]
+        ).astype('<i8')
+        return rows
+
+    def _segment_path(self, date):
+        return os.path.join(
+            self.directory,
+            '{}.v{}.seg'.format(date.isoformat(), FORMAT_VERSION)
+        )
+
+    def segments(self, start=None, end=None):
+        """Paths of the segment files covering a time window."""
+        first = start and util.parse_datetime(start).date()
+        last = end and util.parse_datetime(end).date()
+        paths = []
+        for name in sorted(os.listdir(self.directory)):
+            match = self._segment_pattern.match(name)
+            if match is None:
+                continue
+            date = datetime.date.fromisoformat(match.group(1))
+            if (first and date < first) or (last and date > last):
+                continue
+            paths.append(os.path.join(self.directory, name))
+        return paths
+
+    def query(self, order_id=None, type_id=None, start=None, end=None,
+              include_removed=False):
+        """Records matching the criteria, ordered by time.
+
+        Parameters
+        ----------
+
+        order_id : int or sequence of int, optional
+
+        type_id : int or sequence of int, optional
+
+        start, end : datetime-like, optional
+            Inclusive time window for the snapshot time.
+
+        include_removed : bool, optional
+            Include the records marking removed orders.
+
+        Returns
+        -------
+
+        numpy.ndarray
+            Structured array of RECORD_DTYPE.
+        """
+        t0 = start and _to_microseconds(util.parse_datetime(start))
+        t1 = end and _to_microseconds(util.parse_datetime(end))
+        selected = []
+        for path in self.segments(start, end):
+            # Ignore any partially written record at the end.
+            count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+            if not count:
+                continue
+            rows = np.memmap(path, dtype=RECORD_DTYPE, mode='r',
+                             shape=(count,))
+            mask = np.ones(len(rows), dtype=bool)
+            if order_id is not None:
+                mask &= np.isin(rows['order_id'], order_id)
+            if type_id is not None:
+                mask &= np.isin(rows['type_id'], type_id)
+            if t0:
+                mask &= rows['t'] >= t0
+            if t1:
+                mask &= rows['t'] <= t1
+            if not include_removed:
+                mask &= ~rows['removed']
+            selected.append(np.array(rows[mask]))
+            del rows
+        if not selected:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        rows = np.concatenate(selected)
+        return rows[np.argsort(rows['t'], kind='stable')]
+
+    def versions(self, order_id, start=None, end=None):
+        """Rebuild the version history of an order.
+
+        Returns
+        -------
+
+        trade.VersionedMarketOrder or None
+            None if no versions are recorded in the time window.
+        """
+        rows = self.query(order_id=order_id, start=start, end=end)
+        if not len(rows):
+            return None
+        return trade.VersionedMarketOrder.from_snapshots(
+            [_snapshot(row) for row in rows]
+        )
+
+    def iter_orders(self, order_id=None, type_id=None, start=None,
+                    end=None):
+        """Generate VersionedMarketOrder objects lazily.
+
+        One object is built per order matching the criteria (see
+        `query`), on iteration.
+        """
+        rows = self.query(order_id=order_id, type_id=type_id,
+                          start=start, end=end)
+        order = np.argsort(rows['order_id'], kind='stable')
+        rows = rows[order]
+        ids = rows['order_id']
+        boundaries = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        for group in np.split(rows, boundaries):
+            if len(group):
+                yield trade.VersionedMarketOrder.from_snapshots(
+                    [_snapshot(row) for row in group]
+                )
+
+
+def _to_microseconds(dt):
+    return int((dt - _EPOCH) // datetime.timedelta(microseconds=1))
+
+
+def _snapshot(row):
+    # Rebuild a MarketOrderSnapshot from a record.
+    data = {
+        name: row[name].item()
+        for name in ('order_id', 'type_id', 'system_id', 'location_id',
+                     'price', 'volume_remain', 'volume_total',
+                     'min_volume', 'duration', 'is_buy_order')
+    }
+    data['region_id'] = int(row['region_id'])
+    code = int(row['range'])
+    data['range'] = storage.ORDER_RANGES[code] if code >= 0 else None
+    data['issued'] = int(row['issued'])
+    t = _EPOCH + datetime.timedelta(microseconds=int(row['t']))
+    return trade.MarketOrderSnapshot(data, t=t)
@@ -1,17 +1,51 @@
+import collections.abc
 import csv
-import ast
+import datetime
+import mmap
 import os
+import re
 from decimal import Decimal
 
+import numpy as np
+import pytz
 
 from . import config, trade, util, LoggingObject
 
 
+# Client exports write booleans as Python literals.
+_BOOLEANS = {'True': True, 'False': False}
+
+# Export 'range' values with a name in ESI; others are jumps.
+_ESI_RANGES = {-1: 'station', 0: 'solarsystem', 32767: 'region'}
+
+# Export file names are '<region>-<item>-<time>.txt' for regional
+# market exports and 'My Orders-<time>.txt' for personal orders.
+_EXPORT_NAME_PATTERN = re.compile(
+    r'^(?P<names>.+)-(?P<time>\d{4}\.\d{2}\.\d{2} \d{4}(?:\d{2})?)'
+    r'\.txt$'
+)
+
+PERSONAL_ORDERS = 'My Orders'
+
+# Raised by malformed or truncated rows in an export.
+PARSE_ERRORS = (ArithmeticError, IndexError, KeyError, ValueError,
+                csv.Error)
+
+
 class MarketLogFile(LoggingObject):
     """Model of a market log file exported from the client.
 
     Orders within the log file are accessible via the `orders`
-    property.
+    property, or selected with `filter`. To load large (e.g.
+    regional) exports without building an object per order, either
+    open the file in lazy mode or see `read_columns`.
+
+    In lazy mode the file is memory-mapped and only indexed on
+    opening: the byte offsets of each line and the order, type and
+    station IDs. Orders are parsed on access and not retained, so
+    memory use depends on the orders used rather than the size of
+    the file. Close lazy files (or use them as context managers) to
+    release the mapping.
     """
 
     _DIR = os.path.expanduser(os.path.join(
@@ -23,7 +57,7 @@ class MarketLogFile(LoggingObject):
     _FIELD_MAPPING = {
         'bid': {
             'name': 'is_buy_order',
-            'cast': ast.literal_eval
+            'cast': _BOOLEANS.__getitem__
         },
         'issueDate': {
             'name': 'issued',
@@ -43,7 +77,33 @@ class MarketLogFile(LoggingObject):
         'typeID': {'cast': int},
     }
 
-    def __init__(self, filename=None, path=None):
+    # NumPy dtypes of the columns read by `read_columns`, by field
+    # name (after mapping). Other columns are left as strings.
+    _COLUMN_DTYPES = {
+        'order_id': np.int64,
+        'type_id': np.int32,
+        'char_id': np.int64,
+        'region_id': np.int32,
+        'location_id': np.int64,
+        'range': np.int32,
+        'is_buy_order': np.bool_,
+        'price': np.float64,
+        'vol_entered': np.int64,
+        'vol_remaining': np.float64,
+        'issued': 'datetime64[ms]',
+        'order_state': np.int8,
+        'min_volume': np.int64,
+        'account_id': np.int64,
+        'duration': np.int16,
+        'is_corp': np.bool_,
+        'system_id': np.int32,
+        'escrow': np.float64,
+    }
+
+    # Fields indexed in lazy mode.
+    _INDEXED_FIELDS = ('order_id', 'type_id', 'location_id')
+
+    def __init__(self, filename=None, path=None, lazy=False):
         """Initialise with either a file name or path.
 
         Parameters
@@ -57,27 +117,357 @@ class MarketLogFile(LoggingObject):
 
         path : str, optional
             Full path to log file. Takes precedence over filename.
+
+        lazy : bool, optional
+            Index the file rather than parsing every order up front.
         """
+        self.path = path = self._resolve_path(filename, path)
+        self.lazy = lazy
+        self._mmap = None
+        if lazy:
+            self._open_lazy(path)
+            return
+        with open(path, 'r') as f:
+            reader = csv.reader(f)
+            parse = self.record_parser(next(reader, []))
+            self._orders = [trade.SimpleMarketOrder(parse(row))
+                            for row in reader if row]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the memory map of a lazy file."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _open_lazy(self, path):
+        # Map the file and index its lines. Rows are numbered from 0,
+        # excluding the header.
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                self._mmap = mmap.mmap(f.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+        content = self._mmap if size else b''
+        newlines = np.flatnonzero(
+            np.frombuffer(content, dtype=np.uint8) == ord('\n')
+        )
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [size]))
+        # Skip blank lines, including after the last newline.
+        nonblank = ends - starts > 1
+        starts, ends = starts[nonblank], ends[nonblank]
+
+        header = self._decode_rows(content, starts[:1], ends[:1])
+        header = next(header, [])
+        self._parse = self.record_parser(header)
+        self._starts, self._ends = starts[1:], ends[1:]
+        self._index = self._index_rows(header)
+
+    def _index_rows(self, header):
+        # Arrays of the indexed fields, by row.
+        positions = {name: i for i, name in self._column_names(header)
+                     if name in self._INDEXED_FIELDS}
+        last = max(positions.values(), default=0)
+        values = {name: [] for name in positions}
+        content = self._mmap
+        for start, end in zip(self._starts.tolist(),
+                              self._ends.tolist()):
+            line = content[start:end]
+            if b'"' in line:
+                # Quoted fields may contain commas.
+                fields = next(csv.reader([line.decode('utf-8')]))
+            else:
+                fields = line.split(b',', last + 1)
+            for name, i in positions.items():
+                values[name].append(int(fields[i]))
+        return {name: np.array(values[name], dtype=np.int64)
+                for name in values}
+
+    @staticmethod
+    def _decode_rows(content, starts, ends):
+        # Generate the parsed CSV rows between pairs of offsets.
+        lines = (content[start:end].rstrip(b'\r').decode('utf-8')
+                 for start, end in zip(starts.tolist(), ends.tolist()))
+        return csv.reader(lines)
+
+    def _materialise(self, rows):
+        # Parse orders from the numbered rows of a lazy file.
+        if self._mmap is None and len(rows):
+            raise ValueError("I/O operation on closed file")
+        return [
+            trade.SimpleMarketOrder(self._parse(row))
+            for row in self._decode_rows(self._mmap, self._starts[rows],
+                                         self._ends[rows])
+        ]
+
+    def filter(self, type_id=None, station_id=None, order_id=None):
+        """Orders matching the criteria, in file order.
+
+        In lazy mode only the matching orders are parsed.
+
+        Parameters
+        ----------
+
+        type_id, station_id, order_id : int or sequence of int, optional
+
+        Returns
+        -------
+
+        list of trade.SimpleMarketOrder
+        """
+        criteria = [(name, value)
+                    for name, value in (('type_id', type_id),
+                                        ('location_id', station_id),
+                                        ('order_id', order_id))
+                    if value is not None]
+        if not self.lazy:
+            sets = [(name, set(np.atleast_1d(value).tolist()))
+                    for name, value in criteria]
+            return [order for order in self._orders
+                    if all(order.data[name] in values
+                           for name, values in sets)]
+        mask = np.ones(len(self._starts), dtype=bool)
+        for name, value in criteria:
+            mask &= np.isin(self._index[name], value)
+        return self._materialise(np.flatnonzero(mask))
+
+    @classmethod
+    def _resolve_path(cls, filename, path):
         if path is None:
-            path = os.path.join(self._DIR, filename)
+            path = os.path.join(cls._DIR, filename)
+        return path
+
+    @classmethod
+    def _column_names(cls, header):
+        # (position, field name) of each named column in the header.
+        # Exports end each line with a comma, giving an unnamed,
+        # empty, last column which is dropped.
+        field_mapping = cls._FIELD_MAPPING
+        names = []
+        for i, field in enumerate(header):
+            if not field:
+                continue
+            mapping = field_mapping.get(field, {})
+            names.append(
+                (i, mapping.get('name', util.camelcase_to_snakecase(field)))
+            )
+        return names
+
+    @classmethod
+    def _compile_plan(cls, header):
+        # Resolve the field names and casts for a file's columns once,
+        # split into columns taken as-is, (position, name), and
+        # columns needing a cast, (position, name, cast).
+        plain, cast = [], []
+        for i, name in cls._column_names(header):
+            function = cls._FIELD_MAPPING.get(header[i], {}).get('cast')
+            if function is None:
+                plain.append((i, name))
+            else:
+                cast.append((i, name, function))
+        return plain, cast
+
+    @classmethod
+    def record_parser(cls, header):
+        """Function parsing the rows of a log file with this header.
+
+        The function takes a row (a list of field values, e.g. from
+        `csv.reader`) and returns the order data, as held by
+        `orders`. See `esi_record` to convert it for `market.Market`.
+        """
+        plain, cast = cls._compile_plan(header)
+
+        def parse(row):
+            data = {name: row[i] for i, name in plain}
+            for i, name, function in cast:
+                data[name] = function(row[i])
+            return data
+
+        return parse
 
-        field_mapping = self._FIELD_MAPPING
-        self._orders = orders = []
+    @classmethod
+    def read_columns(cls, filename=None, path=None):
+        """Read a log file into NumPy arrays, one per column.
+
+        Columns are named as the fields of `orders`, with numeric and
+        boolean types per `_COLUMN_DTYPES`; prices are floats (rather
+        than Decimal) and 'issued' is a naive UTC `datetime64[ms]`.
+        Unknown columns are left as strings.
+
+        Parameters
+        ----------
+
+        filename, path : str, optional
+            As for the constructor.
+
+        Returns
+        -------
+
+        dict
+            Field name: numpy.ndarray
+        """
+        path = cls._resolve_path(filename, path)
         with open(path, 'r') as f:
-            reader = csv.DictReader(f)
-            for record in reader:
-                data = {}
-                for field, value in record.items():
-                    mapping = field_mapping.get(field, {})
-                    transformed_name = mapping.get(
-                        'name',
-                        util.camelcase_to_snakecase(field)
-                    )
-                    cast = mapping.get('cast', lambda v: v)
-                    data[transformed_name] = cast(value)
-                orders.append(trade.SimpleMarketOrder(data))
+            header = next(csv.reader([f.readline()]), [])
+            content = f.read()
+        width = len(header)
+        # Blank lines are skipped, as by csv.DictReader.
+        lines = [line for line in content.splitlines() if line]
+
+        if '"' in content:
+            # Quoted fields may hold commas; split with the csv module.
+            values = [[] for __ in header]
+            for row in csv.reader(lines):
+                _check_width(path, width, row)
+                for column, value in zip(values, row):
+                    column.append(value)
+        else:
+            # Split every line at once and take each column as a
+            # slice, once every line has the header's width.
+            commas = width - 1
+            for line in lines:
+                if line.count(',') != commas:
+                    _check_width(path, width, line.split(','))
+            fields = ','.join(lines).split(',') if lines else []
+            values = [fields[i::width] for i in range(width)]
+
+        return {
+            name: _column_array(values[i], cls._COLUMN_DTYPES.get(name))
+            for i, name in cls._column_names(header)
+        }
 
     @property
     def orders(self):
-        """Market orders present in the log file."""
+        """Market orders present in the log file.
+
+        In lazy mode this is a sequence parsing orders on access.
+        """
+        if self.lazy:
+            return _LazyOrders(self)
         return self._orders
+
+
+class _LazyOrders(collections.abc.Sequence):
+    # Read-only sequence of the orders in a lazy MarketLogFile.
+
+    def __init__(self, log_file):
+        self._file = log_file
+
+    def __len__(self):
+        return len(self._file._starts)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._file._materialise(
+                np.arange(len(self))[key]
+            )
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("order index out of range")
+        return self._file._materialise(np.array([key]))[0]
+
+    def __iter__(self):
+        # Parse in blocks to bound the memory in use.
+        for start in range(0, len(self), 1000):
+            yield from self[start:start + 1000]
+
+
+def parse_export_name(name):
+    """Split the file name of a client export.
+
+    Parameters
+    ----------
+
+    name : str
+        e.g. 'The Forge-Tritanium-2018.07.05 180744.txt' or
+        'My Orders-2018.07.05 1807.txt'.
+
+    Returns
+    -------
+
+    tuple or None
+        The names ('<region>-<item>' or `PERSONAL_ORDERS`) and the
+        time of the export as a UTC datetime (the client uses EVE
+        time), or None if `name` is not that of an export. The time
+        is None if it isn't a valid date and time.
+    """
+    match = _EXPORT_NAME_PATTERN.match(name)
+    if match is None:
+        return None
+    string = match.group('time')
+    fmt = '%Y.%m.%d %H%M%S' if len(string) == 17 else '%Y.%m.%d %H%M'
+    try:
+        t = datetime.datetime.strptime(string, fmt)
+    except ValueError:
+        return match.group('names'), None
+    return match.group('names'), t.replace(tzinfo=pytz.utc)
+
+
+def esi_record(data):
+    """Convert the data of a log file order to an ESI order record.
+
+    Parameters
+    ----------
+
+    data : dict
+        Order data as parsed from a log file (e.g. the `data` of an
+        order in `MarketLogFile.orders`).
+
+    Returns
+    -------
+
+    dict
+        A record as returned by ESI's regional market orders
+        endpoint, e.g. for `market.Market.ingest`.
+    """
+    range_ = int(data['range'])
+    return {
+        'order_id': data['order_id'],
+        'type_id': data['type_id'],
+        'location_id': data['location_id'],
+        'system_id': data['system_id'],
+        'is_buy_order': data['is_buy_order'],
+        'price': float(data['price']),
+        'volume_remain': int(float(data['vol_remaining'])),
+        'volume_total': int(data['vol_entered']),
+        'min_volume': int(data['min_volume']),
+        'duration': int(data['duration']),
+        'range': _ESI_RANGES.get(range_, str(range_)),
+        # '2018-06-29 18:22:34.000Z' -> '2018-06-29T18:22:34Z'
+        'issued': data['issued'][:19].replace(' ', 'T') + 'Z',
+    }
+
+
+def _check_width(path, width, row):
+    if len(row) != width:
+        raise ValueError("{}: expected {} fields, got {}: {!r}".format(
+            path, width, len(row), row
+        ))
+
+
+def _column_array(values, dtype=None):
+    # Convert a column of strings to an array of dtype. Numbers are
+    # parsed by int/float directly into the array, which is cheaper
+    # than converting from an array of strings.
+    n = len(values)
+    if dtype is None:
+        return np.array(values, dtype=str)
+    elif dtype is np.bool_:
+        return np.fromiter((value == 'True' for value in values),
+                           dtype, n)
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'i':
+        return np.fromiter(map(int, values), dtype, n)
+    elif dtype.kind == 'f':
+        return np.fromiter(map(float, values), dtype, n)
+    elif dtype.kind == 'M':
+        unit, __ = np.datetime_data(dtype)
+        return util.parse_datetime_array(values, unit)
+    return np.array(values, dtype=str).astype(dtype)
@@ -1,8 +1,7 @@
 """Market models."""
-import collections
-import itertools
+import asyncio
 
-from . import esi, util, trade
+from . import esi, storage, util
 from . import LoggingObject, config
 
 
@@ -20,23 +19,45 @@ class Market(esi.ESIClientWrapper):
 
     _client_class = esi.ESIClient
 
-    def __init__(self, *args, **kwargs):
+    _orders_endpoint = 'markets_region_id_orders'
+
+    def __init__(self, *args, store=None, **kwargs):
+        """Optionally provide an ESI client and/or an order store.
+
+        Parameters
+        ----------
+
+        client : evetele.esi.ESIClient, optional
+            An existing ESI client instance.
+
+        store : optional
+            Order store backend (see `evetele.storage`). Defaults to
+            a new `storage.TreeOrderStore`.
+        """
         super().__init__(*args, **kwargs)
-        # region_id: regional market data
-        self._data = collections.defaultdict(
-            # system_id: system market data
-            lambda: collections.defaultdict(
-                # location_id: location market data
-                lambda: collections.defaultdict(
-                    # type_id: market orders
-                    lambda: collections.defaultdict(list)
-                )
-            )
-        )
+        if store is not None:
+            self._data = store
+        self._listeners = []
+
+    @util.cached_property
+    def _data(self):
+        return storage.TreeOrderStore()
 
     def __getitem__(self, key):
         return self._data[key]
 
+    def add_listener(self, callback):
+        """Register a callable to receive changes from every update.
+
+        After each update, `callback` is called with the
+        `OrderChanges` for the updated region (or region and type).
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Unregister a callable added with `add_listener`."""
+        self._listeners.remove(callback)
+
     def update(self, region_id, type_id=None):
         """Update the market data dict and return the updated subset.
 
@@ -46,27 +67,168 @@ class Market(esi.ESIClientWrapper):
         types or a single type because this is the degree of freedom
         offered by the ESI API.
         """
+        return self._update(region_id, type_id)[0]
+
+    def update_changes(self, region_id, type_id=None):
+        """Update the market data dict and return what changed.
+
+        The update is as for `update`.
+
+        Returns
+        -------
+
+        OrderChanges
+            Orders created, changed or removed by the update.
+        """
+        return self._update(region_id, type_id, track=True)[1]
+
+    def ingest(self, region_id, records, t, type_id=None):
+        """Store market orders obtained elsewhere, e.g. client exports.
+
+        `records` (ESI market order records) replace the stored orders
+        as for `update`, with `t` as their snapshot time. Listeners
+        receive the changes as for any update.
+
+        Returns
+        -------
+
+        The updated region node.
+        """
+        return self._store(region_id, records, t, type_id)[0]
+
+    def _update(self, region_id, type_id=None, track=False):
         tstamp = util.get_utc_datetime()
-        endpoint = 'markets_region_id_orders'
+        params = self._order_params(region_id, type_id)
+        # Orders are streamed into the store as pages arrive.
+        records = self.fetch_iter(endpoint=self._orders_endpoint,
+                                  **params)
+        return self._store(region_id, records, tstamp, type_id, track)
+
+    def _store(self, region_id, records, tstamp, type_id=None,
+               track=False):
+        # Write records to the store, tracking changes if requested or
+        # if anyone is listening. Returns (region node, changes).
+        if not (track or self._listeners):
+            node = self._data.update(region_id, records, tstamp, type_id)
+            return node, None
+
+        tracker = _ChangeTracker(
+            self._data.orders_by_id(region_id, type_id)
+        )
+        node = self._data.update(region_id, tracker.track(records),
+                                 tstamp, type_id)
+        changes = tracker.changes(
+            self._data.orders_by_id(region_id, type_id),
+            region_id, tstamp, type_id
+        )
+        for callback in list(self._listeners):
+            callback(changes)
+        return node, changes
+
+    def update_many(self, region_ids, type_id=None):
+        """Update several regional markets concurrently.
+
+        Pages for all regions are fetched concurrently through an
+        `esi.AsyncESIClient` sharing this market's client, then each
+        region is updated as for `update`.
+
+        Returns
+        -------
+
+        dict
+            Map of region ID to the updated region node.
+        """
+        region_ids = list(region_ids)
+        tstamp = util.get_utc_datetime()
+        calls = [(self._orders_endpoint,
+                  self._order_params(region_id, type_id))
+                 for region_id in region_ids]
+        results = asyncio.run(self._async_client.fetch_many(calls))
+        return {
+            region_id: self._store(region_id, records, tstamp,
+                                   type_id)[0]
+            for region_id, records in zip(region_ids, results)
+        }
+
+    @util.cached_property
+    def _async_client(self):
+        return esi.AsyncESIClient(self._client)
+
+    @staticmethod
+    def _order_params(region_id, type_id=None):
         params = {'region_id': region_id}
         if type_id is not None:
             params.update({'type_id': type_id})
+        return params
+
+
+class OrderChanges(object):
+    """Market orders created, changed and removed by an update.
 
-        region_node = self._data[region_id]
-        seen = set()
-        for data in self.fetch(endpoint=endpoint, **params):
-            type_id = data['type_id']
-            system_node = region_node[data['system_id']]
-            station_node = system_node[data['location_id']]
-            order_list = station_node[type_id]
-            if not type_id in seen:
-                # Remove the contents of the current order list
-                del order_list[:]
-                seen.add(type_id)
-            order_list.append(
-                trade.MarketOrderSnapshot(data, t=tstamp)
-            )
-        return region_node
+    Each of `created`, `changed` and `removed` is a dictionary keyed
+    by order ID. Created and changed orders are the newly stored
+    orders; removed orders (filled, cancelled or expired since the
+    previous update) are the last versions seen. An order has changed
+    if its price or remaining volume differs.
+    """
+
+    def __init__(self, region_id, t, type_id=None, created=None,
+                 changed=None, removed=None):
+        self.region_id = region_id
+        self.type_id = type_id
+        self.t = t
+        self.created = created or {}
+        self.changed = changed or {}
+        self.removed = removed or {}
+
+    def __len__(self):
+        return len(self.created) + len(self.changed) + len(self.removed)
+
+    def __repr__(self):
+        return ('<{} region={} type={} created={} changed={} '
+                'removed={}>'.format(type(self).__name__,
+                                     self.region_id, self.type_id,
+                                     len(self.created),
+                                     len(self.changed),
+                                     len(self.removed)))
+
+
+class _ChangeTracker(object):
+    # Compares records streaming into a store against the orders
+    # previously stored, via the store's order ID index.
+
+    _compared_fields = ('price', 'volume_remain')
+
+    def __init__(self, previous):
+        self._previous = previous
+        self._seen = set()
+        self._created = []
+        self._changed = []
+
+    def track(self, records):
+        previous = self._previous
+        fields = self._compared_fields
+        for data in records:
+            order_id = data['order_id']
+            self._seen.add(order_id)
+            try:
+                old = previous[order_id]
+            except KeyError:
+                self._created.append(order_id)
+            else:
+                if any(old[f] != data[f] for f in fields):
+                    self._changed.append(order_id)
+            yield data
+
+    def changes(self, current, region_id, t, type_id=None):
+        previous = self._previous
+        return OrderChanges(
+            region_id, t, type_id,
+            created={i: current[i] for i in self._created},
+            changed={i: current[i] for i in self._changed},
+            removed={i: previous[i]
+                     for i in previous.keys() - self._seen},
+        )
 
 
 global_market = Market()
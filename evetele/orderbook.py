@@ -0,0 +1,400 @@
+"""Order books built over market order snapshots.
+
+`OrderBook` keeps the bid (buy) and ask (sell) orders for every
+location and type in sorted order, so the best prices, spread, depth
+and volume-weighted prices are cheap to look up. Attached to a
+`market.Market`, it is kept up to date incrementally from the
+`market.OrderChanges` of each update.
+
+`BuyOrderIndex` answers the converse question for buy orders, whose
+`range` extends beyond their own location: which buy orders can a
+sell order at a given station fill.
+"""
+import bisect
+
+from . import static
+
+
+BID = 'bid'
+ASK = 'ask'
+
+
+class OrderBook(object):
+    """Bid and ask sides per (location, type).
+
+    Queries take a location (station or structure) ID and type ID;
+    `side` is either `BID` (buy orders) or `ASK` (sell orders). To
+    buy a quantity of items you take from the asks, and to sell you
+    take from the bids.
+    """
+
+    def __init__(self):
+        # (location_id, type_id): _Book
+        self._books = {}
+        # order_id: (location_id, type_id)
+        self._order_keys = {}
+
+    def __len__(self):
+        return len(self._order_keys)
+
+    def __contains__(self, key):
+        return key in self._books
+
+    def attach(self, market):
+        """Apply the changes from every update of `market`.
+
+        Orders already in the market are not added; see `add`.
+        """
+        market.add_listener(self.apply)
+
+    def detach(self, market):
+        """Stop applying the changes from `market`."""
+        market.remove_listener(self.apply)
+
+    def add(self, orders):
+        """Add (or replace) market orders, e.g. to seed the book."""
+        for order in orders:
+            self._remove(order.id)
+            self._add(order)
+
+    def remove(self, order_ids):
+        """Remove orders by order ID, ignoring unknown IDs."""
+        for order_id in order_ids:
+            self._remove(order_id)
+
+    def apply(self, changes):
+        """Apply a `market.OrderChanges` to the book."""
+        self.remove(changes.removed)
+        self.add(changes.changed.values())
+        self.add(changes.created.values())
+
+    def _add(self, order):
+        key = (order['location_id'], order['type_id'])
+        try:
+            book = self._books[key]
+        except KeyError:
+            book = self._books[key] = _Book()
+        side = book.bids if order.is_buy_order else book.asks
+        side.add(order.id, order['price'], order['volume_remain'])
+        self._order_keys[order.id] = key
+
+    def _remove(self, order_id):
+        try:
+            key = self._order_keys.pop(order_id)
+        except KeyError:
+            return
+        book = self._books[key]
+        book.remove(order_id)
+        if not book:
+            del self._books[key]
+
+    def _side(self, location_id, type_id, side):
+        try:
+            book = self._books[location_id, type_id]
+        except KeyError:
+            return _EMPTY_SIDE
+        if side == BID:
+            return book.bids
+        elif side == ASK:
+            return book.asks
+        raise ValueError("side must be {!r} or {!r}".format(BID, ASK))
+
+    def best_bid(self, location_id, type_id):
+        """Highest buy order price, or None if there are no bids."""
+        return self._side(location_id, type_id, BID).best
+
+    def best_ask(self, location_id, type_id):
+        """Lowest sell order price, or None if there are no asks."""
+        return self._side(location_id, type_id, ASK).best
+
+    def spread(self, location_id, type_id):
+        """Best ask less best bid, or None if either side is empty."""
+        bid = self.best_bid(location_id, type_id)
+        ask = self.best_ask(location_id, type_id)
+        if bid is None or ask is None:
+            return None
+        return ask - bid
+
+    def volume(self, location_id, type_id, side=ASK):
+        """Total volume remaining on one side of the book."""
+        return self._side(location_id, type_id, side).volume
+
+    def levels(self, location_id, type_id, side=ASK):
+        """List of (price, volume) price levels, best first."""
+        return self._side(location_id, type_id, side).levels()
+
+    def depth(self, location_id, type_id, quantity, side=ASK):
+        """Worst price reached taking `quantity` units from a side.
+
+        Returns None if the side holds fewer than `quantity` units.
+        """
+        return self._side(location_id, type_id, side).depth(quantity)
+
+    def vwap(self, location_id, type_id, quantity, side=ASK):
+        """Volume-weighted average price of `quantity` units.
+
+        This is the average price paid (or received) taking
+        `quantity` units from the best orders on a side. Returns None
+        if the side holds fewer than `quantity` units.
+        """
+        return self._side(location_id, type_id, side).vwap(quantity)
+
+
+class _Book(object):
+    # Both sides of the book for one location and type.
+
+    __slots__ = ('bids', 'asks')
+
+    def __init__(self):
+        self.bids = _BookSide(descending=True)
+        self.asks = _BookSide(descending=False)
+
+    def __bool__(self):
+        return bool(self.bids or self.asks)
+
+    def remove(self, order_id):
+        if not self.bids.remove(order_id):
+            self.asks.remove(order_id)
+
+
+class _BookSide(object):
+    # Orders on one side of a book, best price first.
+    #
+    # Orders are kept in a list of (signed price, order ID) keys
+    # maintained by bisection; prices are negated for descending
+    # (bid) sides. Cumulative volumes and values, used for depth and
+    # VWAP queries, are built on demand and dropped on change.
+
+    def __init__(self, descending=False):
+        self._sign = -1 if descending else 1
+        self._keys = []
+        # order_id: (key, volume)
+        self._entries = {}
+        self._cumulative = None
+
+    def __bool__(self):
+        return bool(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, order_id, price, volume):
+        key = (self._sign * price, order_id)
+        bisect.insort(self._keys, key)
+        self._entries[order_id] = (key, volume)
+        self._cumulative = None
+
+    def remove(self, order_id):
+        # Returns False if the order isn't on this side.
+        try:
+            key, __ = self._entries.pop(order_id)
+        except KeyError:
+            return False
+        del self._keys[bisect.bisect_left(self._keys, key)]
+        self._cumulative = None
+        return True
+
+    @property
+    def best(self):
+        if not self._keys:
+            return None
+        return self._sign * self._keys[0][0]
+
+    @property
+    def volume(self):
+        return self._prefix()[1][-1] if self._keys else 0
+
+    def levels(self):
+        levels = []
+        for signed_price, order_id in self._keys:
+            volume = self._entries[order_id][1]
+            price = self._sign * signed_price
+            if levels and levels[-1][0] == price:
+                levels[-1] = (price, levels[-1][1] + volume)
+            else:
+                levels.append((price, volume))
+        return levels
+
+    def _prefix(self):
+        # (prices, cumulative volumes, cumulative values), in order.
+        if self._cumulative is None:
+            prices, volumes, values = [], [], []
+            volume = value = 0
+            for signed_price, order_id in self._keys:
+                price = self._sign * signed_price
+                order_volume = self._entries[order_id][1]
+                volume += order_volume
+                value += price * order_volume
+                prices.append(price)
+                volumes.append(volume)
+                values.append(value)
+            self._cumulative = prices, volumes, values
+        return self._cumulative
+
+    def _fill(self, quantity):
+        # Index of the order completing `quantity` units, or None.
+        prices, volumes, __ = self._prefix()
+        i = bisect.bisect_left(volumes, quantity)
+        return i if i < len(volumes) else None
+
+    def depth(self, quantity):
+        i = self._fill(quantity)
+        return None if i is None else self._prefix()[0][i]
+
+    def vwap(self, quantity):
+        if quantity <= 0:
+            raise ValueError("quantity must be positive")
+        i = self._fill(quantity)
+        if i is None:
+            return None
+        prices, volumes, values = self._prefix()
+        filled, value = (volumes[i - 1], values[i - 1]) if i else (0, 0)
+        return (value + (quantity - filled) * prices[i]) / quantity
+
+
+_EMPTY_SIDE = _BookSide()
+
+
+class BuyOrderIndex(object):
+    """Buy orders indexed by the stations their range covers.
+
+    Orders are filed by type under their station ('station' range),
+    under every solar system they cover ('solarsystem' and N-jump
+    ranges, expanded using the static jump graph), or under their
+    region ('region' range). Looking up the orders able to buy at a
+    station then reads three buckets, at a cost proportional to the
+    number of matching orders rather than to the size of the region.
+
+    As buy orders only match sell orders in their own region, N-jump
+    ranges are restricted to the order's region. Orders with an
+    unknown range (None, as stored by `storage.ColumnarOrderStore` for
+    unrecognised values) are treated as station orders, the narrowest
+    range.
+    """
+
+    def __init__(self, esd=None):
+        """
+        Parameters
+        ----------
+
+        esd : static.EveStaticData, optional
+            Source of the jump graph and station/system locations.
+            Defaults to `static.global_esd`.
+        """
+        self._esd = esd
+        # (location_id, type_id): {order_id: order}
+        self._by_station = {}
+        # (system_id, type_id): {order_id: order}
+        self._by_system = {}
+        # (region_id, type_id): {order_id: order}
+        self._by_region = {}
+        # order_id: [(bucket, key), ...]
+        self._entries = {}
+
+    @property
+    def esd(self):
+        # Resolved late so tests may swap out the global instance.
+        return self._esd or static.global_esd
+
+    def __len__(self):
+        return len(self._entries)
+
+    def attach(self, market):
+        """Apply the changes from every update of `market`."""
+        market.add_listener(self.apply)
+
+    def detach(self, market):
+        """Stop applying the changes from `market`."""
+        market.remove_listener(self.apply)
+
+    def apply(self, changes):
+        """Apply a `market.OrderChanges` to the index."""
+        self.remove(changes.removed)
+        self.add(changes.changed.values(), changes.region_id)
+        self.add(changes.created.values(), changes.region_id)
+
+    def add(self, orders, region_id=None):
+        """Add (or replace) orders; sell orders are ignored.
+
+        Parameters
+        ----------
+
+        orders : iterable of market orders
+
+        region_id : int, optional
+            Region of the orders. Looked up from each order's system
+            if not given.
+        """
+        for order in orders:
+            self._remove(order.id)
+            if order.is_buy_order:
+                self._add(order, region_id)
+
+    def remove(self, order_ids):
+        """Remove orders by order ID, ignoring unknown IDs."""
+        for order_id in order_ids:
+            self._remove(order_id)
+
+    def _add(self, order, region_id=None):
+        type_id = order['type_id']
+        system_id = order['system_id']
+        range_ = order['range']
+        if region_id is None:
+            region_id = self.esd.system_regions.get(system_id)
+
+        if range_ == 'station' or range_ is None:
+            targets = [(self._by_station, order['location_id'])]
+        elif range_ == 'region':
+            targets = [(self._by_region, region_id)]
+        else:
+            jumps = 0 if range_ == 'solarsystem' else int(range_)
+            regions = self.esd.system_regions
+            targets = [
+                (self._by_system, covered)
+                for covered in self.esd.systems_within(system_id, jumps)
+                if regions.get(covered, region_id) == region_id
+            ]
+
+        entries = self._entries[order.id] = []
+        for bucket, key in targets:
+            bucket.setdefault((key, type_id), {})[order.id] = order
+            entries.append((bucket, (key, type_id)))
+
+    def _remove(self, order_id):
+        for bucket, key in self._entries.pop(order_id, ()):
+            orders = bucket[key]
+            del orders[order_id]
+            if not orders:
+                del bucket[key]
+
+    def matching(self, station_id, type_id, system_id=None,
+                 region_id=None):
+        """Buy orders whose range covers a station, best price first.
+
+        Parameters
+        ----------
+
+        station_id : int
+
+        type_id : int
+
+        system_id, region_id : int, optional
+            Location of the station, looked up in static data if not
+            given (as is necessary for player structures).
+
+        Returns
+        -------
+
+        list of market orders
+        """
+        if system_id is None:
+            system_id = self.esd.station_systems[station_id]
+        if region_id is None:
+            region_id = self.esd.system_regions[system_id]
+        orders = []
+        for bucket, key in ((self._by_station, station_id),
+                            (self._by_system, system_id),
+                            (self._by_region, region_id)):
+            orders.extend(bucket.get((key, type_id), {}).values())
+        orders.sort(key=lambda order: order['price'], reverse=True)
+        return orders
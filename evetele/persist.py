@@ -0,0 +1,255 @@
+"""Persistence of market orders to PostgreSQL.
+
+`OrderWriter` keeps a table of the current market orders in step with
+`market.Market`. Attached to a market, it writes the orders created
+and changed by each update, and deletes those removed, using
+`COPY FROM STDIN` into a staging table followed by a single upsert.
+"""
+import io
+import time
+
+from . import db, util
+from . import LoggingObject
+
+
+# Columns of the orders table, in COPY order.
+COLUMNS = (
+    ('order_id', 'bigint NOT NULL'),
+    ('region_id', 'integer NOT NULL'),
+    ('type_id', 'integer NOT NULL'),
+    ('location_id', 'bigint NOT NULL'),
+    ('system_id', 'integer'),
+    ('is_buy_order', 'boolean NOT NULL'),
+    ('price', 'double precision NOT NULL'),
+    ('volume_remain', 'integer NOT NULL'),
+    ('volume_total', 'integer'),
+    ('min_volume', 'integer'),
+    ('range', 'text'),
+    ('duration', 'smallint'),
+    ('issued', 'timestamptz'),
+    ('t', 'timestamptz NOT NULL'),
+)
+
+
+class OrderWriter(LoggingObject):
+    """Bulk writer of market orders to a partitioned orders table.
+
+    The table holds the latest version of each order, keyed by order
+    ID and hash-partitioned on it. Orders are staged with `COPY FROM
+    STDIN` in batches of `batch_size` rows (each batch buffered in
+    memory) and merged in one transaction: newer versions replace
+    older ones and removed orders are deleted.
+    """
+
+    def __init__(self, database=None, table='market_orders',
+                 partitions=16, batch_size=50000):
+        """
+        Parameters
+        ----------
+
+        database : db.Database, optional
+            A writable database (`readonly=False`). Defaults to a new
+            one using the configured connection details.
+
+        table : str, optional
+            Name of the orders table.
+
+        partitions : int, optional
+            Number of hash partitions, used by `create_table`.
+
+        batch_size : int, optional
+            Rows buffered in memory per COPY.
+        """
+        if database is None:
+            database = db.Database(readonly=False)
+        self.database = database
+        self.table = table
+        self.partitions = partitions
+        self.batch_size = batch_size
+        self.stats = {'written': 0, 'deleted': 0, 'seconds': 0.0}
+
+    @property
+    def _staging_table(self):
+        return '{}_staging'.format(self.table)
+
+    def create_table(self):
+        """Create the orders table and its partitions if necessary."""
+        columns = ',\n'.join('    {} {}'.format(name, definition)
+                             for name, definition in COLUMNS)
+        statements = [
+            'CREATE TABLE IF NOT EXISTS {} (\n{},\n'
+            '    PRIMARY KEY (order_id)\n'
+            ') PARTITION BY HASH (order_id)'.format(self.table, columns)
+        ]
+        for remainder in range(self.partitions):
+            statements.append(
+                'CREATE TABLE IF NOT EXISTS {0}_p{1} PARTITION OF {0} '
+                'FOR VALUES WITH (MODULUS {2}, REMAINDER {1})'.format(
+                    self.table, remainder, self.partitions
+                )
+            )
+        statements.append(
+            'CREATE INDEX IF NOT EXISTS {0}_type_idx '
+            'ON {0} (region_id, type_id)'.format(self.table)
+        )
+        with self.database.connection() as connection:
+            cursor = connection.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+
+    def attach(self, market):
+        """Write the changes from every update of `market`."""
+        market.add_listener(self.write_changes)
+
+    def detach(self, market):
+        """Stop writing the changes from `market`."""
+        market.remove_listener(self.write_changes)
+
+    def write_changes(self, changes):
+        """Persist a `market.OrderChanges`.
+
+        Created and changed orders are upserted and removed orders
+        deleted, in one transaction.
+        """
+        orders = list(changes.created.values())
+        orders.extend(changes.changed.values())
+        self.write(orders, changes.region_id, changes.t,
+                   removed=changes.removed)
+
+    def write(self, orders, region_id, t, removed=()):
+        """Upsert market orders and delete removed ones.
+
+        Parameters
+        ----------
+
+        orders : iterable of market orders
+            e.g. `trade.MarketOrderSnapshot`, streamed in batches.
+
+        region_id : int
+
+        t : datetime.datetime
+            Snapshot time of the orders.
+
+        removed : iterable of int, optional
+            IDs of orders to delete.
+        """
+        start = time.perf_counter()
+        removed = list(removed)
+        written = 0
+        with self.database.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute('BEGIN')
+            try:
+                self._create_staging_table(cursor)
+                for batch in _batches(orders, self.batch_size):
+                    buffer = _copy_buffer(batch, region_id, t)
+                    cursor.copy_expert(
+                        'COPY {} ({}) FROM STDIN'.format(
+                            self._staging_table, _column_list()
+                        ),
+                        buffer
+                    )
+                    written += len(batch)
+                if written:
+                    cursor.execute(self._upsert_sql())
+                if removed:
+                    cursor.execute(
+                        'DELETE FROM {} WHERE order_id = ANY(%s)'.format(
+                            self.table
+                        ),
+                        (removed,)
+                    )
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+        elapsed = time.perf_counter() - start
+        self.stats['written'] += written
+        self.stats['deleted'] += len(removed)
+        self.stats['seconds'] += elapsed
+        self._log.debug('Wrote %d and deleted %d orders in %.2f s',
+                        written, len(removed), elapsed)
+
+    def _create_staging_table(self, cursor):
+        # A session-local table, emptied at the end of each
+        # transaction, so pooled connections can reuse it.
+        cursor.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS {} '
+            '(LIKE {} INCLUDING DEFAULTS) '
+            'ON COMMIT DELETE ROWS'.format(self._staging_table,
+                                          self.table)
+        )
+
+    def _upsert_sql(self):
+        # Only replace stored orders with the same or newer versions.
+        names = _column_list()
+        updates = ', '.join('{0} = EXCLUDED.{0}'.format(name)
+                            for name, __ in COLUMNS
+                            if name != 'order_id')
+        return (
+            'INSERT INTO {table} ({names}) '
+            'SELECT DISTINCT ON (order_id) {names} FROM {staging} '
+            'ORDER BY order_id, t DESC '
+            'ON CONFLICT (order_id) DO UPDATE SET {updates} '
+            'WHERE {table}.t <= EXCLUDED.t'.format(
+                table=self.table, staging=self._staging_table,
+                names=names, updates=updates
+            )
+        )
+
+
+def _column_list():
+    return ', '.join(name for name, __ in COLUMNS)
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Characters escaped in COPY's text format.
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n',
+                               '\r': '\\r'})
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    elif isinstance(value, bool):
+        return 't' if value else 'f'
+    elif hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def _copy_buffer(orders, region_id, t):
+    # An in-memory file of orders in COPY text format.
+    buffer = io.StringIO()
+    t = util.parse_datetime(t).isoformat()
+    for order in orders:
+        values = []
+        for name, __ in COLUMNS:
+            if name == 'region_id':
+                value = region_id
+            elif name == 't':
+                value = t
+            elif name == 'issued':
+                value = order.issued
+            elif name == 'is_buy_order':
+                value = order.is_buy_order
+            else:
+                try:
+                    value = order[name]
+                except KeyError:
+                    value = None
+            values.append(_copy_value(value))
+        buffer.write('\t'.join(values))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
@@ -44,10 +44,9 @@ class _Location(static.StaticEntity):
 
 class Region(_Location):
 
-    _id_field = 'regionID'
     _table = 'mapRegions'
     _name_field = 'regionName'
-    _cache = {}
+    _cache = static.EntityCache()
 
     @property
     def _market_path(self):
@@ -86,22 +85,45 @@ class RegionDescendant(object):
 
 class System(RegionDescendant, _Location):
 
-    _id_field = 'solarSystemID'
     _table = 'mapSolarSystems'
     _name_field = 'solarSystemName'
-    _cache = {}
+    _cache = static.EntityCache()
 
     @property
     def _market_path(self):
         return [self.region.id, self.id]
 
+    def jumps(self, other, highsec=False):
+        """Number of jumps to another system or station (or None).
+
+        Parameters
+        ----------
+
+        other : System, Station or int
+            Destination (a system ID if an int).
+
+        highsec : bool, optional
+            Only route through high-security systems.
+        """
+        return static.global_esd.jump_graph.jumps(
+            self.id, _system_id(other), highsec=highsec
+        )
+
+    def route(self, other, highsec=False):
+        """List of system IDs on a shortest route (or None).
+
+        See `jumps` for the parameters.
+        """
+        return static.global_esd.jump_graph.route(
+            self.id, _system_id(other), highsec=highsec
+        )
+
 
 class Station(_Location, RegionDescendant):
 
-    _id_field = 'stationID'
     _table = 'staStations'
     _name_field = 'stationName'
-    _cache = {}
+    _cache = static.EntityCache()
 
     @property
     def _market_path(self):
@@ -111,5 +133,22 @@ class Station(_Location, RegionDescendant):
     def system(self):
         return System(self.system_id)
 
+    def jumps(self, other, highsec=False):
+        """Number of jumps to another system or station (or None)."""
+        return self.system.jumps(other, highsec=highsec)
+
+    def route(self, other, highsec=False):
+        """List of system IDs on a shortest route (or None)."""
+        return self.system.route(other, highsec=highsec)
+
+
+def _system_id(location):
+    # System ID of a System, a Station or a system ID.
+    if isinstance(location, Station):
+        return location.system.id
+    elif isinstance(location, System):
+        return location.id
+    return location
+
 
 Location = Station
@@ -2,20 +2,55 @@
 
 Communicates with a database via the `db` module to provide an adapter
 for querying a copy of the EVE SDE.
+
+The structures queried on start-up can be exported to a local
+snapshot file with `EveStaticData.export_snapshot`. While a current
+snapshot exists it is loaded instead of querying the database.
 """
 import abc
+import bisect
+import collections
+import collections.abc
+import logging
+import os
+import pickle
+import time
+import weakref
+
+import numpy as np
 
 from . import db, config
-from .util import cached_property, classproperty
+from . import USER_DATA_DIR
+from .util import LRUCache, cached_property, classproperty
+
+
+log = logging.getLogger(__name__)
+
+
+SNAPSHOT_VERSION = 1
 
 
 class EveStaticData(object):
 
     db = db.Database()
 
+    # Location of the local SDE snapshot (None to disable it). May be
+    # overridden with 'snapshot path' in the [StaticData] config
+    # section; 'snapshot max age' (days) marks older snapshots stale.
+    snapshot_path = os.path.join(
+        USER_DATA_DIR, 'sde.v{}.pickle'.format(SNAPSHOT_VERSION)
+    )
+
+    # Sections of the snapshot, each named after the property it holds.
+    _snapshot_sections = ('regions', 'market_types', 'system_jumps',
+                          'system_security', 'type_table')
+
     @cached_property
     def regions(self):
         """Metadata for regions and member solar systems."""
+        return self._from_snapshot('regions', self._query_regions)
+
+    def _query_regions(self):
         cursor = self.db.query(
             """
             SELECT regions."regionID" AS region_id
@@ -60,6 +95,10 @@ class EveStaticData(object):
     @cached_property
     def market_types(self):
         """Metadata for types that can be sold on the market."""
+        return self._from_snapshot('market_types',
+                                   self._query_market_types)
+
+    def _query_market_types(self):
         cursor = self.db.query(
             """
             SELECT "typeID" as id
@@ -74,6 +113,36 @@ class EveStaticData(object):
             for rec in cursor.fetchall()
         }
 
+    @cached_property
+    def type_table(self):
+        """Array-backed metadata for all item types (see `TypeTable`).
+        """
+        return self._from_snapshot('type_table', self._query_type_table)
+
+    def _query_type_table(self):
+        types = self.db.query(
+            """
+            SELECT "typeID" AS type_id
+                 , "typeName" AS name
+                 , "groupID" AS group_id
+                 , "marketGroupID" AS market_group_id
+                 , "volume" AS volume
+                 , "portionSize" AS portion_size
+                 , "basePrice" AS base_price
+                 , "published" AS published
+              FROM "invTypes"
+            """
+        ).fetchall()
+        groups = self.db.query(
+            """
+            SELECT "marketGroupID" AS market_group_id
+                 , "parentGroupID" AS parent_group_id
+                 , "marketGroupName" AS name
+              FROM "invMarketGroups"
+            """
+        ).fetchall()
+        return TypeTable(types, groups)
+
     @cached_property
     def stations(self):
         """Metadata for stations."""
@@ -94,6 +163,232 @@ class EveStaticData(object):
                 systems[system_id] = system_dict
         return systems
 
+    @cached_property
+    def system_regions(self):
+        """Map of solar system ID to region ID."""
+        return {
+            system_id: region_id
+            for region_id, region_dict in self.regions.items()
+            for system_id in region_dict['systems']
+        }
+
+    @cached_property
+    def station_systems(self):
+        """Map of station ID to solar system ID."""
+        return {
+            station_id: system_id
+            for system_id, system_dict in self.systems.items()
+            for station_id in system_dict['stations']
+        }
+
+    @cached_property
+    def system_jumps(self):
+        """Map of solar system ID to the IDs of adjacent systems.
+
+        Systems are adjacent if connected by a stargate.
+        """
+        return self._from_snapshot('system_jumps',
+                                   self._query_system_jumps)
+
+    def _query_system_jumps(self):
+        cursor = self.db.query(
+            """
+            SELECT "fromSolarSystemID" AS from_id
+                 , "toSolarSystemID" AS to_id
+              FROM "mapSolarSystemJumps"
+            """
+        )
+        jumps = collections.defaultdict(set)
+        for record in cursor.fetchall():
+            jumps[record.from_id].add(record.to_id)
+            jumps[record.to_id].add(record.from_id)
+        return dict(jumps)
+
+    @cached_property
+    def system_security(self):
+        """Map of solar system ID to (true) security status."""
+        return self._from_snapshot('system_security',
+                                   self._query_system_security)
+
+    def _query_system_security(self):
+        cursor = self.db.query(
+            """
+            SELECT "solarSystemID" AS system_id
+                 , "security" AS security
+              FROM "mapSolarSystems"
+            """
+        )
+        return {record.system_id: record.security
+                for record in cursor.fetchall()}
+
+    @cached_property
+    def jump_graph(self):
+        """The stargate network as a `JumpGraph`."""
+        return JumpGraph.from_adjacency(self.system_jumps,
+                                        self.system_security)
+
+    @cached_property
+    def trade_hub_jumps(self):
+        """Jumps between each pair of trade hub stations.
+
+        A dict of dicts keyed by station ID; None marks hubs that are
+        not connected by stargates.
+        """
+        station_ids = [hub['id'] for hub in self.trade_hubs]
+        system_ids = [self.station_systems[station_id]
+                      for station_id in station_ids]
+        matrix = self.jump_graph.distance_matrix(system_ids)
+        return {
+            a: {b: (int(matrix[i, j]) if matrix[i, j] >= 0 else None)
+                for j, b in enumerate(station_ids)}
+            for i, a in enumerate(station_ids)
+        }
+
+    @cached_property
+    def _snapshot(self):
+        # Sections of the snapshot file, or {} if there is no current
+        # snapshot.
+        path = self._snapshot_file()
+        if path is None or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as exc:
+            log.warning("Ignoring unreadable SDE snapshot %s: %s",
+                        path, exc)
+            return {}
+        if not (isinstance(snapshot, dict)
+                and isinstance(snapshot.get('header'), dict)
+                and isinstance(snapshot.get('sections'), dict)):
+            log.warning("Ignoring unreadable SDE snapshot %s: "
+                        "unexpected content", path)
+            return {}
+        if self._snapshot_is_stale(snapshot['header']):
+            log.info("Ignoring stale SDE snapshot %s", path)
+            return {}
+        return snapshot['sections']
+
+    def _snapshot_file(self):
+        try:
+            return os.path.expanduser(
+                config['StaticData']['snapshot path']
+            )
+        except KeyError:
+            return self.snapshot_path
+
+    @staticmethod
+    def _snapshot_source():
+        # Identifies the database a snapshot was exported from.
+        details = config['PostgreSQLDB'] if 'PostgreSQLDB' in config else {}
+        return {key: details.get(key)
+                for key in ('host', 'port', 'database')}
+
+    def _snapshot_is_stale(self, header):
+        if header.get('version') != SNAPSHOT_VERSION:
+            return True
+        if header.get('source') != self._snapshot_source():
+            return True
+        try:
+            max_age = float(config['StaticData']['snapshot max age'])
+        except KeyError:
+            return False
+        return time.time() - header['created'] > max_age * 86400
+
+    def _from_snapshot(self, section, query):
+        # Load a section from the snapshot, falling back to `query`.
+        try:
+            return self._snapshot[section]
+        except KeyError:
+            return query()
+
+    def export_snapshot(self, path=None):
+        """Export the static data structures to a snapshot file.
+
+        The structures are always queried from the database. Once
+        exported, new instances load them from the snapshot instead.
+
+        Parameters
+        ----------
+
+        path : str, optional
+            Defaults to the configured snapshot path.
+
+        Returns
+        -------
+
+        str
+            Path of the snapshot.
+        """
+        path = path or self._snapshot_file()
+        snapshot = {
+            'header': {
+                'version': SNAPSHOT_VERSION,
+                'created': time.time(),
+                'source': self._snapshot_source(),
+            },
+            'sections': {
+                section: getattr(self, '_query_{}'.format(section))()
+                for section in self._snapshot_sections
+            },
+        }
+        # Write atomically so readers never see a partial snapshot.
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return path
+
+    # Cached structures dropped by `refresh`.
+    _derived_properties = (
+        'regions', 'market_types', 'system_jumps', 'system_security',
+        'jump_graph', 'type_table', 'stations', 'systems',
+        'system_regions', 'station_systems', 'trade_hubs',
+        'trade_hub_jumps',
+        '_snapshot', '_name_indexes', '_distance_cache',
+    )
+
+    def refresh(self):
+        """Drop all cached static data, e.g. after an SDE update.
+
+        Structures are reloaded (from a current snapshot or the
+        database) on next access. The instance caches of all
+        `StaticEntity` classes are invalidated too.
+        """
+        for name in self._derived_properties:
+            self.__dict__.pop('_cached_{}'.format(name), None)
+        StaticEntity.invalidate_all()
+
+    @cached_property
+    def _distance_cache(self):
+        return {}
+
+    def systems_within(self, system_id, jumps):
+        """Systems within a number of jumps of a solar system.
+
+        Distances are computed once (see `JumpGraph.within`) and
+        cached.
+
+        Returns
+        -------
+
+        dict
+            Map of solar system ID to distance in jumps, including
+            `system_id` itself at distance 0.
+        """
+        key = (system_id, jumps)
+        try:
+            return self._distance_cache[key]
+        except KeyError:
+            pass
+        try:
+            distances = self.jump_graph.within(system_id, jumps)
+        except KeyError:
+            # Not connected to the stargate network.
+            distances = {system_id: 0}
+        self._distance_cache[key] = distances
+        return distances
+
     @cached_property
     def trade_hubs(self):
         """Metadata for trade hub stations."""
@@ -106,34 +401,559 @@ class EveStaticData(object):
         # Fetch trade hub ids from config and make sure they're ints
         return map(int, config['Places']['trade hubs'].split(','))
 
+    def _entity_data(self, entity):
+        # The metadata dict for an entity name, e.g. 'region'.
+        try:
+            return getattr(self, '{}s'.format(entity))
+        except AttributeError:
+            raise ValueError("Unknown entity '{}'".format(entity))
+
+    @cached_property
+    def _name_indexes(self):
+        # entity: _NameIndex, built on first lookup by name.
+        return {}
+
+    def name_index(self, entity):
+        """The name index for an entity's metadata (see `find`)."""
+        try:
+            return self._name_indexes[entity]
+        except KeyError:
+            index = _NameIndex(self._entity_data(entity))
+            self._name_indexes[entity] = index
+            return index
+
+    def get_id(self, entity, name):
+        """Get the ID of an object from its name.
+
+        Names are matched case-insensitively; an exact-case match is
+        preferred where names differ only in case.
+
+        Raises
+        ------
+
+        ValueError
+            If no object has the name.
+        """
+        id_ = self.name_index(entity).get(name)
+        if id_ is None:
+            raise ValueError("Unknown {} '{}'".format(entity, name))
+        return id_
+
+    def find(self, entity, text, prefix=False):
+        """Metadata for the objects with a name matching `text`.
+
+        Parameters
+        ----------
+
+        entity : str in {'region', 'station', 'system', 'market_type'}
+
+        text : str
+            Name to match, case-insensitively.
+
+        prefix : bool, optional
+            Match names starting with `text` rather than equal to it.
+
+        Returns
+        -------
+
+        list of dict
+            Metadata, ordered by name.
+        """
+        data = self._entity_data(entity)
+        index = self.name_index(entity)
+        ids = index.prefixed(text) if prefix else index.matching(text)
+        return [data[id_] for id_ in ids]
+
     def get_metadata(self, entity, identifier):
         """Get supported metadata for the specified object.
 
         Parameters
         ----------
 
-        entity : str in {'region', 'station', 'system'}
+        entity : str in {'region', 'station', 'system', 'market_type'}
             Entity to look up
 
         identifier: int or str
-            Either the entity's ID or its name
+            Either the entity's ID or its name (see `get_id`)
         """
-        try:
-            data = getattr(self, '{}s'.format(entity))
-        except AttributeError:
-            raise ValueError("Unknown entity '{}'".format(entity))
-
+        data = self._entity_data(entity)
         if isinstance(identifier, str):
-            for metadata in data.values():
-                if metadata['name'] == identifier:
-                    return metadata
-            else:
-                raise ValueError(
-                    "Unknown {} '{}'".format(entity, identifier)
+            identifier = self.get_id(entity, identifier)
+        return data[identifier]
+
+    def get_metadata_many(self, entity, identifiers):
+        """Get metadata for several objects at once.
+
+        As `get_metadata`, but the entity's data and name index are
+        looked up once for the batch.
+
+        Returns
+        -------
+
+        list of dict
+            Metadata in the order of `identifiers`.
+        """
+        data = self._entity_data(entity)
+        index = None
+        metadata = []
+        for identifier in identifiers:
+            if isinstance(identifier, str):
+                if index is None:
+                    index = self.name_index(entity)
+                id_ = index.get(identifier)
+                if id_ is None:
+                    raise ValueError(
+                        "Unknown {} '{}'".format(entity, identifier)
+                    )
+                identifier = id_
+            metadata.append(data[identifier])
+        return metadata
+
+
+class TypeTable(object):
+    """Item type metadata as NumPy arrays, for vectorised lookups.
+
+    One row per type, sorted by type ID. `get` looks up a field for
+    an array of type IDs (e.g. the 'type_id' column of
+    `storage.ColumnarOrderStore`) without a Python loop, and
+    `market_group_types` selects all types under a market group.
+
+    Fields are those in `FIELDS`; a missing market group is stored
+    as -1.
+    """
+
+    FIELDS = (
+        ('group_id', np.int32),
+        ('market_group_id', np.int32),
+        ('volume', np.float64),
+        ('portion_size', np.int32),
+        ('base_price', np.float64),
+        ('published', np.bool_),
+        ('name', object),
+    )
+
+    def __init__(self, types, groups=()):
+        """
+        Parameters
+        ----------
+
+        types : iterable of records
+            invTypes records with attributes type_id and the names in
+            `FIELDS`.
+
+        groups : iterable of records
+            invMarketGroups records with attributes market_group_id,
+            parent_group_id and name.
+        """
+        types = sorted(types, key=lambda record: record.type_id)
+        self.type_ids = np.array([r.type_id for r in types],
+                                 dtype=np.int32)
+        self.columns = {}
+        for name, dtype in self.FIELDS:
+            values = [getattr(r, name) for r in types]
+            if name == 'market_group_id':
+                values = [-1 if v is None else v for v in values]
+            elif dtype is not object:
+                values = [0 if v is None else v for v in values]
+            self.columns[name] = np.array(values, dtype=dtype)
+
+        self.market_groups = {}
+        # market_group_id: [child market_group_id, ...]
+        self._children = collections.defaultdict(list)
+        for record in groups:
+            self.market_groups[record.market_group_id] = {
+                'id': record.market_group_id,
+                'name': record.name,
+                'parent_id': record.parent_group_id,
+            }
+            if record.parent_group_id is not None:
+                self._children[record.parent_group_id].append(
+                    record.market_group_id
                 )
+        self._children = dict(self._children)
 
+    def __len__(self):
+        return len(self.type_ids)
+
+    def __contains__(self, type_id):
+        i = np.searchsorted(self.type_ids, type_id)
+        return i < len(self.type_ids) and self.type_ids[i] == type_id
+
+    def positions(self, type_ids):
+        """Row positions of `type_ids` and a mask of those found."""
+        type_ids = np.asarray(type_ids)
+        positions = np.searchsorted(self.type_ids, type_ids)
+        positions = np.minimum(positions, max(len(self.type_ids) - 1, 0))
+        if not len(self.type_ids):
+            return positions, np.zeros(type_ids.shape, dtype=bool)
+        found = self.type_ids[positions] == type_ids
+        return positions, found
+
+    def get(self, field, type_ids, default=None):
+        """Array of a field's values for an array of type IDs.
+
+        Parameters
+        ----------
+
+        field : str
+            One of the names in `FIELDS`.
+
+        type_ids : array-like of int
+
+        default : optional
+            Value for unknown type IDs. If not given, unknown type IDs
+            raise KeyError.
+        """
+        column = self.columns[field]
+        positions, found = self.positions(type_ids)
+        if not len(column):
+            values = np.empty(positions.shape, dtype=column.dtype)
+        else:
+            values = column[positions]
+        if not found.all():
+            if default is None:
+                missing = np.asarray(type_ids)[~found]
+                raise KeyError(missing.tolist())
+            if column.dtype != object:
+                values = values.astype(np.result_type(values, default))
+            values[~found] = default
+        return values
+
+    def volume(self, type_ids, default=None):
+        """Volume (m3) per unit for an array of type IDs."""
+        return self.get('volume', type_ids, default)
+
+    def descendant_groups(self, market_group_id):
+        """IDs of a market group and all groups beneath it."""
+        groups = [market_group_id]
+        i = 0
+        while i < len(groups):
+            groups.extend(self._children.get(groups[i], ()))
+            i += 1
+        return groups
+
+    def market_group_types(self, market_group_id, recursive=True):
+        """Type IDs in a market group (and, by default, its subgroups).
+        """
+        if recursive:
+            groups = self.descendant_groups(market_group_id)
         else:
-            return data[identifier]
+            groups = [market_group_id]
+        mask = np.isin(self.columns['market_group_id'], groups)
+        return self.type_ids[mask]
+
+
+class JumpGraph(object):
+    """The stargate network in compressed sparse row (CSR) form.
+
+    Systems are numbered by their position in the sorted
+    `system_ids` array; the neighbours of the system at position i
+    are `indices[indptr[i]:indptr[i + 1]]`. Breadth-first searches
+    expand a whole frontier at a time with array operations, so a
+    search over all of New Eden takes milliseconds.
+
+    Searches may be restricted to high-security space, in which case
+    every system entered after the origin must be high-security.
+    """
+
+    # True security at or above which a system is high-security
+    # (displayed security is rounded to one decimal place).
+    HIGHSEC = 0.45
+
+    def __init__(self, system_ids, indptr, indices, security=None):
+        self.system_ids = np.asarray(system_ids)
+        self.indptr = np.asarray(indptr)
+        self.indices = np.asarray(indices)
+        self.security = (None if security is None
+                         else np.asarray(security, dtype=np.float64))
+
+    @classmethod
+    def from_adjacency(cls, adjacency, security=None):
+        """Build a graph from a system -> neighbours mapping.
+
+        Parameters
+        ----------
+
+        adjacency : dict
+            Map of system ID to an iterable of adjacent system IDs
+            (see `EveStaticData.system_jumps`).
+
+        security : dict, optional
+            Map of system ID to security status. Systems without
+            stargates are included as isolated systems.
+        """
+        systems = set(adjacency)
+        for neighbours in adjacency.values():
+            systems.update(neighbours)
+        if security is not None:
+            systems.update(security)
+        system_ids = np.array(sorted(systems), dtype=np.int64)
+        position = {system_id: i for i, system_id in
+                    enumerate(system_ids.tolist())}
+
+        counts = np.zeros(len(system_ids), dtype=np.int64)
+        indices = []
+        for i, system_id in enumerate(system_ids.tolist()):
+            neighbours = sorted(position[n]
+                                for n in adjacency.get(system_id, ()))
+            counts[i] = len(neighbours)
+            indices.extend(neighbours)
+        indptr = np.zeros(len(system_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        if security is not None:
+            security = [security.get(system_id, np.nan)
+                        for system_id in system_ids.tolist()]
+        return cls(system_ids, indptr,
+                   np.array(indices, dtype=np.int64), security)
+
+    def __len__(self):
+        return len(self.system_ids)
+
+    def __contains__(self, system_id):
+        i = np.searchsorted(self.system_ids, system_id)
+        return (i < len(self.system_ids)
+                and self.system_ids[i] == system_id)
+
+    def _position(self, system_id):
+        if system_id not in self:
+            raise KeyError(system_id)
+        return int(np.searchsorted(self.system_ids, system_id))
+
+    @cached_property
+    def _highsec(self):
+        if self.security is None:
+            raise ValueError("No security status for this graph")
+        return self.security >= self.HIGHSEC
+
+    def neighbours(self, system_id):
+        """Array of the IDs of systems adjacent to a system."""
+        i = self._position(system_id)
+        return self.system_ids[self.indices[self.indptr[i]:
+                                            self.indptr[i + 1]]]
+
+    def _search(self, source, max_jumps=None, highsec=False,
+                target=None):
+        # Breadth-first search from a position. Returns arrays of the
+        # distance (-1 if unreached) and predecessor position for
+        # every system. Stops early once `target` is reached.
+        n = len(self.system_ids)
+        distances = np.full(n, -1, dtype=np.int32)
+        parents = np.full(n, -1, dtype=np.int64)
+        distances[source] = 0
+        allowed = self._highsec if highsec else None
+        indptr, indices = self.indptr, self.indices
+        frontier = np.array([source])
+        level = 0
+        while len(frontier):
+            if max_jumps is not None and level >= max_jumps:
+                break
+            if target is not None and distances[target] >= 0:
+                break
+            starts = indptr[frontier]
+            counts = indptr[frontier + 1] - starts
+            # Offsets into `indices` of every frontier neighbour.
+            offsets = (np.arange(counts.sum())
+                       + np.repeat(starts - np.cumsum(counts) + counts,
+                                   counts))
+            neighbours = indices[offsets]
+            sources = np.repeat(frontier, counts)
+            new = distances[neighbours] < 0
+            if allowed is not None:
+                new &= allowed[neighbours]
+            frontier, first = np.unique(neighbours[new],
+                                        return_index=True)
+            level += 1
+            distances[frontier] = level
+            parents[frontier] = sources[new][first]
+        return distances, parents
+
+    def distances(self, system_id, max_jumps=None, highsec=False):
+        """Jumps from a system to every system in `system_ids`.
+
+        Unreachable systems (or those beyond `max_jumps`) are -1.
+        """
+        return self._search(self._position(system_id), max_jumps,
+                            highsec)[0]
+
+    def within(self, system_id, jumps, highsec=False):
+        """Map of system ID to jumps for systems within `jumps`."""
+        distances = self.distances(system_id, jumps, highsec)
+        reached = np.flatnonzero(distances >= 0)
+        return dict(zip(self.system_ids[reached].tolist(),
+                        distances[reached].tolist()))
+
+    def jumps(self, origin, destination, highsec=False):
+        """Number of jumps on the shortest route, or None."""
+        target = self._position(destination)
+        distances, __ = self._search(self._position(origin),
+                                     highsec=highsec, target=target)
+        if distances[target] < 0:
+            return None
+        return int(distances[target])
+
+    def route(self, origin, destination, highsec=False):
+        """System IDs on a shortest route, inclusive, or None."""
+        target = self._position(destination)
+        distances, parents = self._search(self._position(origin),
+                                          highsec=highsec,
+                                          target=target)
+        if distances[target] < 0:
+            return None
+        path = [target]
+        while parents[path[-1]] >= 0:
+            path.append(int(parents[path[-1]]))
+        return self.system_ids[path[::-1]].tolist()
+
+    def distance_matrix(self, system_ids, highsec=False):
+        """Jumps between each pair of systems, -1 if unreachable."""
+        positions = [self._position(system_id)
+                     for system_id in system_ids]
+        matrix = np.empty((len(positions), len(positions)),
+                          dtype=np.int32)
+        for i, source in enumerate(positions):
+            distances, __ = self._search(source, highsec=highsec)
+            matrix[i] = distances[positions]
+        return matrix
+
+
+class _NameIndex(object):
+    # Case-insensitive reverse index of a metadata dict's names.
+    #
+    # Exact lookups use a dict of folded name -> IDs; prefix lookups
+    # bisect a sorted list of (folded name, name, ID).
+
+    def __init__(self, data):
+        self._exact = {}
+        entries = []
+        for id_, metadata in data.items():
+            name = metadata['name']
+            folded = name.casefold()
+            self._exact.setdefault(folded, []).append((name, id_))
+            entries.append((folded, name, id_))
+        entries.sort()
+        self._entries = entries
+        self._folded = [entry[0] for entry in entries]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, name):
+        # ID for a name, preferring an exact-case match, or None.
+        candidates = self._exact.get(name.casefold(), ())
+        for candidate, id_ in candidates:
+            if candidate == name:
+                return id_
+        return candidates[0][1] if candidates else None
+
+    def matching(self, name):
+        return [id_ for __, id_ in
+                sorted(self._exact.get(name.casefold(), ()))]
+
+    def prefixed(self, text):
+        folded = text.casefold()
+        i = bisect.bisect_left(self._folded, folded)
+        ids = []
+        for entry_folded, __, id_ in self._entries[i:]:
+            if not entry_folded.startswith(folded):
+                break
+            ids.append(id_)
+        return ids
+
+
+class EntityCache(collections.abc.MutableMapping):
+    """Instance cache for a `StaticEntity` class.
+
+    Instances are either held in a least-recently-used cache of at
+    most `maxsize` entries or, with `weak`, only for as long as they
+    are referenced elsewhere. Hits, misses and evictions are counted
+    in `stats`.
+
+    Note that an evicted instance is not the same object as one
+    created later for the same ID; compare instances by ID.
+    """
+
+    def __init__(self, maxsize=None, weak=False):
+        """
+        Parameters
+        ----------
+
+        maxsize : int, optional
+            Maximum number of instances held. Defaults to the
+            'entity cache size' in the [StaticData] config section,
+            or unbounded if that isn't set.
+
+        weak : bool, optional
+            Hold instances by weak reference instead (no size limit
+            applies).
+        """
+        if weak:
+            if maxsize is not None:
+                raise ValueError("maxsize does not apply to weak caches")
+            self._data = weakref.WeakValueDictionary()
+        else:
+            if maxsize is None:
+                maxsize = self._configured_size()
+            self._data = LRUCache(maxsize)
+        self.weak = weak
+        self.stats = collections.Counter(hits=0, misses=0)
+
+    @staticmethod
+    def _configured_size():
+        try:
+            return int(config['StaticData']['entity cache size'])
+        except KeyError:
+            return None
+
+    @property
+    def maxsize(self):
+        """Maximum number of instances held (None if unbounded)."""
+        return None if self.weak else self._data.maxsize
+
+    def __getitem__(self, key):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.stats['misses'] += 1
+            raise
+        self.stats['hits'] += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+    def pop(self, key, *default):
+        return self._data.pop(key, *default)
+
+    def info(self):
+        """Dictionary of cache statistics and size."""
+        info = dict(self.stats)
+        info['evictions'] = 0 if self.weak else self._data.evictions
+        info['size'] = len(self)
+        info['maxsize'] = self.maxsize
+        return info
+
+    def invalidate(self, key=None):
+        """Drop one instance, or all instances if `key` is None."""
+        if key is None:
+            self.clear()
+        else:
+            self.pop(key, None)
 
 
 class StaticEntity(metaclass=abc.ABCMeta):
@@ -158,49 +978,100 @@ class StaticEntity(metaclass=abc.ABCMeta):
             # Does not exist yet; create, assign metadata and cache.
             # Class names are used to perform the entity lookup on
             # EveStaticData instance.
-            inst = cls._cache[id_] = super().__new__(cls)
             entity = cls._entity_name
-            for k, v in global_esd.get_metadata(entity, id_).items():
-                setattr(inst, k, v)
+            inst = cls._create(global_esd.get_metadata(entity, id_),
+                               id_)
+        return inst
+
+    @classmethod
+    def _create(cls, metadata, id_):
+        # Create and cache an instance from its metadata.
+        inst = cls._cache[id_] = super().__new__(cls)
+        for k, v in metadata.items():
+            setattr(inst, k, v)
         return inst
 
+    @classmethod
+    def many(cls, idents):
+        """Get or create instances for a sequence of IDs and/or names.
+
+        Names are resolved and the metadata for uncached instances
+        fetched in one batch (see `EveStaticData.get_metadata_many`)
+        rather than one lookup per instance.
+
+        Returns
+        -------
+
+        list
+            Instances in the order of `idents`.
+        """
+        idents = list(idents)
+        cache = cls._cache
+        resolved = {}
+        missing = []
+        for ident in idents:
+            if ident in resolved:
+                continue
+            if isinstance(ident, int) and ident in cache:
+                resolved[ident] = cache[ident]
+            else:
+                resolved[ident] = None
+                missing.append(ident)
+        if missing:
+            entity = cls._entity_name
+            for ident, metadata in zip(
+                    missing,
+                    global_esd.get_metadata_many(entity, missing)):
+                id_ = metadata['id']
+                try:
+                    resolved[ident] = cache[id_]
+                except KeyError:
+                    resolved[ident] = cls._create(metadata, id_)
+        return [resolved[ident] for ident in idents]
+
     @abc.abstractproperty
     def _cache(self):
-        """Class-specific cache."""
+        """Class-specific cache (usually an `EntityCache`)."""
         # TODO: Convert this to a classproperty to reduce boilerplate
         #       or abstract the cache content into a subdict mapped to
         #       class.
         return {}
 
-    @abc.abstractproperty
-    def _id_field(self):
-        """Name of the database column containing the entity ID.
-
-        This is currently required for performing an ID lookup.
-        """
-        # TODO: Can this be removed? Currently get_metadata scans the
-        #       metadata if it's given a name (str) so this sort of
-        #       represents a shortcut but also involves a database
-        #       call. This might be better contained within
-        #       get_metadata, or better yet implement some kind of
-        #       reverse lookup. The dicts could even be keyed with
-        #       name if they are all unique which is likely.
-        return ''
+    @classmethod
+    def invalidate(cls, ident=None):
+        """Drop a cached instance by ID, or all cached instances."""
+        if ident is None:
+            cls._cache.clear()
+        else:
+            cls._cache.pop(ident, None)
+
+    @classmethod
+    def invalidate_all(cls):
+        """Drop the cached instances of this class and subclasses."""
+        classes = [cls]
+        while classes:
+            klass = classes.pop()
+            classes.extend(klass.__subclasses__())
+            cache = klass.__dict__.get('_cache')
+            if isinstance(cache, collections.abc.MutableMapping):
+                cache.clear()
+
+    @classmethod
+    def cache_info(cls):
+        """Statistics for the instance cache (see `EntityCache`)."""
+        try:
+            return cls._cache.info()
+        except AttributeError:
+            return {'size': len(cls._cache)}
 
     @abc.abstractproperty
     def _name_field(self):
-        """Name of the database column containing the entity name.
-
-        This is currently required for performing an ID lookup.
-        """
+        """Name of the database column containing the entity name."""
         return ''
 
     @abc.abstractproperty
     def _table(self):
-        """Name of the database table for the entity.
-
-        This is currently required for performing an ID lookup.
-        """
+        """Name of the database table for the entity."""
         return ''
 
     @classproperty
@@ -212,19 +1083,11 @@ class StaticEntity(metaclass=abc.ABCMeta):
     def get_id(cls, name):
         """Given a name, return the ID for an instance of this type.
 
-        This lookup is performed against the local SDE database and
-        uses configurable attributes on this class to define the
-        query.
+        The lookup uses the case-insensitive name index on the global
+        `EveStaticData` instance, so costs no database round-trip once
+        the index is built.
         """
-        record = global_esd.db.query(
-            """
-            SELECT "{}"
-              FROM "{}"
-             WHERE "{}" = %s
-            """.format(cls._id_field, cls._table, cls._name_field),
-            (name,)
-        ).fetchone()
-        return getattr(record, cls._id_field)
+        return global_esd.get_id(cls._entity_name, name)
 
 
 global_esd = EveStaticData()
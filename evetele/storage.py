@@ -0,0 +1,425 @@
+"""Storage backends for market order snapshots.
+
+`market.Market` delegates storage of the orders it pulls from ESI to
+one of the stores in this module. All stores expose the same nested,
+read-only view of the data:
+
+    store[region_id][system_id][location_id][type_id]
+
+where the leaf is a list of market orders. `TreeOrderStore` is the
+original nested dictionary layout; `ColumnarOrderStore` holds each
+region as a set of NumPy arrays (one per field) with offset indexes,
+trading cheap writes of individual orders for a much smaller memory
+footprint and vectorised scans.
+"""
+import collections
+import collections.abc
+
+import numpy as np
+import pytz
+
+from . import trade, util
+
+
+# Valid values of the ESI 'range' field, stored as small int codes.
+ORDER_RANGES = (
+    'station', 'solarsystem', 'region',
+    '1', '2', '3', '4', '5', '10', '20', '30', '40',
+)
+_RANGE_CODES = {name: code for code, name in enumerate(ORDER_RANGES)}
+
+
+class TreeOrderStore(object):
+    """Market orders held in a tree of nested dictionaries.
+
+    The tree is keyed region_id -> system_id -> location_id -> type_id
+    with a list of market orders (`trade.MarketOrderSnapshot` by
+    default) at each leaf. Nodes are created on access. An index of
+    orders by type and order ID is kept alongside the tree for each
+    region.
+    """
+
+    def __init__(self, order_class=None):
+        """
+        Parameters
+        ----------
+
+        order_class : type, optional
+            Class of the orders built from records; it is called with
+            the record and snapshot time `t`. Defaults to
+            `trade.MarketOrderSnapshot`; use
+            `trade.CompactMarketOrderSnapshot` to reduce memory use.
+        """
+        if order_class is None:
+            order_class = trade.MarketOrderSnapshot
+        self.order_class = order_class
+        # region_id: regional market data
+        self._data = collections.defaultdict(
+            # system_id: system market data
+            lambda: collections.defaultdict(
+                # location_id: location market data
+                lambda: collections.defaultdict(
+                    # type_id: market orders
+                    lambda: collections.defaultdict(list)
+                )
+            )
+        )
+        # region_id: type_id: order_id: market order
+        self._index = collections.defaultdict(dict)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def orders_by_id(self, region_id, type_id=None):
+        """Dictionary of a region's orders keyed by order ID.
+
+        Parameters
+        ----------
+
+        region_id : int
+
+        type_id : int, optional
+            Restrict the orders to a single type.
+
+        Returns
+        -------
+
+        dict
+            A new dictionary, unaffected by later updates.
+        """
+        types = self._index.get(region_id, {})
+        if type_id is not None:
+            return dict(types.get(type_id, {}))
+        orders = {}
+        for type_orders in types.values():
+            orders.update(type_orders)
+        return orders
+
+    def update(self, region_id, records, t, type_id=None):
+        """Replace orders with those in `records` and return the region.
+
+        All orders in the region (or, if `type_id` is given, all
+        orders of that type in the region) are replaced.
+
+        Parameters
+        ----------
+
+        region_id : int
+            Region the records belong to.
+
+        records : iterable of dict-like
+            ESI market order records.
+
+        t : datetime.datetime
+            Snapshot time for the records.
+
+        type_id : int, optional
+            Type the update is restricted to.
+        """
+        # Build the new orders before touching the stored ones so that
+        # a failure while consuming `records` (e.g. an ESI error part
+        # way through the pages of a region) leaves the store as it was.
+        orders = []
+        new_index = {}
+        for data in records:
+            order = self.order_class(data, t=t)
+            orders.append((data['system_id'], data['location_id'],
+                           data['type_id'], order))
+            new_index.setdefault(data['type_id'], {})[order.id] = order
+
+        if type_id is None:
+            region_node = self._data.default_factory()
+            index = new_index
+        else:
+            region_node = self._data[region_id]
+            index = self._index[region_id]
+            index.pop(type_id, None)
+            for system_node in region_node.values():
+                for station_node in system_node.values():
+                    station_node.pop(type_id, None)
+            index.update(new_index)
+
+        for system_id, location_id, order_type_id, order in orders:
+            region_node[system_id][location_id][order_type_id].append(
+                order
+            )
+        self._data[region_id] = region_node
+        self._index[region_id] = index
+        return region_node
+
+
+class ColumnarOrderStore(object):
+    """Market orders held as per-region NumPy column arrays.
+
+    Each region is a block of equal-length arrays, one per field in
+    `FIELDS` plus the snapshot time `t`, sorted by system, location
+    and type. An offset index over that ordering answers the
+    `store[region][system][location][type]` lookups used by
+    `place._Location.market_node`; leaf lists of
+    `trade.MarketOrderSnapshot` are materialised on access.
+
+    Use `columns` to work with a region's arrays directly.
+    """
+
+    FIELDS = (
+        ('order_id', np.int64),
+        ('type_id', np.int32),
+        ('location_id', np.int64),
+        ('system_id', np.int32),
+        ('price', np.float64),
+        ('volume_remain', np.int32),
+        ('volume_total', np.int32),
+        ('min_volume', np.int32),
+        ('duration', np.int16),
+        ('issued', 'datetime64[s]'),
+        ('is_buy_order', np.bool_),
+        ('range', np.int8),
+    )
+
+    def __init__(self):
+        self._blocks = {}
+
+    def __getitem__(self, key):
+        return _ColumnarNode(self._block(key), ())
+
+    def __len__(self):
+        return sum(len(block) for block in self._blocks.values())
+
+    @property
+    def nbytes(self):
+        """Total size of the column arrays, in bytes."""
+        return sum(block.nbytes for block in self._blocks.values())
+
+    def _block(self, region_id):
+        try:
+            return self._blocks[region_id]
+        except KeyError:
+            return _RegionBlock.empty(self.FIELDS)
+
+    def columns(self, region_id):
+        """Dictionary of the column arrays for a region.
+
+        Arrays are sorted by system, location and type and must be
+        treated as read-only.
+        """
+        return dict(self._block(region_id).columns)
+
+    def orders_by_id(self, region_id, type_id=None):
+        """Mapping of a region's orders keyed by order ID.
+
+        See `TreeOrderStore.orders_by_id`. Orders are materialised on
+        access; the mapping is unaffected by later updates.
+        """
+        return _OrderIdView(self._block(region_id), type_id)
+
+    def update(self, region_id, records, t, type_id=None):
+        """Replace orders with those in `records` and return the region.
+
+        As for `TreeOrderStore.update`, all orders in the region (or
+        of type `type_id` in the region) are replaced.
+        """
+        # `records` is consumed in full before the stored block is
+        # replaced, so a failure part way through leaves it as it was.
+        new = _RegionBlock.from_records(records, t, self.FIELDS)
+        old = self._block(region_id)
+        if type_id is not None and len(old):
+            keep = old.columns['type_id'] != type_id
+            new = _RegionBlock.concatenate(
+                [old.take(np.flatnonzero(keep)), new]
+            )
+        self._blocks[region_id] = new
+        return self[region_id]
+
+
+class _RegionBlock(object):
+    # A region's sorted column arrays and the offset index over them.
+
+    def __init__(self, columns):
+        order = np.lexsort((columns['type_id'],
+                            columns['location_id'],
+                            columns['system_id']))
+        self.columns = {name: array[order]
+                        for name, array in columns.items()}
+        self.index = self._build_index(self.columns)
+
+    def __len__(self):
+        return len(self.columns['order_id'])
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.columns.values())
+
+    @classmethod
+    def empty(cls, fields):
+        columns = {name: np.empty(0, dtype=dtype)
+                   for name, dtype in fields}
+        columns['t'] = np.empty(0, dtype='datetime64[us]')
+        return cls(columns)
+
+    @classmethod
+    def from_records(cls, records, t, fields):
+        values = {name: [] for name, __ in fields}
+        for record in records:
+            for name, __ in fields:
+                values[name].append(_encode(name, record))
+        values['issued'] = issued_array(values['issued'])
+        columns = {name: np.array(values.pop(name), dtype=dtype)
+                   for name, dtype in fields}
+        n = len(columns['order_id'])
+        columns['t'] = np.full(n, _to_datetime64(t, 'us'))
+        return cls(columns)
+
+    @classmethod
+    def concatenate(cls, blocks):
+        names = blocks[0].columns.keys()
+        return cls({name: np.concatenate([b.columns[name]
+                                          for b in blocks])
+                    for name in names})
+
+    def take(self, indices):
+        return type(self)({name: array[indices]
+                           for name, array in self.columns.items()})
+
+    @staticmethod
+    def _build_index(columns):
+        # system_id -> location_id -> type_id -> (start, stop)
+        index = {}
+        system = columns['system_id']
+        location = columns['location_id']
+        type_ = columns['type_id']
+        n = len(system)
+        if not n:
+            return index
+        boundary = np.ones(n, dtype=bool)
+        boundary[1:] = ((system[1:] != system[:-1])
+                        | (location[1:] != location[:-1])
+                        | (type_[1:] != type_[:-1]))
+        starts = np.flatnonzero(boundary)
+        stops = np.append(starts[1:], n)
+        for start, stop, sys_id, loc_id, type_id in zip(
+                starts.tolist(), stops.tolist(),
+                system[starts].tolist(), location[starts].tolist(),
+                type_[starts].tolist()):
+            (index.setdefault(sys_id, {})
+                  .setdefault(loc_id, {}))[type_id] = (start, stop)
+        return index
+
+    def orders(self, start, stop):
+        # Materialise a slice of rows as snapshot objects.
+        columns = self.columns
+        rows = {name: columns[name][start:stop].tolist()
+                for name in columns}
+        orders = []
+        for i in range(stop - start):
+            data = {name: _decode(name, rows[name][i])
+                    for name in rows if name != 't'}
+            t = rows['t'][i].replace(tzinfo=pytz.utc)
+            orders.append(trade.MarketOrderSnapshot(data, t=t))
+        return orders
+
+
+class _ColumnarNode(collections.abc.Mapping):
+    # Read-only view of one level of a region block's offset index.
+    #
+    # Like the defaultdict tree, missing keys resolve to empty nodes
+    # (or an empty order list at the leaves) rather than raising.
+
+    _depth = 3 # region -> system -> location -> type
+
+    def __init__(self, block, path):
+        self._block = block
+        self._path = path
+        node = block.index
+        for key in path:
+            node = node.get(key, {})
+        self._index = node
+
+    def __getitem__(self, key):
+        if len(self._path) == self._depth - 1:
+            try:
+                start, stop = self._index[key]
+            except KeyError:
+                return []
+            return self._block.orders(start, stop)
+        return type(self)(self._block, self._path + (key,))
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class _OrderIdView(collections.abc.Mapping):
+    # Read-only order_id -> order mapping over a region block, backed
+    # by a sorted copy of the order IDs.
+
+    def __init__(self, block, type_id=None):
+        self._block = block
+        ids = block.columns['order_id']
+        if type_id is None:
+            positions = np.arange(len(ids))
+        else:
+            positions = np.flatnonzero(block.columns['type_id']
+                                       == type_id)
+        order = np.argsort(ids[positions], kind='stable')
+        self._ids = ids[positions][order]
+        self._positions = positions[order]
+
+    def __getitem__(self, order_id):
+        i = np.searchsorted(self._ids, order_id)
+        if i == len(self._ids) or self._ids[i] != order_id:
+            raise KeyError(order_id)
+        position = int(self._positions[i])
+        return self._block.orders(position, position + 1)[0]
+
+    def __iter__(self):
+        return iter(self._ids.tolist())
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, order_id):
+        i = np.searchsorted(self._ids, order_id)
+        return i < len(self._ids) and self._ids[i] == order_id
+
+
+def _encode(name, record):
+    # Convert a record field to the value stored in its column.
+    # 'issued' is converted for the whole column by issued_array.
+    if name == 'range':
+        return _RANGE_CODES.get(record.get('range'), -1)
+    elif name == 'is_buy_order':
+        return record.get('is_buy_order', False)
+    elif name == 'issued':
+        return record['issued']
+    return record.get(name, 0)
+
+
+def issued_array(values):
+    """Convert a sequence of 'issued' field values to datetime64[s].
+
+    ESI's ISO 8601 strings ('2018-06-21T19:59:50Z') are parsed in one
+    pass by `util.parse_datetime_array`; anything else goes through
+    `trade.parse_issued`.
+    """
+    if all(isinstance(v, str) and v.endswith('Z') for v in values):
+        return util.parse_datetime_array(values, 's')
+    return np.array([_to_datetime64(trade.parse_issued(v), 's')
+                     for v in values], dtype='datetime64[s]')
+
+
+def _decode(name, value):
+    # Convert a stored column value back to its ESI representation.
+    if name == 'issued':
+        return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+    elif name == 'range':
+        return ORDER_RANGES[value] if value >= 0 else None
+    return value
+
+
+def _to_datetime64(dt, unit):
+    # Aware datetimes are converted to naive UTC first.
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(pytz.utc).replace(tzinfo=None)
+    return np.datetime64(dt, unit)
@@ -0,0 +1,128 @@
+import gzip
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from .. import archive, trade
+
+from . import DATA_DIR
+
+
+class TestArchiveImporter(unittest.TestCase):
+    """Exercises the bulk importer of archived market exports.
+
+    The sample 'My Orders' export is archived under several names and
+    times, with the price of the first order changed in later
+    exports.
+    """
+
+    ORDER_ID = 1234567890
+
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(DATA_DIR, 'My Orders-2018.07.05 1807.txt')
+        with open(path, 'rb') as f:
+            cls.content = f.read()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _export(self, price):
+        return self.content.replace(b'596.59', price.encode())
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write_archives(self):
+        # A plain, a gzipped, a zipped and a tarred export.
+        with open(self._path('My Orders-2018.07.05 1807.txt'),
+                  'wb') as f:
+            f.write(self._export('100.0'))
+        with gzip.open(self._path('My Orders-2018.07.06 1807.txt.gz'),
+                       'wb') as f:
+            f.write(self._export('101.0'))
+        with zipfile.ZipFile(self._path('logs.zip'), 'w') as f:
+            f.writestr('Marketlogs/My Orders-2018.07.07 1807.txt',
+                       self._export('102.0'))
+            f.writestr('Marketlogs/readme.txt', b'Not an export')
+        member = self._path('The Forge-Tritanium-2018.07.08 180700.txt')
+        with open(member, 'wb') as f:
+            f.write(self._export('103.0'))
+        with tarfile.open(self._path('logs.tar.gz'), 'w:gz') as f:
+            f.add(member, arcname=os.path.basename(member))
+        os.remove(member)
+
+    def _check(self, histories, prices):
+        order = histories[self.ORDER_ID]
+        self.assertIsInstance(order, trade.VersionedMarketOrder)
+        self.assertEqual(
+            [snapshot['price'] for snapshot in order.snapshots.ordered()],
+            prices
+        )
+        self.assertEqual(order['range'], 'station')
+        self.assertEqual(order['region_id'], 10000002)
+
+    def test_run(self):
+        """Orders from every export are merged into histories."""
+        self._write_archives()
+        sut = archive.ArchiveImporter(workers=1)
+        histories = sut.run(self.directory)
+
+        self.assertEqual(len(histories), 2)
+        self._check(histories, [100.0, 101.0, 102.0, 103.0])
+        self.assertEqual(sut.stats['files'], 4)
+        self.assertEqual(sut.stats['skipped'], 0)
+        self.assertEqual(sut.stats['rows'], 8)
+        self.assertGreater(sut.stats['rows_per_second'], 0)
+
+    def test_run__processes(self):
+        """Exports are parsed in a process pool."""
+        self._write_archives()
+        sut = archive.ArchiveImporter(workers=2)
+        self._check(sut.run(self._path('logs.zip'),
+                            self._path('logs.tar.gz')),
+                    [102.0, 103.0])
+
+    def test_run__bad_export(self):
+        """Exports that can't be read or parsed are logged and skipped.
+        """
+        self._write_archives()
+        with zipfile.ZipFile(self._path('bad.zip'), 'w') as f:
+            f.writestr('My Orders-2018.07.09 1807.txt',
+                       self.content.replace(b'596.59', b'price'))
+            f.writestr('My Orders-2018.07.10 1807.txt.gz',
+                       b'Not gzipped')
+        sut = archive.ArchiveImporter(workers=2)
+        with self.assertLogs(sut._log, 'WARNING') as logs:
+            histories = sut.run(self.directory)
+
+        self._check(histories, [100.0, 101.0, 102.0, 103.0])
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(sut.stats['files'], 4)
+        self.assertEqual(sut.stats['skipped'], 2)
+        self.assertEqual(sut.stats['rows'], 8)
+
+    def test_run__personal(self):
+        """Personal or regional exports can be left out."""
+        self._write_archives()
+        sut = archive.ArchiveImporter(workers=1, personal=False)
+        self._check(sut.run(self.directory), [103.0])
+
+    def test_run__invalid_time(self):
+        """Exports without a valid time in their name are skipped."""
+        self._write_archives()
+        with open(self._path('My Orders-2018.13.45 1807.txt'),
+                  'wb') as f:
+            f.write(self._export('99.0'))
+        sut = archive.ArchiveImporter(workers=1)
+        with self.assertLogs(sut._log, 'WARNING'):
+            histories = sut.run(self.directory)
+        self._check(histories, [100.0, 101.0, 102.0, 103.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
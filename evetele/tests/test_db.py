@@ -1,7 +1,12 @@
+import json
 import os
+import threading
+import time
 import unittest
 from unittest import mock
 
+import psycopg2
+
 import evetele
 from evetele import db
 
@@ -58,6 +63,16 @@ class TestDatabase(unittest.TestCase):
         )
         self.assertIs(value, mock_connection)
 
+    @mock.patch('psycopg2.connect')
+    def test_conn__writable(self, stub_connect):
+        """Writers can open sessions that aren't read-only."""
+        database = db.Database(readonly=False)
+        database.conn
+        stub_connect.return_value.set_session.assert_called_once_with(
+            autocommit=True,
+            readonly=False
+        )
+
     @mock.patch('evetele.db.Database.conn',
                 new_callable=mock.PropertyMock)
     def test_default_cursor_factory(self, stub_property):
@@ -99,10 +114,10 @@ class TestDatabase(unittest.TestCase):
         """Property is a dict of tables and columns."""
         mock_cursor = stub_query.return_value
         mock_cursor.fetchall.return_value = [
-            ('table1', 'columnA', 1),
-            ('table1', 'columnB', 2),
-            ('table2', 'columnC', 1),
-            ('table2', 'columnD', 2),
+            ('table1', 'columnA', 1, 'integer', 'NO', None),
+            ('table1', 'columnB', 2, 'text', 'YES', None),
+            ('table2', 'columnC', 1, 'integer', 'NO', None),
+            ('table2', 'columnD', 2, 'double precision', 'YES', '0'),
         ]
 
         database = db.Database()
@@ -111,6 +126,174 @@ class TestDatabase(unittest.TestCase):
             {'table1': ['columnA', 'columnB'],
              'table2': ['columnC', 'columnD']}
         )
+        self.assertEqual(
+            database.columns['table2'][1],
+            db.Column('columnD', 'double precision', True, '0')
+        )
+
+    @mock.patch('evetele.db.Database.query')
+    def test_schema__cached(self, stub_query):
+        """Schema metadata is queried once until refreshed."""
+        stub_query.return_value.fetchall.return_value = [
+            ('table1', 'columnA', 1, 'integer', 'NO', None),
+        ]
+        database = db.Database()
+
+        database.schema
+        database.tables
+        database.columns
+        self.assertEqual(stub_query.call_count, 1)
+
+        database.refresh_schema()
+        database.tables
+        self.assertEqual(stub_query.call_count, 2)
+
+    @mock.patch('evetele.db.Database.query')
+    def test_indexes(self, stub_query):
+        """Indexes, and primary keys, are listed by table."""
+        stub_query.return_value.fetchall.return_value = [
+            ('table1', 'table1_pkey', ['id'], True, True,
+             'CREATE UNIQUE INDEX table1_pkey ON table1 (id)'),
+            ('table1', 'table1_name_idx', ['name', 'kind'], False,
+             False, 'CREATE INDEX table1_name_idx ON table1 (name)'),
+        ]
+        database = db.Database()
+
+        index = database.indexes['table1'][1]
+        self.assertEqual(index.columns, ('name', 'kind'))
+        self.assertFalse(index.unique)
+        self.assertEqual(database.primary_keys, {'table1': ('id',)})
+
+    @mock.patch('evetele.db.Database.query')
+    def test_explain(self, stub_query):
+        """Plans are requested as JSON and parsed."""
+        plan = {'Plan': {'Node Type': 'Seq Scan'},
+                'Execution Time': 0.1}
+        stub_query.return_value.fetchone.return_value = (
+            json.dumps([plan]),
+        )
+        database = db.Database()
+
+        self.assertEqual(database.explain('SELECT 1'), plan)
+        (sql, params), __ = stub_query.call_args
+        self.assertEqual(
+            sql, 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT 1'
+        )
+
+        database.explain('SELECT %s', (1,), analyze=False,
+                         buffers=False)
+        self.assertEqual(stub_query.call_args[0],
+                         ('EXPLAIN (FORMAT JSON) SELECT %s', (1,)))
+
+    def test_plan_nodes(self):
+        """Plan nodes are generated depth first."""
+        plan = {'Plan': {
+            'Node Type': 'Hash Join',
+            'Plans': [
+                {'Node Type': 'Seq Scan'},
+                {'Node Type': 'Hash',
+                 'Plans': [{'Node Type': 'Index Scan'}]},
+            ],
+        }}
+        self.assertEqual(
+            [(depth, node['Node Type'])
+             for depth, node in db.plan_nodes(plan)],
+            [(0, 'Hash Join'), (1, 'Seq Scan'), (1, 'Hash'),
+             (2, 'Index Scan')]
+        )
+
+    def _stream_cursor(self, stub_property):
+        mock_cursor = stub_property.return_value.cursor.return_value
+        mock_cursor.description = [('id',), ('name',)]
+        mock_cursor.fetchmany.side_effect = [
+            [(1, 'a'), (2, 'b')], [(3, None)], [],
+        ]
+        return mock_cursor
+
+    @mock.patch('evetele.db.Database.conn',
+                new_callable=mock.PropertyMock)
+    def test_stream(self, stub_property):
+        """Method generates batches from a server-side cursor.
+
+        The cursor is used in a transaction, committed once the
+        results are exhausted.
+        """
+        mock_cursor = self._stream_cursor(stub_property)
+        mock_connection = stub_property.return_value
+        database = db.Database()
+
+        batches = list(database.stream('sql statement', ('foo',),
+                                       itersize=2))
+
+        self.assertEqual(batches, [[(1, 'a'), (2, 'b')], [(3, None)]])
+        args, kwargs = mock_connection.cursor.call_args
+        self.assertTrue(args[0].startswith('evetele_stream_'))
+        self.assertFalse(kwargs['withhold'])
+        mock_cursor.execute.assert_called_once_with('sql statement',
+                                                    ('foo',))
+        mock_cursor.fetchmany.assert_called_with(2)
+        mock_cursor.close.assert_called_once_with()
+        mock_connection.commit.assert_called_once_with()
+        self.assertIs(mock_connection.autocommit, True)
+
+    @mock.patch('evetele.db.Database.conn',
+                new_callable=mock.PropertyMock)
+    def test_stream__closed(self, stub_property):
+        """Closing the generator early rolls the transaction back."""
+        self._stream_cursor(stub_property)
+        mock_connection = stub_property.return_value
+        database = db.Database()
+
+        batches = database.stream('sql statement', itersize=2)
+        next(batches)
+        self.assertIs(mock_connection.autocommit, False)
+        batches.close()
+
+        mock_connection.rollback.assert_called_once_with()
+        self.assertFalse(mock_connection.commit.called)
+        self.assertIs(mock_connection.autocommit, True)
+
+    @mock.patch('evetele.db.Database.conn',
+                new_callable=mock.PropertyMock)
+    def test_stream__withhold(self, stub_property):
+        """WITH HOLD cursors can be requested, in autocommit mode."""
+        self._stream_cursor(stub_property)
+        mock_connection = stub_property.return_value
+        mock_connection.autocommit = True
+        database = db.Database()
+
+        list(database.stream('sql statement', withhold=True))
+
+        __, kwargs = mock_connection.cursor.call_args
+        self.assertTrue(kwargs['withhold'])
+        self.assertFalse(mock_connection.commit.called)
+        self.assertFalse(mock_connection.rollback.called)
+
+    @mock.patch('evetele.db.Database.conn',
+                new_callable=mock.PropertyMock)
+    def test_stream__columns(self, stub_property):
+        """Batches can be generated as column arrays."""
+        self._stream_cursor(stub_property)
+        database = db.Database()
+
+        first, second = database.stream('sql statement', columns=True)
+
+        self.assertEqual(first['id'].tolist(), [1, 2])
+        self.assertEqual(first['id'].dtype.kind, 'i')
+        self.assertEqual(first['name'].tolist(), ['a', 'b'])
+        self.assertEqual(second['name'].dtype, object)
+
+    @mock.patch.dict(db.config['PostgreSQLDB'], {'pool max size': '4'})
+    def test_pool_config(self):
+        """Pooling is enabled and sized from the config section.
+
+        Pool options are not passed on as connection parameters.
+        """
+        database = db.Database()
+        self.assertTrue(database.pooled)
+        self.assertNotIn('pool max size', database.conn_details)
+        self.assertEqual(database.pool_size, (1, 4))
+        self.assertFalse(db.Database(pooled=False).pooled)
 
     @mock.patch('evetele.db.Database.schema',
                 new_callable=mock.PropertyMock)
@@ -126,5 +309,81 @@ class TestDatabase(unittest.TestCase):
         self.assertCountEqual(database.tables, dummy_schema.keys())
 
 
+@mock.patch('psycopg2.connect',
+            side_effect=lambda *args, **kwargs: mock.Mock(closed=False))
+class TestDatabasePool(unittest.TestCase):
+    """Exercises pooled connections, with fake connections."""
+
+    def setUp(self):
+        patcher = mock.patch.object(db.Database, 'pool_size', (1, 2))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.database = db.Database(pooled=True)
+        self.addCleanup(self.database.close)
+
+    def test_query(self, stub_connect):
+        """Queries borrow a pooled connection and return it."""
+        cursor = self.database.query('SELECT 1')
+        cursor.execute.assert_called_once_with('SELECT 1')
+        self.assertEqual(len(self.database.pool._used), 0)
+        connection, = self.database.pool._pool
+        connection.set_session.assert_called_once_with(autocommit=True,
+                                                       readonly=True)
+        stats = self.database.pool_stats
+        self.assertEqual(stats['borrows'], 1)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['max_size'], 2)
+
+    def test_connection__wait(self, stub_connect):
+        """Borrowers wait for a connection when the pool is in use."""
+        borrowed = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with self.database.connection():
+                borrowed.set()
+                release.wait(5)
+
+        holders = [threading.Thread(target=hold) for __ in range(2)]
+        for holder in holders:
+            holder.start()
+        while self.database.pool_stats['in_use'] < 2:
+            time.sleep(0.001)
+        self.assertEqual(self.database.pool_stats['utilisation'], 1.0)
+
+        waiter = threading.Thread(target=self.database.query,
+                                  args=('SELECT 1',))
+        waiter.start()
+        time.sleep(0.05)
+        self.assertTrue(waiter.is_alive())
+        release.set()
+        for thread in holders + [waiter]:
+            thread.join(5)
+
+        stats = self.database.pool_stats
+        self.assertEqual(stats['borrows'], 3)
+        self.assertEqual(stats['peak_in_use'], 2)
+        self.assertGreater(stats['max_wait_time'], 0.01)
+
+    def test_connection__broken(self, stub_connect):
+        """Broken connections are discarded, not returned for reuse.
+
+        Their replacements have their session set like any new
+        connection.
+        """
+        with self.assertRaises(psycopg2.OperationalError):
+            with self.database.connection() as connection:
+                raise psycopg2.OperationalError
+        connection.close.assert_called_once_with()
+        self.assertEqual(self.database.pool._pool, [])
+
+        with self.database.connection() as connection:
+            connection.closed = True
+        connection.set_session.assert_called_once_with(autocommit=True,
+                                                       readonly=True)
+        self.assertEqual(self.database.pool._pool, [])
+        self.assertEqual(self.database.pool_stats['in_use'], 0)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,12 @@
 import abc
+import asyncio
+import datetime
+import email.utils
 import json
 import os
+import tempfile
+import threading
+import time
 import unittest
 from unittest import mock
 
@@ -16,8 +22,10 @@ class TestESIClient(unittest.TestCase):
     def setUp(self):
         self.sut = client = esi.ESIClient()
 
-        # Mock out the esipy resources.
+        # Mock out the esipy resources. Calling an operation gives a
+        # (request, response) pair.
         self.mock_operation = mock.Mock()
+        self.mock_operation.return_value = (mock.Mock(), mock.Mock())
         client._get_op = mock.Mock(return_value=self.mock_operation)
         self.mock_client = mock.Mock()
         setattr(client, type(client)._client.iname, self.mock_client)
@@ -94,6 +102,70 @@ class TestESIClient(unittest.TestCase):
         self.mock_client.request.called_once_with(self.mock_operation)
         self.assertIs(retval, response)
 
+    def _paged_request(self, npages, delays=None):
+        # Stub esipy request for paged responses; each page's data is
+        # its page number. Optional delays (by page) reorder
+        # completion.
+        delays = delays or {}
+        def request(req_and_resp):
+            page = req_and_resp[0]['page']
+            time.sleep(delays.get(page, 0))
+            return mock.Mock(status=200, header={'X-Pages': [npages]},
+                             data=[page])
+        self.mock_operation.side_effect = lambda **kw: (kw, None)
+        self.mock_client.request.side_effect = request
+
+    @mock.patch.object(esi, 'operation_is_multipage',
+                       return_value=True)
+    def test_fetch_iter__ordered(self, stub_test):
+        """Records are yielded page by page, in page order."""
+        self._paged_request(4, delays={2: 0.05})
+        retval = self.sut.fetch_iter('an_endpoint', param=1)
+        self.assertEqual(list(retval), [1, 2, 3, 4])
+
+    @mock.patch.object(esi, 'operation_is_multipage',
+                       return_value=True)
+    def test_fetch_iter__completion_order(self, stub_test):
+        """Pages can be yielded in the order they complete."""
+        self._paged_request(4, delays={2: 0.1})
+        retval = list(self.sut.fetch_iter('an_endpoint', ordered=False,
+                                          param=1))
+        self.assertCountEqual(retval, [1, 2, 3, 4])
+        self.assertEqual(retval[-1], 2)
+
+    @mock.patch.object(esi, 'operation_is_multipage',
+                       return_value=True)
+    def test_fetch_iter__bounded(self, stub_test):
+        """Only a window of pages is requested ahead of the consumer.
+        """
+        self._paged_request(100)
+        self.sut.pool_size = 2
+        iterator = self.sut.fetch_iter('an_endpoint', param=1)
+        next(iterator)
+        next(iterator)
+        iterator.close()
+        # The first page, plus a window of twice the pool size
+        # (one page of which has been consumed and replaced).
+        self.assertLessEqual(self.mock_client.request.call_count, 6)
+
+    @mock.patch.object(esi, 'operation_is_multipage',
+                       return_value=True)
+    def test_fetch_iter__bad_response(self, stub_test):
+        """A bad page response raises."""
+        self.mock_client.request.return_value = mock.Mock(status=500)
+        self.assertRaises(esi.ESIClient.BadResponse, list,
+                          self.sut.fetch_iter('an_endpoint', param=1))
+
+    @mock.patch.object(esi, 'operation_is_multipage',
+                       return_value=False)
+    def test_fetch_iter__simple(self, stub_test):
+        """Single page list data is iterated over directly."""
+        self.mock_client.request.return_value = (
+            self._generate_mock_response(data=[1, 2]))
+        self.assertEqual(
+            list(self.sut.fetch_iter('an_endpoint', param=1)), [1, 2]
+        )
+
     def test_multipage_request(self):
         """Properly wraps the esipy client multi_request method.
 
@@ -112,6 +184,254 @@ class TestESIClient(unittest.TestCase):
         self.assertIs(retval, response)
 
 
+class TestESIClientCache(unittest.TestCase):
+    """Exercises ESIClient with a response cache.
+
+    Responses carry ETag and Expires headers; fresh responses are
+    served from the cache, stale ones are revalidated.
+    """
+
+    def setUp(self):
+        self.cache = esi.MemoryResponseCache()
+        self.sut = client = esi.ESIClient(cache=self.cache)
+
+        etag_parameter = mock.Mock()
+        etag_parameter.name = 'If-None-Match'
+        self.mock_operation = mock.Mock(parameters=[etag_parameter])
+        self.mock_operation.side_effect = lambda **kw: (kw, None)
+        client._get_op = mock.Mock(return_value=self.mock_operation)
+        self.mock_client = mock.Mock()
+        setattr(client, type(client)._client.iname, self.mock_client)
+
+    @staticmethod
+    def _http_date(**offset):
+        dt = (datetime.datetime.now(datetime.timezone.utc)
+              + datetime.timedelta(**offset))
+        return email.utils.format_datetime(dt, usegmt=True)
+
+    def _response(self, status=200, expires=None, data=None):
+        header = {'ETag': ['"abc"'],
+                  'Expires': [expires or self._http_date(minutes=5)]}
+        return mock.Mock(status=status, header=header,
+                         data=data or [{'a': 1}], raw=b'0123456789')
+
+    def test_request__fresh(self):
+        """A fresh response is served without a request."""
+        response = self._response()
+        self.mock_client.request.return_value = response
+
+        first = self.sut.request('an_endpoint', param=1)
+        second = self.sut.request('an_endpoint', param=1)
+
+        self.assertIs(first, response)
+        self.assertIs(second.data, response.data)
+        self.assertEqual(self.mock_client.request.call_count, 1)
+        self.assertEqual(self.cache.stats['misses'], 1)
+        self.assertEqual(self.cache.stats['hits'], 1)
+        self.assertEqual(self.cache.stats['bytes_saved'], 10)
+
+    def test_request__parameters_distinguished(self):
+        """Entries are keyed by endpoint and parameters."""
+        self.mock_client.request.return_value = self._response()
+        self.sut.request('an_endpoint', param=1)
+        self.sut.request('an_endpoint', param=2)
+        self.assertEqual(self.mock_client.request.call_count, 2)
+        self.assertEqual(self.cache.stats['misses'], 2)
+
+    def test_request__stale__not_modified(self):
+        """A stale response is revalidated using its ETag.
+
+        On a 304 the parsed body of the cached response is re-used
+        and its expiry is refreshed.
+        """
+        stale = self._response(expires=self._http_date(minutes=-1))
+        self.mock_client.request.return_value = stale
+        self.sut.request('an_endpoint', param=1)
+
+        not_modified = mock.Mock(
+            status=304,
+            header={'Expires': [self._http_date(minutes=5)]}
+        )
+        self.mock_client.request.return_value = not_modified
+        retval = self.sut.request('an_endpoint', param=1)
+
+        self.mock_operation.assert_called_with(
+            param=1, **{'If-None-Match': '"abc"'}
+        )
+        self.assertIs(retval.data, stale.data)
+        self.assertTrue(retval.fresh)
+        self.assertEqual(self.cache.stats['revalidations'], 1)
+
+    def test_request__stale__modified(self):
+        """A stale response is replaced if the data has changed."""
+        stale = self._response(expires=self._http_date(minutes=-1))
+        self.mock_client.request.return_value = stale
+        self.sut.request('an_endpoint', param=1)
+
+        new = self._response(data=[{'a': 2}])
+        self.mock_client.request.return_value = new
+        retval = self.sut.request('an_endpoint', param=1)
+
+        self.assertIs(retval, new)
+        self.assertEqual(self.cache.stats['misses'], 2)
+        self.assertIs(self.sut.request('an_endpoint', param=1).data,
+                      new.data)
+
+    @mock.patch.object(esi, 'operation_is_multipage',
+                       return_value=True)
+    def test_fetch__multipage(self, stub_test):
+        """Pages are cached individually; no HEAD request is made."""
+        def request(req_and_resp):
+            page = req_and_resp[0]['page']
+            response = self._response(data=[page])
+            response.header['X-Pages'] = [3]
+            return response
+        self.mock_client.request.side_effect = request
+
+        self.assertEqual(self.sut.fetch('an_endpoint', param=1),
+                         [1, 2, 3])
+        self.assertEqual(self.sut.fetch('an_endpoint', param=1),
+                         [1, 2, 3])
+        self.assertFalse(self.mock_client.head.called)
+        self.assertEqual(self.mock_client.request.call_count, 3)
+        self.assertEqual(self.cache.stats['hits'], 3)
+
+
+class TestDiskResponseCache(unittest.TestCase):
+
+    def test_roundtrip(self):
+        """Entries persist across cache instances."""
+        with tempfile.TemporaryDirectory() as directory:
+            entry = esi.CachedResponse(200, {'ETag': ['"abc"']},
+                                       [{'a': 1}], size=3)
+            esi.DiskResponseCache(directory).set('key', entry)
+
+            cache = esi.DiskResponseCache(directory)
+            retval = cache.get('key')
+            self.assertEqual(retval.data, [{'a': 1}])
+            self.assertEqual(retval.etag, '"abc"')
+            self.assertIsNone(cache.get('other key'))
+
+            cache.clear()
+            self.assertIsNone(cache.get('key'))
+
+
+class TestAsyncESIClient(unittest.TestCase):
+    """Exercises the asyncio front end to ESIClient.
+
+    The wrapped client's esipy resources are mocked as for
+    TestESIClient; the blocking esipy request method is replaced by a
+    stub returning paged responses.
+    """
+
+    NPAGES = 5
+
+    def setUp(self):
+        client = esi.ESIClient()
+        client._get_op = mock.Mock(side_effect=self._get_op)
+        self.mock_client = mock.Mock()
+        self.mock_client.request.side_effect = self._request
+        setattr(client, type(client)._client.iname, self.mock_client)
+
+        self.sut = esi.AsyncESIClient(client, max_connections=3)
+        self.addCleanup(self.sut.close)
+
+        self._lock = threading.Lock()
+        self.in_flight = self.max_in_flight = 0
+
+    def _get_op(self, endpoint):
+        # Operations are (request, response) pairs; the request here
+        # records its parameters.
+        def operation(**kwargs):
+            return dict(kwargs, endpoint=endpoint), None
+        operation.parameters = []
+        return operation
+
+    def _request(self, operation):
+        # Stub blocking request tracking concurrency.
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self._lock:
+            self.in_flight -= 1
+        params = operation[0]
+        return mock.Mock(
+            status=200,
+            header={'X-Pages': [self.NPAGES]},
+            data=[(params['region_id'], params['page'])]
+        )
+
+    def test_multipage_request(self):
+        """Every page is requested and returned in page order."""
+        retval = asyncio.run(
+            self.sut.multipage_request('an_endpoint', region_id=1)
+        )
+        self.assertEqual([req['page'] for req, __ in retval],
+                         list(range(1, self.NPAGES + 1)))
+        self.assertEqual(self.mock_client.request.call_count,
+                         self.NPAGES)
+
+    def test_multipage_request__bad_response(self):
+        """A bad response on the first page raises."""
+        self.mock_client.request.side_effect = None
+        self.mock_client.request.return_value = mock.Mock(status=500)
+        self.assertRaises(
+            esi.ESIClient.BadResponse,
+            asyncio.run,
+            self.sut.multipage_request('an_endpoint', region_id=1)
+        )
+
+    def test_max_connections(self):
+        """Concurrency defaults to the client's connection pool size."""
+        self.assertEqual(esi.AsyncESIClient(esi.ESIClient())
+                         .max_connections, 10)
+        self.assertEqual(esi.AsyncESIClient(esi.ESIClient(pool_size=4))
+                         .max_connections, 4)
+        client = esi.AsyncESIClient()
+        self.assertEqual(client.max_connections, 20)
+        self.assertEqual(client._client.pool_size, 20)
+
+    def test_multipage_request__bad_page(self):
+        """A bad response on any later page raises."""
+        request = self._request
+
+        def bad_third_page(operation):
+            response = request(operation)
+            if operation[0]['page'] == 3:
+                response.status = 503
+            return response
+
+        self.mock_client.request.side_effect = bad_third_page
+        self.assertRaises(
+            esi.ESIClient.BadResponse,
+            asyncio.run,
+            self.sut.multipage_request('an_endpoint', region_id=1)
+        )
+
+    @mock.patch.object(esi, 'operation_is_multipage',
+                       return_value=True)
+    def test_fetch_many(self, stub_test):
+        """Calls are fanned out over the bounded pool.
+
+        Data for each call is concatenated across pages and returned
+        in input order, and no more than `max_connections` requests
+        are ever in flight.
+        """
+        calls = [('an_endpoint', {'region_id': region_id})
+                 for region_id in (10, 20, 30)]
+
+        retval = asyncio.run(self.sut.fetch_many(calls))
+
+        self.assertEqual(
+            retval,
+            [[(region_id, page) for page in range(1, self.NPAGES + 1)]
+             for region_id in (10, 20, 30)]
+        )
+        self.assertLessEqual(self.max_in_flight, 3)
+        self.assertGreater(self.max_in_flight, 1)
+
+
 class ESIClientWrapperTestCase(unittest.TestCase,
                                metaclass=abc.ABCMeta):
     """Handles boilerplate for testing ESI client wrapper classes.
@@ -144,6 +464,7 @@ class ESIClientWrapperTestCase(unittest.TestCase,
         self.mock_client = mock.Mock(spec=cls._client_class)
         self.sut = cls(client=self.mock_client)
         self.sut.fetch = mock.Mock()
+        self.sut.fetch_iter = mock.Mock()
 
         # Add an api_info dict as per esipy examples.
         if issubclass(cls._client_class, esi.SecureESIClient):
@@ -166,6 +487,7 @@ class TestESIClientWrapper(ESIClientWrapperTestCase):
                 # We actually need to check an unmocked fetched here
                 # so we retain it.
                 fetch__real = esi.ESIClientWrapper.fetch
+                fetch_iter__real = esi.ESIClientWrapper.fetch_iter
             self.concrete_class = self.__sut_class = ConcreteClass
             return self._sut_class
 
@@ -177,6 +499,14 @@ class TestESIClientWrapper(ESIClientWrapperTestCase):
         self.mock_client.fetch.assert_called_with(*args, **kwargs)
         self.assertIs(retval, self.mock_client.fetch.return_value)
 
+    def test_fetch_iter(self):
+        """Wraps the client fetch_iter method properly."""
+        retval = self.sut.fetch_iter__real('an_endpoint', param=1)
+        self.mock_client.fetch_iter.assert_called_with(
+            'an_endpoint', ordered=True, param=1
+        )
+        self.assertIs(retval, self.mock_client.fetch_iter.return_value)
+
     def test__provided___init___behaviour__correct_client(self):
         """Wrapper provides default init behaviour to accept a client.
 
@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from .. import history, market, trade, util
+
+from . import DATA_DIR
+
+
+class TestOrderHistoryStore(unittest.TestCase):
+    """Exercises the on-disk order version history.
+
+    Versions are recorded from `market.OrderChanges` and can be
+    queried by order, type and time window, or rebuilt as
+    `VersionedMarketOrder` objects.
+    """
+
+    REGION_ID = 10000042
+    T0 = util.parse_datetime('201807152300+0000')
+    T1 = util.parse_datetime('201807160100+0000')
+    T2 = util.parse_datetime('201807160200+0000')
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(DATA_DIR, 'esi_buy_order.json')) as f:
+            cls.buy_order = json.load(f)
+        with open(os.path.join(DATA_DIR, 'esi_sell_order.json')) as f:
+            cls.sell_order = json.load(f)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.sut = history.OrderHistoryStore(tmp.name)
+
+        buy, sell = self.buy_order, self.sell_order
+        cheaper_buy = dict(buy, price=500.0)
+        self._record(self.T0, created=[buy, sell])
+        self._record(self.T1, changed=[cheaper_buy])
+        self._record(self.T2, removed=[cheaper_buy])
+
+    def _record(self, t, created=(), changed=(), removed=()):
+        def orders(records):
+            return {d['order_id']: trade.MarketOrderSnapshot(d, t)
+                    for d in records}
+        self.sut.record(market.OrderChanges(
+            self.REGION_ID, t,
+            created=orders(created),
+            changed=orders(changed),
+            removed=orders(removed),
+        ))
+
+    def test_segments(self):
+        """Records are split into one segment per UTC day."""
+        self.assertEqual(len(self.sut.segments()), 2)
+        self.assertEqual(len(self.sut.segments(start=self.T1)), 1)
+
+    def test_query__order_id(self):
+        """Every version of an order is returned in time order."""
+        rows = self.sut.query(order_id=self.buy_order['order_id'])
+        self.assertEqual(rows['price'].tolist(), [597.72, 500.0])
+        self.assertEqual(rows['region_id'].tolist(),
+                         [self.REGION_ID] * 2)
+
+    def test_query__removed(self):
+        """Removal records are only returned on request."""
+        rows = self.sut.query(order_id=self.buy_order['order_id'],
+                              include_removed=True)
+        self.assertEqual(rows['removed'].tolist(), [False, False, True])
+
+    def test_query__type_and_window(self):
+        """Queries can combine type and time window criteria."""
+        rows = self.sut.query(type_id=[self.sell_order['type_id']])
+        self.assertEqual(rows['order_id'].tolist(),
+                         [self.sell_order['order_id']])
+        rows = self.sut.query(start=self.T1, end=self.T2)
+        self.assertEqual(rows['order_id'].tolist(),
+                         [self.buy_order['order_id']])
+
+    def test_append__partial_record(self):
+        """A partial record left by a crash is dropped on append."""
+        path = self.sut.segments(start=self.T1)[0]
+        with open(path, 'ab') as f:
+            f.write(b'\x00' * (history.RECORD_DTYPE.itemsize // 2))
+
+        self._record(self.T2, created=[self.sell_order])
+
+        self.assertEqual(
+            os.path.getsize(path) % history.RECORD_DTYPE.itemsize, 0
+        )
+        rows = self.sut.query(start=self.T1,
+                              type_id=[self.sell_order['type_id']])
+        self.assertEqual(rows['order_id'].tolist(),
+                         [self.sell_order['order_id']])
+        self.assertEqual(rows['price'].tolist(),
+                         [self.sell_order['price']])
+
+    def test_versions(self):
+        """A VersionedMarketOrder is rebuilt from the records."""
+        order = self.sut.versions(self.buy_order['order_id'])
+        self.assertIsInstance(order, trade.VersionedMarketOrder)
+        self.assertEqual(len(order.snapshots), 2)
+        self.assertEqual(order.t, self.T1)
+        self.assertEqual(order['price'], 500.0)
+        self.assertEqual(order['range'], self.buy_order['range'])
+        self.assertEqual(order.issued,
+                         util.parse_datetime(self.buy_order['issued']))
+        self.assertIsNone(self.sut.versions(1))
+
+    def test_iter_orders(self):
+        """Orders matching the criteria are built one by one."""
+        orders = list(self.sut.iter_orders())
+        self.assertCountEqual(
+            [o.order_id for o in orders],
+            [self.buy_order['order_id'], self.sell_order['order_id']]
+        )
+
+    def test_attach(self):
+        """Attaching to a market records the changes of each update."""
+        mock_market = mock.Mock()
+        self.sut.attach(mock_market)
+        mock_market.add_listener.assert_called_once_with(self.sut.record)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import os
+import tempfile
 import unittest
 
+import numpy as np
+
 from .. import local, trade
 from . import DATA_DIR
 
@@ -52,6 +55,165 @@ class TestMarketLogFile(unittest.TestCase):
         self.assertIsInstance(order.data['order_id'], int)
         self.assertIsInstance(order.data['is_buy_order'], bool)
 
+    def test_orders__bool_parsing(self):
+        """Boolean literals are parsed without evaluation."""
+        self.assertIs(self.sut.orders[0].data['is_buy_order'], True)
+        self.assertIs(self.sut.orders[1].data['is_buy_order'], False)
+
+    def test_orders__trailing_column(self):
+        """The empty column left by trailing commas is dropped."""
+        self.assertNotIn('', self.sut.orders[0].data)
+
+    def test_esi_record(self):
+        """Order data converts to the ESI record format."""
+        record = local.esi_record(self.sut.orders[1].data)
+        self.assertEqual(record['range'], 'region')
+        self.assertEqual(record['volume_remain'], 1)
+        self.assertEqual(record['volume_total'], 1)
+        self.assertEqual(record['price'], 28000.0)
+        self.assertEqual(record['issued'], '2018-06-29T13:09:32Z')
+
+    def test_filter(self):
+        """Orders can be selected by type, station and order ID."""
+        orders = self.sut.filter(type_id=28668)
+        self.assertEqual([o.data['order_id'] for o in orders],
+                         [1234567891])
+        self.assertEqual(len(self.sut.filter(station_id=60003466)), 2)
+        self.assertEqual(
+            self.sut.filter(type_id=[39, 28668], order_id=1234567890),
+            self.sut.orders[:1]
+        )
+
+    def test_parse_export_name(self):
+        """Export file names give the export's names and time."""
+        names, t = local.parse_export_name(
+            'Tash-Murkon-Tritanium-2018.07.05 180744.txt'
+        )
+        self.assertEqual(names, 'Tash-Murkon-Tritanium')
+        self.assertEqual(t.isoformat(), '2018-07-05T18:07:44+00:00')
+        names, t = local.parse_export_name(
+            'My Orders-2018.07.05 1807.txt'
+        )
+        self.assertEqual(names, local.PERSONAL_ORDERS)
+        self.assertEqual(t.minute, 7)
+        self.assertEqual(
+            local.parse_export_name('The Forge-Tritanium-2018.13.45 '
+                                    '1807.txt'),
+            ('The Forge-Tritanium', None)
+        )
+        self.assertIsNone(local.parse_export_name('notes.txt'))
+
+
+class TestMarketLogFileLazy(unittest.TestCase):
+    """Lazy mode indexes the file and parses orders on access."""
+
+    PATH = os.path.join(DATA_DIR, 'My Orders-2018.07.05 1807.txt')
+
+    def setUp(self):
+        self.sut = local.MarketLogFile(path=self.PATH, lazy=True)
+        self.addCleanup(self.sut.close)
+        self.eager = local.MarketLogFile(path=self.PATH)
+
+    def test_orders(self):
+        """Orders parse to the same data as in eager mode."""
+        orders = self.sut.orders
+        self.assertEqual(len(orders), 2)
+        self.assertIsInstance(orders[-1], trade.SimpleMarketOrder)
+        self.assertEqual([o.data for o in orders],
+                         [o.data for o in self.eager.orders])
+
+    def test_filter(self):
+        """Only the matching orders are parsed."""
+        orders = self.sut.filter(type_id=28668, station_id=60003466)
+        self.assertEqual([o.data for o in orders],
+                         [self.eager.orders[1].data])
+        self.assertEqual(self.sut.filter(order_id=1), [])
+
+    def test_close(self):
+        """Orders are unavailable once the file is closed."""
+        with local.MarketLogFile(path=self.PATH, lazy=True) as sut:
+            pass
+        with self.assertRaises(ValueError):
+            sut.orders[0]
+
+
+class TestMarketLogFileColumns(unittest.TestCase):
+    """Log files can be read into NumPy column arrays."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.columns = local.MarketLogFile.read_columns(path=os.path.join(
+            DATA_DIR,
+            'My Orders-2018.07.05 1807.txt'
+        ))
+
+    def test_read_columns(self):
+        """Columns carry the same names as the order fields."""
+        orders = local.MarketLogFile(path=os.path.join(
+            DATA_DIR,
+            'My Orders-2018.07.05 1807.txt'
+        )).orders
+        self.assertCountEqual(self.columns.keys(), orders[0].data.keys())
+        self.assertEqual(self.columns['order_id'].tolist(),
+                         [order.data['order_id'] for order in orders])
+
+    def test_read_columns__types(self):
+        """Columns are converted to typed arrays."""
+        columns = self.columns
+        self.assertEqual(columns['is_buy_order'].tolist(), [True, False])
+        self.assertEqual(columns['price'].dtype, np.float64)
+        self.assertEqual(columns['price'][0], 596.59)
+        self.assertEqual(columns['range'].tolist(), [-1, 32767])
+        self.assertEqual(columns['issued'][0],
+                         np.datetime64('2018-06-29T18:22:34'))
+        self.assertEqual(columns['station_name'].dtype.kind, 'U')
+
+    def test_blank_lines(self):
+        """Blank lines are skipped, as in lazy mode.
+
+        Rows with the wrong number of fields are rejected.
+        """
+        path = os.path.join(DATA_DIR, 'My Orders-2018.07.05 1807.txt')
+        with open(path, 'r', newline='') as f:
+            lines = f.read().splitlines(keepends=True)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        blank_path = os.path.join(tmp.name, 'blank.txt')
+        with open(blank_path, 'w', newline='') as f:
+            f.write(''.join([lines[0], '\n', lines[1], '\n'] + lines[2:]
+                            + ['\n']))
+
+        orders = local.MarketLogFile(path=blank_path).orders
+        self.assertEqual([o.data for o in orders],
+                         [o.data for o in
+                          local.MarketLogFile(path=path).orders])
+        columns = local.MarketLogFile.read_columns(path=blank_path)
+        self.assertEqual(columns['order_id'].tolist(),
+                         self.columns['order_id'].tolist())
+
+        with open(blank_path, 'a') as f:
+            f.write('123,34\n')
+        self.assertRaises(ValueError, local.MarketLogFile.read_columns,
+                          path=blank_path)
+
+    def test_read_columns__quoted(self):
+        """Quoted fields may contain commas."""
+        path = os.path.join(DATA_DIR, 'My Orders-2018.07.05 1807.txt')
+        with open(path, 'r', newline='') as f:
+            content = f.read()
+        name = self.columns['station_name'][0]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        quoted_path = os.path.join(tmp.name, 'quoted.txt')
+        with open(quoted_path, 'w', newline='') as f:
+            f.write(content.replace(name, '"{}, Annex"'.format(name), 1))
+
+        columns = local.MarketLogFile.read_columns(path=quoted_path)
+        self.assertEqual(columns['station_name'][0],
+                         '{}, Annex'.format(name))
+        self.assertEqual(columns['order_id'].tolist(),
+                         self.columns['order_id'].tolist())
+
 
 if __name__ == '__main__':
     unittest.main()
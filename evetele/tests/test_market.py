@@ -3,7 +3,7 @@ import os
 import unittest
 from unittest import mock
 
-from .. import esi, util, market, trade
+from .. import esi, util, market, storage, trade
 
 from . import DATA_DIR
 from .test_esi import ESIClientWrapperTestCase
@@ -62,12 +62,12 @@ class TestMarket(ESIClientWrapperTestCase):
         NOW = util.parse_datetime('201807160000+0000')
 
         stub_function.return_value = NOW
-        self.sut.fetch.return_value = self.order_data_list
+        self.sut.fetch_iter.return_value = self.order_data_list
         kwargs = dict(region_id=REGION_ID)
 
         retval = self.sut.update(**kwargs)
 
-        self.sut.fetch.assert_called_with(
+        self.sut.fetch_iter.assert_called_with(
             endpoint='markets_region_id_orders',
             **kwargs
         )
@@ -108,12 +108,12 @@ class TestMarket(ESIClientWrapperTestCase):
         NOW = util.parse_datetime('201807160000+0000')
 
         stub_function.return_value = NOW
-        self.sut.fetch.return_value = [self.order_data_list[0]]
+        self.sut.fetch_iter.return_value = [self.order_data_list[0]]
         kwargs = dict(region_id=REGION_ID, type_id=TYPE_ID)
 
         retval = self.sut.update(**kwargs)
 
-        self.sut.fetch.assert_called_with(
+        self.sut.fetch_iter.assert_called_with(
             endpoint='markets_region_id_orders',
             **kwargs
         )
@@ -129,7 +129,7 @@ class TestMarket(ESIClientWrapperTestCase):
         LOCATION_ID = 60005419
         TYPE_ID = 40
 
-        self.sut.fetch.return_value = [self.order_data_list[0]]
+        self.sut.fetch_iter.return_value = [self.order_data_list[0]]
         kwargs = dict(region_id=REGION_ID, type_id=TYPE_ID)
 
         first_tstamp = util.parse_datetime('201807160000+0000')
@@ -154,6 +154,147 @@ class TestMarket(ESIClientWrapperTestCase):
         self.assertEqual(len(type_list), 1)
         self.assertEqual(type_list[0].t, second_tstamp)
 
+    @mock.patch.object(util, 'get_utc_datetime')
+    def test_update__alternative_store(self, stub_function):
+        """Orders are written to the store provided on init.
+
+        Access through the market is unchanged whichever store backs
+        it.
+        """
+        REGION_ID = 10000042
+        NOW = util.parse_datetime('201807160000+0000')
+        stub_function.return_value = NOW
+
+        store = storage.ColumnarOrderStore()
+        sut = market.Market(client=self.mock_client, store=store)
+        sut.fetch_iter = mock.Mock(return_value=self.order_data_list)
+
+        sut.update(REGION_ID)
+
+        self.assertEqual(len(store), 2)
+        order_data = self.order_data_list[1]
+        type_list = self.get_type_list(sut, REGION_ID,
+                                       order_data['system_id'],
+                                       order_data['location_id'],
+                                       order_data['type_id'])
+        self.assertEqual(type_list[0].id, order_data['order_id'])
+        self.assertEqual(type_list[0].t, NOW)
+
+    @mock.patch.object(util, 'get_utc_datetime')
+    def test_update_many(self, stub_function):
+        """Several regions are fetched together and each is updated.
+
+        Fetching is delegated to an AsyncESIClient; one call is made
+        per region.
+        """
+        NOW = util.parse_datetime('201807160000+0000')
+        stub_function.return_value = NOW
+        buy_order, sell_order = self.order_data_list
+        async_client = self.sut._async_client = mock.Mock()
+        async_client.fetch_many = mock.AsyncMock(
+            return_value=[[buy_order], [sell_order]]
+        )
+
+        retval = self.sut.update_many([1, 2])
+
+        async_client.fetch_many.assert_awaited_once_with([
+            ('markets_region_id_orders', {'region_id': 1}),
+            ('markets_region_id_orders', {'region_id': 2}),
+        ])
+        self.assertCountEqual(retval.keys(), [1, 2])
+        for region_id, order_data in [(1, buy_order), (2, sell_order)]:
+            type_list = self.get_type_list(self.sut, region_id,
+                                           order_data['system_id'],
+                                           order_data['location_id'],
+                                           order_data['type_id'])
+            self.assertEqual(type_list[0].id, order_data['order_id'])
+            self.assertEqual(type_list[0].t, NOW)
+
+    def _check_update_changes(self, sut):
+        REGION_ID = 10000042
+        buy_order, sell_order = self.order_data_list
+        changed_buy = dict(buy_order, volume_remain=1)
+        new_sell = dict(sell_order, order_id=1)
+
+        sut.fetch_iter = mock.Mock(return_value=[buy_order, sell_order])
+        changes = sut.update_changes(REGION_ID)
+        self.assertCountEqual(changes.created,
+                              [buy_order['order_id'],
+                               sell_order['order_id']])
+        self.assertEqual(len(changes), 2)
+
+        sut.fetch_iter.return_value = [changed_buy, new_sell]
+        changes = sut.update_changes(REGION_ID)
+
+        self.assertEqual(list(changes.created), [1])
+        self.assertEqual(list(changes.changed), [buy_order['order_id']])
+        self.assertEqual(
+            changes.changed[buy_order['order_id']]['volume_remain'], 1
+        )
+        self.assertEqual(list(changes.removed),
+                         [sell_order['order_id']])
+        self.assertEqual(
+            changes.removed[sell_order['order_id']].id,
+            sell_order['order_id']
+        )
+
+        # Re-pulling the same orders changes nothing.
+        changes = sut.update_changes(REGION_ID)
+        self.assertEqual(len(changes), 0)
+
+    def test_update_changes(self):
+        """Created, changed and removed orders are reported.
+
+        Orders are matched by order ID; an order has changed if its
+        price or remaining volume has. Orders absent from a pull have
+        been removed and are no longer stored.
+        """
+        self._check_update_changes(self.sut)
+        self.assertEqual(
+            self.get_type_list(self.sut, 10000042, 30002053, 60005686,
+                               506)[0].id,
+            1
+        )
+
+    def test_update_changes__columnar_store(self):
+        """Changes are reported in the same way for columnar storage.
+        """
+        sut = market.Market(client=self.mock_client,
+                            store=storage.ColumnarOrderStore())
+        self._check_update_changes(sut)
+
+    def test_add_listener(self):
+        """Listeners receive the changes from every update."""
+        listener = mock.Mock()
+        self.sut.add_listener(listener)
+        self.sut.fetch_iter.return_value = self.order_data_list
+
+        self.sut.update(10000042)
+
+        (changes,), __ = listener.call_args
+        self.assertIsInstance(changes, market.OrderChanges)
+        self.assertEqual(len(changes.created), 2)
+
+        self.sut.remove_listener(listener)
+        self.sut.update(10000042)
+        self.assertEqual(listener.call_count, 1)
+
+    def test_ingest(self):
+        """Orders from elsewhere are stored with the given time."""
+        listener = mock.Mock()
+        self.sut.add_listener(listener)
+        t = util.parse_datetime('201807050000+0000')
+        buy_order = self.order_data_list[0]
+
+        self.sut.ingest(10000042, [buy_order], t,
+                        type_id=buy_order['type_id'])
+
+        order, = self.get_type_list(self.sut, 10000042, 30003411,
+                                    60005419, 40)
+        self.assertEqual(order.t, t)
+        (changes,), __ = listener.call_args
+        self.assertEqual(list(changes.created), [buy_order['order_id']])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,173 @@
+import unittest
+from unittest import mock
+
+from .. import market, orderbook, static, trade, util
+
+
+LOCATION_ID = 60003760
+TYPE_ID = 34
+T = util.parse_datetime('201807160000+0000')
+
+
+def _order(order_id, price, volume, is_buy_order=False,
+           location_id=LOCATION_ID, type_id=TYPE_ID, **kwargs):
+    return trade.CompactMarketOrderSnapshot(dict(
+        order_id=order_id,
+        price=price,
+        volume_remain=volume,
+        is_buy_order=is_buy_order,
+        location_id=location_id,
+        type_id=type_id,
+        **kwargs
+    ), T)
+
+
+class TestOrderBook(unittest.TestCase):
+    """Exercises the sorted bid/ask book over market orders."""
+
+    def setUp(self):
+        self.sut = orderbook.OrderBook()
+        self.sut.add([
+            _order(1, 5.0, 100),
+            _order(2, 4.0, 50),
+            _order(3, 6.0, 200),
+            _order(4, 5.0, 10),
+            _order(5, 3.0, 100, is_buy_order=True),
+            _order(6, 3.5, 20, is_buy_order=True),
+            _order(7, 1.0, 1000, location_id=1),
+        ])
+
+    def test_best(self):
+        """Best bid is the highest buy price, best ask the lowest."""
+        self.assertEqual(self.sut.best_bid(LOCATION_ID, TYPE_ID), 3.5)
+        self.assertEqual(self.sut.best_ask(LOCATION_ID, TYPE_ID), 4.0)
+        self.assertEqual(self.sut.spread(LOCATION_ID, TYPE_ID), 0.5)
+
+    def test_empty(self):
+        """Queries on an empty book return None (or no volume)."""
+        self.assertIsNone(self.sut.best_bid(LOCATION_ID, 35))
+        self.assertIsNone(self.sut.spread(1, TYPE_ID))
+        self.assertEqual(self.sut.volume(LOCATION_ID, 35), 0)
+        self.assertIsNone(self.sut.vwap(LOCATION_ID, 35, 1))
+
+    def test_levels(self):
+        """Orders at the same price are aggregated, best first."""
+        self.assertEqual(
+            self.sut.levels(LOCATION_ID, TYPE_ID),
+            [(4.0, 50), (5.0, 110), (6.0, 200)]
+        )
+        self.assertEqual(
+            self.sut.levels(LOCATION_ID, TYPE_ID, orderbook.BID),
+            [(3.5, 20), (3.0, 100)]
+        )
+        self.assertRaises(ValueError, self.sut.levels,
+                          LOCATION_ID, TYPE_ID, 'fish')
+
+    def test_depth(self):
+        """Depth is the worst price reached filling a quantity."""
+        self.assertEqual(self.sut.depth(LOCATION_ID, TYPE_ID, 50), 4.0)
+        self.assertEqual(self.sut.depth(LOCATION_ID, TYPE_ID, 51), 5.0)
+        self.assertEqual(self.sut.depth(LOCATION_ID, TYPE_ID, 360), 6.0)
+        self.assertIsNone(self.sut.depth(LOCATION_ID, TYPE_ID, 361))
+        self.assertEqual(self.sut.volume(LOCATION_ID, TYPE_ID), 360)
+
+    def test_vwap(self):
+        """VWAP averages the prices of the best orders filled."""
+        self.assertEqual(self.sut.vwap(LOCATION_ID, TYPE_ID, 50), 4.0)
+        self.assertEqual(self.sut.vwap(LOCATION_ID, TYPE_ID, 100), 4.5)
+        self.assertAlmostEqual(
+            self.sut.vwap(LOCATION_ID, TYPE_ID, 30, orderbook.BID),
+            (20 * 3.5 + 10 * 3.0) / 30
+        )
+        self.assertIsNone(self.sut.vwap(LOCATION_ID, TYPE_ID, 1000))
+
+    def test_apply(self):
+        """Market changes update the book incrementally."""
+        self.sut.apply(market.OrderChanges(
+            10000002, T,
+            created={8: _order(8, 3.9, 5)},
+            changed={5: _order(5, 3.6, 100, is_buy_order=True)},
+            removed={2: _order(2, 4.0, 50), 7: None},
+        ))
+        self.assertEqual(self.sut.best_ask(LOCATION_ID, TYPE_ID), 3.9)
+        self.assertEqual(self.sut.best_bid(LOCATION_ID, TYPE_ID), 3.6)
+        self.assertEqual(self.sut.depth(LOCATION_ID, TYPE_ID, 6), 5.0)
+        self.assertNotIn((1, TYPE_ID), self.sut)
+        self.assertEqual(len(self.sut), 6)
+
+    def test_attach(self):
+        """Attaching to a market applies the changes of each update."""
+        mock_market = mock.Mock()
+        self.sut.attach(mock_market)
+        mock_market.add_listener.assert_called_once_with(self.sut.apply)
+
+
+class TestBuyOrderIndex(unittest.TestCase):
+    """Exercises the index of buy orders by the stations they cover.
+
+    Systems 1-2-3-4 form a chain in region 10, with system 5 in
+    region 20 adjacent to system 1. Each system n has station 100n.
+    """
+
+    def setUp(self):
+        esd = static.EveStaticData()
+        esd.system_regions = {1: 10, 2: 10, 3: 10, 4: 10, 5: 20}
+        esd.station_systems = {100 * n: n for n in range(1, 6)}
+        esd.system_jumps = {1: {2, 5}, 2: {1, 3}, 3: {2, 4}, 4: {3},
+                            5: {1}}
+        esd.system_security = {}
+        self.sut = orderbook.BuyOrderIndex(esd)
+        self.sut.add([
+            self._buy(1, 10.0, 'station', 2),
+            self._buy(2, 11.0, 'solarsystem', 2),
+            self._buy(3, 12.0, '1', 2),
+            self._buy(4, 9.0, 'region', 4),
+            self._buy(5, 13.0, '5', 3),
+            _order(6, 20.0, 1, location_id=200, system_id=2),
+        ], region_id=10)
+
+    @staticmethod
+    def _buy(order_id, price, range_, system_id):
+        return _order(order_id, price, 1, is_buy_order=True,
+                      location_id=100 * system_id, system_id=system_id,
+                      range=range_)
+
+    def _matching(self, station_id, **kwargs):
+        return [order.id for order in
+                self.sut.matching(station_id, TYPE_ID, **kwargs)]
+
+    def test_matching(self):
+        """Orders are matched according to their range."""
+        self.assertEqual(self._matching(200), [5, 3, 2, 1, 4])
+        self.assertEqual(self._matching(100), [5, 3, 4])
+        self.assertEqual(self._matching(400), [5, 4])
+
+    def test_matching__other_region(self):
+        """Ranges do not extend into neighbouring regions."""
+        self.assertEqual(self._matching(500), [])
+
+    def test_matching__location(self):
+        """Locations not in static data may be given a system."""
+        self.assertEqual(self._matching(1234, system_id=3), [5, 3, 4])
+        self.assertEqual(self.sut.matching(200, 35), [])
+
+    def test_apply(self):
+        """Market changes update the index incrementally."""
+        self.sut.apply(market.OrderChanges(
+            10, T,
+            changed={5: self._buy(5, 13.0, 'station', 3)},
+            removed={3: None, 4: None},
+        ))
+        self.assertEqual(self._matching(200), [2, 1])
+        self.assertEqual(self._matching(300), [5])
+        self.assertEqual(len(self.sut), 3)
+
+    def test_add__unknown_range(self):
+        """Orders of unknown range are treated as station orders."""
+        self.sut.add([self._buy(7, 14.0, None, 3)], region_id=10)
+        self.assertEqual(self._matching(300), [7, 5, 3, 4])
+        self.assertEqual(self._matching(200), [5, 3, 2, 1, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+from .. import market, persist, trade, util
+
+from . import DATA_DIR
+
+
+class TestOrderWriter(unittest.TestCase):
+    """Exercises the COPY-based order writer against a mock database.
+
+    The SQL issued and the content of the COPY buffers are checked;
+    no PostgreSQL server is needed.
+    """
+
+    REGION_ID = 10000042
+    T0 = util.parse_datetime('201807160000+0000')
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(DATA_DIR, 'esi_buy_order.json')) as f:
+            cls.buy_order = json.load(f)
+        with open(os.path.join(DATA_DIR, 'esi_sell_order.json')) as f:
+            cls.sell_order = json.load(f)
+
+    def setUp(self):
+        self.database = mock.MagicMock()
+        connection = self.database.connection.return_value.__enter__
+        self.cursor = connection.return_value.cursor.return_value
+        self.copied = []
+        self.cursor.copy_expert.side_effect = (
+            lambda sql, buffer: self.copied.append(buffer.read())
+        )
+        self.sut = persist.OrderWriter(self.database, batch_size=1)
+
+    def _orders(self, *records):
+        return {d['order_id']: trade.MarketOrderSnapshot(d, self.T0)
+                for d in records}
+
+    def _statements(self):
+        return [c[0][0] for c in self.cursor.execute.call_args_list]
+
+    def test_create_table(self):
+        """The table is hash-partitioned on order ID."""
+        self.sut.partitions = 4
+        self.sut.create_table()
+        statements = self._statements()
+        self.assertIn('PARTITION BY HASH (order_id)', statements[0])
+        self.assertIn('PRIMARY KEY (order_id)', statements[0])
+        self.assertIn('market_orders_p3 PARTITION OF market_orders',
+                      statements[4])
+        self.assertIn('MODULUS 4, REMAINDER 3', statements[4])
+
+    def test_write(self):
+        """Orders are copied in batches then upserted in one go."""
+        orders = self._orders(self.buy_order, self.sell_order)
+        self.sut.write(orders.values(), self.REGION_ID, self.T0)
+
+        # One COPY per batch of one order.
+        self.assertEqual(len(self.copied), 2)
+        fields = self.copied[0].rstrip('\n').split('\t')
+        self.assertEqual(len(fields), len(persist.COLUMNS))
+        row = dict(zip((name for name, __ in persist.COLUMNS), fields))
+        self.assertEqual(row['order_id'],
+                         str(self.buy_order['order_id']))
+        self.assertEqual(row['region_id'], str(self.REGION_ID))
+        self.assertEqual(row['is_buy_order'], 't')
+        self.assertEqual(row['t'], self.T0.isoformat())
+
+        statements = self._statements()
+        self.assertEqual(statements[0], 'BEGIN')
+        self.assertIn('market_orders_staging', statements[1])
+        self.assertIn('ON CONFLICT (order_id) DO UPDATE', statements[2])
+        self.assertIn('market_orders.t <= EXCLUDED.t', statements[2])
+        self.assertEqual(statements[-1], 'COMMIT')
+        self.assertEqual(self.sut.stats['written'], 2)
+
+    def test_write_changes(self):
+        """Removed orders are deleted alongside the upsert."""
+        changes = market.OrderChanges(
+            self.REGION_ID, self.T0,
+            created=self._orders(self.buy_order),
+            changed={},
+            removed=self._orders(self.sell_order),
+        )
+        self.sut.write_changes(changes)
+
+        delete = self.cursor.execute.call_args_list[-2]
+        self.assertIn('DELETE FROM market_orders', delete[0][0])
+        self.assertEqual(delete[0][1], ([self.sell_order['order_id']],))
+        self.assertEqual(len(self.copied), 1)
+        self.assertEqual(self.sut.stats['deleted'], 1)
+
+    def test_write__rollback(self):
+        """A failed COPY rolls the transaction back."""
+        self.cursor.copy_expert.side_effect = RuntimeError
+        orders = self._orders(self.buy_order)
+        with self.assertRaises(RuntimeError):
+            self.sut.write(orders.values(), self.REGION_ID, self.T0)
+        self.assertEqual(self._statements()[-1], 'ROLLBACK')
+
+    def test_copy_value(self):
+        """Values are escaped for COPY's text format."""
+        self.assertEqual(persist._copy_value(None), '\\N')
+        self.assertEqual(persist._copy_value(False), 'f')
+        self.assertEqual(persist._copy_value('a\tb\\'), 'a\\tb\\\\')
+
+
+if __name__ == '__main__':
+    unittest.main()
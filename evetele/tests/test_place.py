@@ -47,6 +47,9 @@ class BaseTestCase(unittest.TestCase, metaclass=abc.ABCMeta):
         place.static.global_esd = cls.global_esd_orig
 
     def setUp(self):
+        # Start from, and leave behind, empty instance caches.
+        place._Location.invalidate_all()
+        self.addCleanup(place._Location.invalidate_all)
         self.sut = self._sut_class(self._example_metadata['id'])
 
 
@@ -73,7 +76,7 @@ class TestRegion(BaseTestCase):
 
         This is default, base class behaviour.
         """
-        place.Region._cache = {}
+        place.Region.invalidate()
 
         self.assertEqual(len(place.Region._cache), 0)
         region = place.Region(1234)
@@ -89,7 +92,7 @@ class TestRegion(BaseTestCase):
 
         This is default, base class behaviour.
         """
-        place.Region._cache = {}
+        place.Region.invalidate()
 
         self.assertEqual(len(place.Region._cache), 0)
         region = place.Region('ABCD')
@@ -134,25 +137,40 @@ class TestRegion(BaseTestCase):
     def test_get_id(self):
         """Method returns the ID for a region name.
 
-        This is default, base class behaviour but it relies on
-        configuration in the concrete class.
+        This is default, base class behaviour. Names are resolved via
+        the static data name index, without querying the database.
         """
         mock_esd = place.static.global_esd
-        stub_record = mock.Mock(regionID=4321)
-        stub_cursor = mock_esd.db.query.return_value
-        stub_cursor.fetchone.return_value = mock.Mock(regionID=4321)
+        mock_esd.get_id.return_value = 4321
 
         self.assertEqual(place.Region.get_id('XYZ'), 4321)
-        args, kwargs = mock_esd.db.query.call_args
-        self.assertEqual(
-            args[0],
-            """
-            SELECT "regionID"
-              FROM "mapRegions"
-             WHERE "regionName" = %s
-            """
+        mock_esd.get_id.assert_called_with('region', 'XYZ')
+        mock_esd.db.query.assert_not_called()
+
+    def test_many(self):
+        """Instances are resolved in one batch, in input order.
+
+        Cached instances are re-used; only the rest are looked up.
+        This is default, base class behaviour.
+        """
+        mock_esd = place.static.global_esd
+        mock_esd.get_metadata_many = mock.Mock(return_value=[
+            {'id': 1235, 'name': 'EFGH'},
+            {'id': 1236, 'name': 'IJKL'},
+        ])
+        place.Region.invalidate()
+        cached = place.Region(1234)
+
+        regions = place.Region.many([1235, 1234, 'IJKL', 1235])
+
+        mock_esd.get_metadata_many.assert_called_once_with(
+            'region', [1235, 'IJKL']
         )
-        self.assertEqual(args[1], ('XYZ',))
+        self.assertIs(regions[1], cached)
+        self.assertIs(regions[0], regions[3])
+        self.assertEqual([r.id for r in regions],
+                         [1235, 1234, 1236, 1235])
+        self.assertIs(place.Region(1236), regions[2])
 
 
 class TestSystem(BaseTestCase):
@@ -192,6 +210,15 @@ class TestSystem(BaseTestCase):
         region_obj = stub_property.return_value
         region_obj.update_market.assert_called_with(34)
 
+    def test_jumps(self):
+        """Distances are looked up in the static jump graph."""
+        graph = place.static.global_esd.jump_graph
+        graph.jumps.return_value = 3
+        self.assertEqual(self.sut.jumps(5679, highsec=True), 3)
+        graph.jumps.assert_called_with(5678, 5679, highsec=True)
+        self.sut.route(self.sut)
+        graph.route.assert_called_with(5678, 5678, highsec=False)
+
 
 class TestStation(BaseTestCase):
     """Exercises the configuration and extended behaviour."""
@@ -1,10 +1,14 @@
 import collections
+import os
+import pickle
+import tempfile
 import unittest
 from unittest import mock
 
 import ddt
+import numpy as np
 
-from evetele import static
+from evetele import place, static, trade
 
 from . import mock_property
 
@@ -34,6 +38,14 @@ class TestEveStaticData(unittest.TestCase):
     def setUp(self):
         static.EveStaticData.db = self.mock_dbobject = mock.Mock()
         self.mock_cursor = self.mock_dbobject.query.return_value
+        # Never pick up a real snapshot.
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.snapshot_path = os.path.join(tmp.name, 'sde.pickle')
+        patcher = mock.patch.object(static.EveStaticData,
+                                    'snapshot_path', self.snapshot_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_market_types(self):
         """Property provides a lookup capability for market items.
@@ -100,6 +112,56 @@ class TestEveStaticData(unittest.TestCase):
             {6001: {'id': 6001, 'name': 'StationA'}}
         )
 
+    @mock.patch('evetele.static.EveStaticData.regions',
+                new_callable=mock.PropertyMock)
+    def test_system_regions(self, stub_property):
+        """Property maps system IDs to their region ID."""
+        stub_property.return_value = self.sample_region_dict
+        esd = static.EveStaticData()
+        self.assertEqual(esd.system_regions,
+                         {3001: 1001, 3002: 1001, 3003: 1002, 3004: 1003})
+
+    @mock.patch('evetele.static.EveStaticData.systems',
+                new_callable=mock.PropertyMock)
+    def test_station_systems(self, stub_property):
+        """Property maps station IDs to their system ID."""
+        stub_property.return_value = self.sample_system_dict
+        esd = static.EveStaticData()
+        self.assertEqual(esd.station_systems, {6001: 3004})
+
+    def test_system_jumps(self):
+        """Property is an undirected adjacency map of systems."""
+        Record = collections.namedtuple('Record', 'from_id, to_id')
+        self.mock_cursor.fetchall.return_value = [
+            Record(3001, 3002), Record(3002, 3003),
+        ]
+        esd = static.EveStaticData()
+        self.assertEqual(esd.system_jumps,
+                         {3001: {3002}, 3002: {3001, 3003},
+                          3003: {3002}})
+
+    @mock.patch('evetele.static.EveStaticData.system_security',
+                new_callable=mock.PropertyMock)
+    @mock.patch('evetele.static.EveStaticData.system_jumps',
+                new_callable=mock.PropertyMock)
+    def test_systems_within(self, stub_property, stub_security):
+        """Distances are found breadth-first and cached."""
+        stub_property.return_value = {
+            1: {2, 3}, 2: {1, 4}, 3: {1, 4}, 4: {2, 3, 5}, 5: {4},
+        }
+        stub_security.return_value = {6: 1.0}
+        esd = static.EveStaticData()
+        self.assertEqual(esd.systems_within(1, 0), {1: 0})
+        self.assertEqual(esd.systems_within(1, 2),
+                         {1: 0, 2: 1, 3: 1, 4: 2})
+        self.assertEqual(esd.systems_within(1, 40),
+                         {1: 0, 2: 1, 3: 1, 4: 2, 5: 3})
+        self.assertEqual(esd.systems_within(6, 5), {6: 0})
+        self.assertEqual(esd.systems_within(7, 5), {7: 0})
+        calls = stub_property.call_count
+        esd.systems_within(1, 2)
+        self.assertEqual(stub_property.call_count, calls)
+
     @mock.patch('evetele.static.EveStaticData.stations',
                 new_callable=mock.PropertyMock)
     @mock.patch('evetele.static.EveStaticData._trade_hub_ids')
@@ -139,6 +201,367 @@ class TestEveStaticData(unittest.TestCase):
             retval = esd.get_metadata(entity_name, -1)
             self.assertIs(retval, expected)
 
+    @mock.patch('evetele.static.EveStaticData.stations',
+                new_callable=mock.PropertyMock)
+    def test_get_metadata__name(self, stub_property):
+        """Names are resolved case-insensitively via the index."""
+        stub_property.return_value = {
+            1: {'id': 1, 'name': 'Jita IV - Moon 4'},
+            2: {'id': 2, 'name': 'Amarr VIII'},
+        }
+        esd = static.EveStaticData()
+        for name in ('Amarr VIII', 'amarr viii'):
+            self.assertEqual(esd.get_metadata('station', name)['id'], 2)
+        self.assertRaises(ValueError, esd.get_metadata, 'station',
+                          'Amarr')
+        self.assertRaises(ValueError, esd.get_metadata, 'starbase', 1)
+        # The index is built once.
+        calls = stub_property.call_count
+        self.assertEqual(esd.get_id('station', 'Jita IV - Moon 4'), 1)
+        self.assertEqual(stub_property.call_count, calls)
+        self.mock_dbobject.query.assert_not_called()
+
+    @mock.patch('evetele.static.EveStaticData.regions',
+                new_callable=mock.PropertyMock)
+    def test_get_metadata_many(self, stub_property):
+        """Metadata for IDs and names is returned in input order."""
+        stub_property.return_value = self.sample_region_dict
+        esd = static.EveStaticData()
+        self.assertEqual(
+            [d['id'] for d in
+             esd.get_metadata_many('region', ['region3', 1001, 1002])],
+            [1003, 1001, 1002]
+        )
+        self.assertRaises(ValueError, esd.get_metadata_many, 'region',
+                          ['Region4'])
+
+    @mock.patch('evetele.static.EveStaticData.systems',
+                new_callable=mock.PropertyMock)
+    def test_get_id__case(self, stub_property):
+        """An exact-case match wins over other case variants."""
+        stub_property.return_value = {
+            1: {'id': 1, 'name': 'ABC'},
+            2: {'id': 2, 'name': 'abc'},
+        }
+        esd = static.EveStaticData()
+        self.assertEqual(esd.get_id('system', 'abc'), 2)
+        self.assertEqual(esd.get_id('system', 'ABC'), 1)
+        self.assertIn(esd.get_id('system', 'Abc'), (1, 2))
+
+    @mock.patch('evetele.static.EveStaticData.market_types',
+                new_callable=mock.PropertyMock)
+    def test_find(self, stub_property):
+        """Names can be matched exactly or by prefix."""
+        stub_property.return_value = {
+            34: {'id': 34, 'name': 'Tritanium'},
+            35: {'id': 35, 'name': 'Pyerite'},
+            36: {'id': 36, 'name': 'Mexallon'},
+            1230: {'id': 1230, 'name': 'Veldspar'},
+            17470: {'id': 17470, 'name': 'Concentrated Veldspar'},
+            17471: {'id': 17471, 'name': 'Dense Veldspar'},
+        }
+        esd = static.EveStaticData()
+        self.assertEqual(
+            [d['id'] for d in esd.find('market_type', 'veldspar')],
+            [1230]
+        )
+        self.assertEqual(
+            [d['id'] for d in esd.find('market_type', 'VELD',
+                                       prefix=True)],
+            [1230]
+        )
+        self.assertEqual(
+            [d['name'] for d in esd.find('market_type', 'd',
+                                         prefix=True)],
+            ['Dense Veldspar']
+        )
+        self.assertEqual(esd.find('market_type', 'x', prefix=True), [])
+
+
+class TestEveStaticDataSnapshot(unittest.TestCase):
+    """Exercises the local snapshot of the static data structures."""
+
+    sections = {
+        'regions': {1001: {'id': 1001, 'name': 'Region1',
+                           'systems': {}}},
+        'market_types': {34: {'id': 34, 'name': 'Tritanium'}},
+        'system_jumps': {3001: {3002}, 3002: {3001}},
+        'system_security': {3001: 0.9, 3002: 0.3},
+        'type_table': static.TypeTable([]),
+    }
+
+    def setUp(self):
+        static.EveStaticData.db = self.mock_dbobject = mock.Mock()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'sde.pickle')
+        patcher = mock.patch.object(static.EveStaticData,
+                                    'snapshot_path', self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _export(self):
+        esd = static.EveStaticData()
+        for section, value in self.sections.items():
+            patcher = mock.patch.object(
+                esd, '_query_{}'.format(section), return_value=value
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return esd.export_snapshot()
+
+    def test_export_snapshot(self):
+        """Structures are loaded from the snapshot, not the database."""
+        self.assertEqual(self._export(), self.path)
+        esd = static.EveStaticData()
+        for section in ('regions', 'market_types', 'system_jumps',
+                        'system_security'):
+            self.assertEqual(getattr(esd, section),
+                             self.sections[section])
+        self.assertIsInstance(esd.type_table, static.TypeTable)
+        self.mock_dbobject.query.assert_not_called()
+
+    def test_missing(self):
+        """Without a snapshot, the database is queried."""
+        esd = static.EveStaticData()
+        self.mock_dbobject.query.return_value.fetchall.return_value = []
+        self.assertEqual(esd.market_types, {})
+        self.mock_dbobject.query.assert_called_once()
+
+    @mock.patch.object(static, 'SNAPSHOT_VERSION', -1)
+    def test_stale__version(self):
+        """Snapshots from other format versions are ignored."""
+        with open(self.path, 'wb') as f:
+            pickle.dump({'header': {'version': 1},
+                         'sections': self.sections}, f)
+        esd = static.EveStaticData()
+        self.assertEqual(esd._snapshot, {})
+
+    def test_stale__source(self):
+        """Snapshots exported from another database are ignored."""
+        self._export()
+        source = {'host': 'elsewhere', 'port': None, 'database': None}
+        with mock.patch.object(static.EveStaticData, '_snapshot_source',
+                               return_value=source):
+            self.assertEqual(static.EveStaticData()._snapshot, {})
+
+    def test_unreadable(self):
+        """Corrupt snapshots are ignored."""
+        with open(self.path, 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertEqual(static.EveStaticData()._snapshot, {})
+
+    def test_unreadable__content(self):
+        """Snapshots without a header and sections are ignored.
+
+        Lookups fall back to the database.
+        """
+        for content in (['regions'], {'regions': {}},
+                        {'header': None, 'sections': {}},
+                        {'header': {}, 'sections': None}):
+            with open(self.path, 'wb') as f:
+                pickle.dump(content, f)
+            esd = static.EveStaticData()
+            self.assertEqual(esd._snapshot, {})
+            with mock.patch.object(esd, '_query_market_types',
+                                   return_value={}) as stub_query:
+                esd.market_types
+                stub_query.assert_called_once_with()
+
+
+class TestTypeTable(unittest.TestCase):
+    """Exercises the array-backed item type metadata."""
+
+    TypeRecord = collections.namedtuple(
+        'TypeRecord',
+        'type_id, name, group_id, market_group_id, volume, '
+        'portion_size, base_price, published'
+    )
+    GroupRecord = collections.namedtuple(
+        'GroupRecord', 'market_group_id, parent_group_id, name'
+    )
+
+    def setUp(self):
+        types = [
+            self.TypeRecord(35, 'Pyerite', 18, 1857, 0.01, 1, 8.0, True),
+            self.TypeRecord(34, 'Tritanium', 18, 1857, 0.01, 1, 2.0,
+                            True),
+            self.TypeRecord(587, 'Rifter', 25, 64, 27289.0, 1, None,
+                            True),
+            self.TypeRecord(1, 'Unpublished', 1, None, 1.0, 1, 0.0,
+                            False),
+        ]
+        groups = [
+            self.GroupRecord(4, None, 'Ships'),
+            self.GroupRecord(1361, 4, 'Frigates'),
+            self.GroupRecord(64, 1361, 'Minmatar'),
+            self.GroupRecord(1857, None, 'Minerals'),
+        ]
+        self.sut = static.TypeTable(types, groups)
+
+    def test_get(self):
+        """Fields are looked up for arrays of type IDs."""
+        self.assertEqual(
+            self.sut.volume([587, 34, 34]).tolist(),
+            [27289.0, 0.01, 0.01]
+        )
+        self.assertEqual(self.sut.get('base_price', [35, 587]).tolist(),
+                         [8.0, 0.0])
+        self.assertEqual(self.sut.get('name', [34]).tolist(),
+                         ['Tritanium'])
+        self.assertIn(587, self.sut)
+        self.assertNotIn(36, self.sut)
+
+    def test_get__unknown(self):
+        """Unknown type IDs raise KeyError unless given a default."""
+        self.assertRaises(KeyError, self.sut.volume, [34, 36])
+        volumes = self.sut.volume([34, 36, 99999], default=np.nan)
+        self.assertEqual(volumes[0], 0.01)
+        self.assertTrue(np.isnan(volumes[1:]).all())
+        self.assertEqual(
+            self.sut.get('market_group_id', [1, 36], -2).tolist(),
+            [-1, -2]
+        )
+
+    def test_market_group_types(self):
+        """Types are selected under a market group, recursively."""
+        self.assertEqual(self.sut.market_group_types(4).tolist(), [587])
+        self.assertEqual(
+            self.sut.market_group_types(4, recursive=False).tolist(), []
+        )
+        self.assertEqual(self.sut.market_group_types(1857).tolist(),
+                         [34, 35])
+        self.assertCountEqual(self.sut.descendant_groups(4),
+                              [4, 1361, 64])
+
+    def test_esd(self):
+        """The table is loaded from invTypes and invMarketGroups."""
+        static.EveStaticData.db = mock_db = mock.Mock()
+        mock_db.query.return_value.fetchall.side_effect = [
+            [self.TypeRecord(34, 'Tritanium', 18, 1857, 0.01, 1, 2.0,
+                             True)],
+            [],
+        ]
+        with mock.patch.object(static.EveStaticData, 'snapshot_path',
+                               None):
+            table = static.EveStaticData().type_table
+        self.assertEqual(table.type_ids.tolist(), [34])
+        self.assertEqual(mock_db.query.call_count, 2)
+
+
+class TestJumpGraph(unittest.TestCase):
+    """Exercises the CSR stargate graph and its searches.
+
+    Two routes lead from 1 to 6: 1-2-3-6 through lowsec system 3 and
+    1-4-5-7-6 through highsec. System 8 is isolated.
+    """
+
+    def setUp(self):
+        adjacency = {1: {2, 4}, 2: {1, 3}, 3: {2, 6}, 4: {1, 5},
+                     5: {4, 7}, 6: {3, 7}, 7: {5, 6}}
+        security = {n: 0.9 for n in range(1, 9)}
+        security[3] = 0.4
+        self.sut = static.JumpGraph.from_adjacency(adjacency, security)
+
+    def test_structure(self):
+        """Adjacency is held in CSR arrays over sorted system IDs."""
+        self.assertEqual(self.sut.system_ids.tolist(), list(range(1, 9)))
+        self.assertEqual(len(self.sut.indices), 14)
+        self.assertEqual(self.sut.neighbours(1).tolist(), [2, 4])
+        self.assertEqual(self.sut.neighbours(8).tolist(), [])
+        self.assertRaises(KeyError, self.sut.neighbours, 9)
+
+    def test_distances(self):
+        """Distances to every system, -1 where unreachable."""
+        self.assertEqual(self.sut.distances(1).tolist(),
+                         [0, 1, 2, 1, 2, 3, 3, -1])
+        self.assertEqual(self.sut.distances(1, max_jumps=1).tolist(),
+                         [0, 1, -1, 1, -1, -1, -1, -1])
+        self.assertEqual(self.sut.within(6, 1), {6: 0, 3: 1, 7: 1})
+
+    def test_route(self):
+        """Shortest routes, optionally avoiding low security space."""
+        self.assertEqual(self.sut.jumps(1, 6), 3)
+        self.assertEqual(self.sut.route(1, 6), [1, 2, 3, 6])
+        self.assertEqual(self.sut.jumps(1, 6, highsec=True), 4)
+        self.assertEqual(self.sut.route(1, 6, highsec=True),
+                         [1, 4, 5, 7, 6])
+        self.assertEqual(self.sut.route(1, 1), [1])
+        self.assertIsNone(self.sut.route(1, 8))
+        self.assertIsNone(self.sut.jumps(1, 3, highsec=True))
+
+    def test_distance_matrix(self):
+        """Pairwise distances between a set of systems."""
+        self.assertEqual(
+            self.sut.distance_matrix([1, 6, 8]).tolist(),
+            [[0, 3, -1], [3, 0, -1], [-1, -1, 0]]
+        )
+
+    def test_trade_hub_jumps(self):
+        """Hub-to-hub jumps are computed for the configured hubs."""
+        esd = static.EveStaticData()
+        esd.jump_graph = self.sut
+        esd.trade_hubs = [{'id': 60001}, {'id': 60006}, {'id': 60008}]
+        esd.station_systems = {60001: 1, 60006: 6, 60008: 8}
+        self.assertEqual(esd.trade_hub_jumps[60001],
+                         {60001: 0, 60006: 3, 60008: None})
+
+
+class TestEntityCache(unittest.TestCase):
+    """Exercises the bounded instance cache for static entities."""
+
+    class Entity(object):
+        pass
+
+    def test_lru(self):
+        """The least recently used instance is evicted when full."""
+        cache = static.EntityCache(maxsize=2)
+        cache[1], cache[2] = 'a', 'b'
+        cache[1]
+        cache[3] = 'c'
+        self.assertCountEqual(cache, [1, 3])
+        self.assertRaises(KeyError, cache.__getitem__, 2)
+        self.assertEqual(
+            cache.info(),
+            {'hits': 1, 'misses': 1, 'evictions': 1, 'size': 2,
+             'maxsize': 2}
+        )
+
+    @mock.patch.dict(static.config['StaticData'],
+                     {'entity cache size': '5'})
+    def test_maxsize__config(self):
+        """The default size limit is read from config."""
+        self.assertEqual(static.EntityCache().maxsize, 5)
+
+    def test_weak(self):
+        """Weak caches hold instances only while referenced."""
+        cache = static.EntityCache(weak=True)
+        entity = cache[1] = self.Entity()
+        cache[2] = self.Entity()
+        self.assertEqual(list(cache), [1])
+        self.assertIs(cache[1], entity)
+        self.assertRaises(ValueError, static.EntityCache, maxsize=1,
+                          weak=True)
+
+    def test_invalidate(self):
+        """Instances can be dropped singly or all at once."""
+        cache = static.EntityCache()
+        cache[1], cache[2], cache[3] = 'a', 'b', 'c'
+        cache.invalidate(1)
+        cache.invalidate(4)
+        self.assertCountEqual(cache, [2, 3])
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+    def test_refresh(self):
+        """Refreshing static data invalidates all entity caches."""
+        place.Station._cache[1] = trade.TradeItem._cache[2] = 'x'
+        esd = static.EveStaticData()
+        esd.market_types = {}
+        esd.refresh()
+        self.assertNotIn(1, place.Station._cache)
+        self.assertNotIn(2, trade.TradeItem._cache)
+        self.assertNotIn('_cached_market_types', vars(esd))
 
 # See test_place for test cases exercising the StaticEntity ABC via
 # concrete implementations.
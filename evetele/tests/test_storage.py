@@ -0,0 +1,222 @@
+import json
+import os
+import unittest
+
+import numpy as np
+
+from .. import storage, trade, util
+
+from . import DATA_DIR
+
+
+class StoreTestCase(unittest.TestCase):
+    """Common behaviour expected of every order store."""
+
+    REGION_ID = 10000042
+    T0 = util.parse_datetime('201807160000+0000')
+    T1 = util.parse_datetime('201807260000+0000')
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(DATA_DIR, 'esi_buy_order.json')) as f:
+            cls.buy_order = json.load(f)
+        with open(os.path.join(DATA_DIR, 'esi_sell_order.json')) as f:
+            cls.sell_order = json.load(f)
+
+    def _leaf(self, store, data):
+        return (store[self.REGION_ID][data['system_id']]
+                     [data['location_id']][data['type_id']])
+
+    def _check_update(self, store):
+        store.update(self.REGION_ID, [self.buy_order, self.sell_order],
+                     self.T0)
+
+        for data in (self.buy_order, self.sell_order):
+            orders = self._leaf(store, data)
+            self.assertEqual(len(orders), 1)
+            order = orders[0]
+            self.assertIsInstance(order, trade.MarketOrderSnapshot)
+            self.assertEqual(order.t, self.T0)
+            self.assertEqual(order.id, data['order_id'])
+            self.assertEqual(order['price'], data['price'])
+            self.assertEqual(order.is_buy_order, data['is_buy_order'])
+            self.assertEqual(order.issued,
+                             util.parse_datetime(data['issued']))
+            self.assertEqual(order['range'], data['range'])
+
+    def _check_replace(self, store):
+        store.update(self.REGION_ID, [self.buy_order, self.sell_order],
+                     self.T0)
+        store.update(self.REGION_ID, [self.buy_order], self.T1,
+                     type_id=self.buy_order['type_id'])
+
+        orders = self._leaf(store, self.buy_order)
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(orders[0].t, self.T1)
+        # Other types are untouched.
+        self.assertEqual(self._leaf(store, self.sell_order)[0].t,
+                         self.T0)
+
+    def _check_replace_region(self, store):
+        store.update(self.REGION_ID, [self.buy_order, self.sell_order],
+                     self.T0)
+        store.update(self.REGION_ID, [self.buy_order], self.T1)
+
+        self.assertEqual(len(self._leaf(store, self.buy_order)), 1)
+        self.assertEqual(self._leaf(store, self.sell_order), [])
+
+    def _check_update_failure(self, store):
+        store.update(self.REGION_ID, [self.buy_order, self.sell_order],
+                     self.T0)
+
+        def records():
+            yield self.buy_order
+            raise RuntimeError('ESI error')
+
+        for type_id in (None, self.buy_order['type_id']):
+            with self.assertRaises(RuntimeError):
+                store.update(self.REGION_ID, records(), self.T1,
+                             type_id=type_id)
+            for data in (self.buy_order, self.sell_order):
+                order, = self._leaf(store, data)
+                self.assertEqual(order.t, self.T0)
+            self.assertEqual(len(store.orders_by_id(self.REGION_ID)), 2)
+
+    def _check_orders_by_id(self, store):
+        store.update(self.REGION_ID, [self.buy_order, self.sell_order],
+                     self.T0)
+        orders = store.orders_by_id(self.REGION_ID)
+        self.assertCountEqual(
+            orders.keys(),
+            [self.buy_order['order_id'], self.sell_order['order_id']]
+        )
+        self.assertEqual(orders[self.buy_order['order_id']].t, self.T0)
+
+        by_type = store.orders_by_id(self.REGION_ID,
+                                     self.sell_order['type_id'])
+        self.assertEqual(list(by_type), [self.sell_order['order_id']])
+
+        # Unaffected by later updates.
+        store.update(self.REGION_ID, [], self.T1)
+        self.assertEqual(len(orders), 2)
+        self.assertEqual(len(store.orders_by_id(self.REGION_ID)), 0)
+
+
+class TestTreeOrderStore(StoreTestCase):
+    """The nested defaultdict layout originally used by Market."""
+
+    def test_update(self):
+        """Orders are filed under region/system/location/type."""
+        self._check_update(storage.TreeOrderStore())
+
+    def test_update__replaces_existing_orders(self):
+        """Orders of the updated type are replaced."""
+        self._check_replace(storage.TreeOrderStore())
+
+    def test_update__replaces_region(self):
+        """An update without a type replaces the whole region."""
+        self._check_replace_region(storage.TreeOrderStore())
+
+    def test_update__failure(self):
+        """A failure while reading records leaves the orders intact."""
+        self._check_update_failure(storage.TreeOrderStore())
+
+    def test_orders_by_id(self):
+        """Orders are indexed by order ID, optionally by type."""
+        self._check_orders_by_id(storage.TreeOrderStore())
+
+
+class TestTreeOrderStoreCompact(StoreTestCase):
+    """The tree layout holding slotted compact orders."""
+
+    def _store(self):
+        return storage.TreeOrderStore(
+            order_class=trade.CompactMarketOrderSnapshot
+        )
+
+    def test_update(self):
+        """Orders are filed under region/system/location/type."""
+        store = self._store()
+        store.update(self.REGION_ID, [self.buy_order, self.sell_order],
+                     self.T0)
+        for data in (self.buy_order, self.sell_order):
+            order, = self._leaf(store, data)
+            self.assertIsInstance(order,
+                                  trade.CompactMarketOrderSnapshot)
+            self.assertEqual(order.t, self.T0)
+            self.assertEqual(order.id, data['order_id'])
+            self.assertEqual(order['price'], data['price'])
+            self.assertEqual(order.issued,
+                             util.parse_datetime(data['issued']))
+
+    def test_orders_by_id(self):
+        """Orders are indexed by order ID, optionally by type."""
+        self._check_orders_by_id(self._store())
+
+
+class TestColumnarOrderStore(StoreTestCase):
+    """The NumPy array-backed layout.
+
+    Leaves are materialised as `MarketOrderSnapshot` lists on access
+    so consumers of the tree layout work unchanged.
+    """
+
+    def test_update(self):
+        """Orders are filed under region/system/location/type."""
+        self._check_update(storage.ColumnarOrderStore())
+
+    def test_update__replaces_existing_orders(self):
+        """Orders of the updated type are replaced."""
+        self._check_replace(storage.ColumnarOrderStore())
+
+    def test_update__replaces_region(self):
+        """An update without a type replaces the whole region."""
+        self._check_replace_region(storage.ColumnarOrderStore())
+
+    def test_update__failure(self):
+        """A failure while reading records leaves the orders intact."""
+        self._check_update_failure(storage.ColumnarOrderStore())
+
+    def test_orders_by_id(self):
+        """Orders are indexed by order ID, optionally by type."""
+        self._check_orders_by_id(storage.ColumnarOrderStore())
+
+    def test_missing_keys(self):
+        """Unknown keys resolve to empty nodes without raising."""
+        store = storage.ColumnarOrderStore()
+        self.assertEqual(len(store[1][2]), 0)
+        self.assertEqual(store[1][2][3][4], [])
+
+    def test_mapping_interface(self):
+        """Nodes iterate over the keys present at their level."""
+        store = storage.ColumnarOrderStore()
+        store.update(self.REGION_ID, [self.buy_order, self.sell_order],
+                     self.T0)
+        region = store[self.REGION_ID]
+        self.assertCountEqual(
+            region.keys(),
+            [self.buy_order['system_id'], self.sell_order['system_id']]
+        )
+        system = region[self.sell_order['system_id']]
+        self.assertEqual(list(system),
+                         [self.sell_order['location_id']])
+
+    def test_columns(self):
+        """Column arrays are exposed per region for vectorised use."""
+        store = storage.ColumnarOrderStore()
+        store.update(self.REGION_ID, [self.buy_order, self.sell_order],
+                     self.T0)
+        columns = store.columns(self.REGION_ID)
+        self.assertEqual(len(store), 2)
+        self.assertCountEqual(
+            columns['order_id'].tolist(),
+            [self.buy_order['order_id'], self.sell_order['order_id']]
+        )
+        self.assertEqual(columns['is_buy_order'].dtype, np.bool_)
+        self.assertEqual(columns['price'].sum(),
+                         self.buy_order['price']
+                         + self.sell_order['price'])
+
+
+if __name__ == '__main__':
+    unittest.main()
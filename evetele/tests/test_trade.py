@@ -3,6 +3,7 @@ import functools
 import json
 import logging
 import os
+import pickle
 import unittest
 from unittest import mock
 
@@ -11,6 +12,7 @@ import pyswagger
 
 from .. import place, static, trade
 from ..trade import (SimpleMarketOrder, MarketOrderSnapshot,
+                     CompactMarketOrder, CompactMarketOrderSnapshot,
                      VersionedMarketOrder, TradeItem)
 from ..util import parse_datetime, tdelta
 
@@ -288,6 +290,63 @@ class TestMarketOrderSnapshot(unittest.TestCase):
             self.assertEqual(sut.t, expected_t)
 
 
+class TestCompactMarketOrder(unittest.TestCase):
+    """Exercises the slotted market order type.
+
+    It should behave like a SimpleMarketOrder built from the same
+    data, without a per-instance dictionary.
+    """
+
+    def setUp(self):
+        with open(os.path.join(DATA_DIR, 'esi_sell_order.json')) as f:
+            self.data = json.load(f)
+        self.sut = CompactMarketOrder(self.data)
+        self.reference = SimpleMarketOrder(self.data)
+
+    def test_slots(self):
+        """Instances carry no __dict__."""
+        self.assertFalse(hasattr(self.sut, '__dict__'))
+        sut = CompactMarketOrderSnapshot(self.data,
+                                         parse_datetime('20180705'))
+        self.assertFalse(hasattr(sut, '__dict__'))
+
+    def test_properties(self):
+        """Properties match those of a SimpleMarketOrder."""
+        for name in ('id', 'order_id', 'duration', 'issued', 'expiry',
+                     'is_buy_order'):
+            self.assertEqual(getattr(self.sut, name),
+                             getattr(self.reference, name), name)
+
+    def test___getitem__(self):
+        """Fields are available as items, as supplied."""
+        for name in CompactMarketOrder.FIELDS:
+            self.assertEqual(self.sut[name], self.data[name], name)
+        self.assertRaises(KeyError, self.sut.__getitem__, 'fish')
+
+    def test_data(self):
+        """The data dict is rebuilt from the supported fields."""
+        self.assertEqual(self.sut.data, self.data)
+
+    @mock.patch.object(trade, 'TradeItem')
+    @mock.patch.object(place, 'Station')
+    def test_location_item(self, mock_station, mock_item):
+        """Related entities are looked up by ID."""
+        self.assertIs(self.sut.location, mock_station.return_value)
+        mock_station.assert_called_once_with(self.data['location_id'])
+        self.assertIs(self.sut.item, mock_item.return_value)
+        mock_item.assert_called_once_with(self.data['type_id'])
+
+    def test_versioned(self):
+        """Compact orders can be versions of a VersionedMarketOrder."""
+        t0 = parse_datetime('20180705204200+0000')
+        t1 = parse_datetime('20180705214200+0000')
+        order = VersionedMarketOrder(self.sut, t0)
+        order.add(CompactMarketOrderSnapshot(self.data, t1))
+        self.assertIsInstance(order.latest, CompactMarketOrderSnapshot)
+        self.assertEqual(order.t, t1)
+        self.assertEqual(order['price'], self.data['price'])
+
+
 @ddt.ddt
 class TestVersionedMarketOrder(unittest.TestCase):
     """Exercises the market order extension with historical snapshots.
@@ -333,6 +392,77 @@ class TestVersionedMarketOrder(unittest.TestCase):
         """
         self.assertEqual(self.sut.t, self.ts[0])
 
+    def test_latest__unordered(self):
+        """The latest snapshot is tracked as snapshots are added.
+
+        Snapshots may arrive out of order and a snapshot with an
+        existing timestamp replaces the previous one.
+        """
+        sut = VersionedMarketOrder()
+        self.assertEqual(len(sut.snapshots), 0)
+        for snapshot in self.snapshots:
+            sut.snapshots[snapshot.t.isoformat()] = snapshot
+        self.assertIs(sut.latest, self.snapshots[0])
+        self.assertEqual(sut.snapshots.ordered(),
+                         [self.snapshots[i] for i in (1, 2, 0)])
+
+        replacement = mock.Mock(spec=MarketOrderSnapshot, t=self.ts[0])
+        sut.snapshots[self.ts[0].isoformat()] = replacement
+        self.assertIs(sut.latest, replacement)
+        del sut.snapshots[self.ts[0].isoformat()]
+        self.assertIs(sut.latest, self.snapshots[2])
+
+    def test___init__(self):
+        """The first version can be supplied on init."""
+        sut = VersionedMarketOrder({'order_id': 1234}, self.ts[0])
+        self.assertEqual(sut.order_id, 1234)
+        self.assertEqual(sut.t, self.ts[0])
+
+    def test_snapshots__setter(self):
+        """A plain dict assigned to snapshots is kept in time order."""
+        sut = VersionedMarketOrder()
+        sut.snapshots = {s.t.isoformat(): s for s in self.snapshots}
+        self.assertIs(sut.latest, self.snapshots[0])
+
+    def test_pickle(self):
+        """Histories survive pickling, e.g. from worker processes."""
+        sut = VersionedMarketOrder.from_snapshots([
+            MarketOrderSnapshot({'order_id': 1234, 'price': price}, t)
+            for price, t in zip((3.0, 1.0, 2.0), self.ts)
+        ])
+        restored = pickle.loads(pickle.dumps(sut))
+        self.assertEqual(
+            [snapshot['price'] for snapshot in restored.snapshots.ordered()],
+            [1.0, 2.0, 3.0]
+        )
+        self.assertEqual(list(restored.snapshots), list(sut.snapshots))
+        self.assertIs(restored.latest, restored.snapshots.latest)
+        self.assertEqual(restored['price'], 3.0)
+
+    @ddt.data(
+        ('20180705204100+0000', None),
+        ('20180705204200+0000', 1),
+        ('20180705215100+0000', 2),
+        ('20180705225200+0000', 0),
+    )
+    @ddt.unpack
+    def test_at(self, timestamp, expected):
+        """The version current at a time is the last one before it."""
+        expected = None if expected is None else self.snapshots[expected]
+        self.assertIs(self.sut.at(parse_datetime(timestamp)), expected)
+
+    def test_between(self):
+        """Versions in a time window are returned in time order."""
+        self.assertEqual(
+            self.sut.between(self.ts[1], self.ts[0]),
+            [self.snapshots[i] for i in (1, 2, 0)]
+        )
+        self.assertEqual(
+            self.sut.between(parse_datetime('20180705210000+0000'),
+                             parse_datetime('20180705215100+0000')),
+            [self.snapshots[2]]
+        )
+
     @mock_property(VersionedMarketOrder, 'order_id')
     def test_add__dissimilar(self, stub_order_id):
         """Adding a snapshot is only possible for the same order ID.
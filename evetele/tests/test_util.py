@@ -1,8 +1,11 @@
 import datetime
+import time
 import unittest
 from unittest import mock
 
 import ddt
+from dateutil import parser
+import numpy as np
 import pytz
 
 from .. import util
@@ -31,6 +34,27 @@ class TestCachedProperty(unittest.TestCase):
         mock_object.method.assert_called_once_with(fish='haddock')
 
 
+class TestLRUCache(unittest.TestCase):
+
+    def test_eviction(self):
+        """The least recently used item is evicted when full."""
+        cache = util.LRUCache(maxsize=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache['a']             # 'b' is now least recently used
+        cache['c'] = 3
+
+        self.assertCountEqual(cache.keys(), ['a', 'c'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_unbounded(self):
+        """A maxsize of None never evicts."""
+        cache = util.LRUCache(maxsize=None)
+        for i in range(1000):
+            cache[i] = i
+        self.assertEqual(len(cache), 1000)
+
+
 @ddt.ddt
 class TestFunctions(unittest.TestCase):
 
@@ -86,6 +110,115 @@ class TestFunctions(unittest.TestCase):
         """
         self.assertEqual(util.parse_epoch_timestamp(inp), expected)
 
+    @ddt.data(
+        '2018-06-21T19:59:50Z',
+        '2018-06-29 18:22:34.000',
+        '2018-06-29 18:22:34.000Z',
+        '2018-06-29T18:22:34.5+01:00',
+        '2018-06-29T18:22:34-0530',
+        '2018-06-29',
+        '20180702T182837+0000',
+        'Jul 2 2018 18:28:37 UTC',
+    )
+    def test_parse_datetime__matches_dateutil(self, inp):
+        """Known shapes parse as dateutil does; others use dateutil.
+
+        Naive strings are in local time, as for dateutil's naive
+        results.
+        """
+        dt = parser.parse(inp)
+        self.assertEqual(util.parse_datetime(inp),
+                         dt.astimezone(pytz.utc))
+        # Dates of naive strings are taken as UTC.
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=pytz.utc)
+        self.assertEqual(util.parse_date(inp),
+                         dt.astimezone(pytz.utc).date())
+
+    def test_parse_datetime__unknown(self):
+        """Unparseable strings raise as before."""
+        with self.assertRaises(ValueError):
+            util.parse_datetime('not a time')
+
+    def test_parse_datetime_array(self):
+        """Columns of strings convert to naive UTC datetime64."""
+        expected = np.array(['2018-06-21T19:59:50', '2018-06-29T18:22:34'],
+                            dtype='datetime64[s]')
+        actual = util.parse_datetime_array(
+            ['2018-06-21T19:59:50Z', '2018-06-29 18:22:34.000']
+        )
+        np.testing.assert_array_equal(actual, expected)
+        self.assertEqual(actual.dtype, np.dtype('datetime64[s]'))
+
+    def test_parse_datetime_array__fallback(self):
+        """Offsets and other values are converted one by one."""
+        actual = util.parse_datetime_array(
+            ['2018-06-21T20:59:50+01:00',
+             datetime.datetime(2018, 6, 29, 18, 22, 34, 500000,
+                               tzinfo=pytz.utc),
+             '20180629T182234'],
+            unit='ms'
+        )
+        np.testing.assert_array_equal(
+            actual,
+            np.array(['2018-06-21T19:59:50', '2018-06-29T18:22:34.5',
+                      '2018-06-29T18:22:34'], dtype='datetime64[ms]')
+        )
+
+
+class TestParseDatetimeBenchmark(unittest.TestCase):
+    """Micro-benchmarks of the date/time parsing fast paths.
+
+    Each compares a fast path with dateutil over the same strings,
+    and checks it is at least twice as fast. Distinct strings are
+    used so that the cache is not hit unless intended.
+    """
+
+    N = 2000
+
+    @classmethod
+    def setUpClass(cls):
+        start = datetime.datetime(2018, 6, 21)
+        cls.strings = [
+            (start + datetime.timedelta(seconds=i * 37)).strftime(
+                '%Y-%m-%dT%H:%M:%SZ'
+            )
+            for i in range(cls.N)
+        ]
+
+    @staticmethod
+    def _time(function, *args):
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+
+    def _dateutil(self):
+        for string in self.strings:
+            parser.parse(string).astimezone(pytz.utc)
+
+    def test_parse_datetime(self):
+        """Known shapes are parsed faster than by dateutil."""
+        util._parse_datetime_string.cache_clear()
+        fast = self._time(lambda: [util.parse_datetime(string)
+                                   for string in self.strings])
+        slow = self._time(self._dateutil)
+        self.assertLess(fast * 2, slow)
+
+    def test_parse_datetime__cached(self):
+        """Repeated strings are served from the cache."""
+        util._parse_datetime_string.cache_clear()
+        strings = self.strings[:100] * (self.N // 100)
+        fast = self._time(lambda: [util.parse_datetime(string)
+                                   for string in strings])
+        info = util._parse_datetime_string.cache_info()
+        self.assertEqual(info.misses, 100)
+        self.assertLess(fast * 2, self._time(self._dateutil))
+
+    def test_parse_datetime_array(self):
+        """Whole columns are converted faster than by dateutil."""
+        fast = self._time(util.parse_datetime_array, self.strings)
+        self.assertLess(fast * 2, self._time(self._dateutil))
+
 
 if __name__ == '__main__':
     unittest.main()
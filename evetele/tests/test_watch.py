@@ -0,0 +1,207 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pytz
+
+from .. import watch
+
+from . import DATA_DIR
+
+
+class TestMarketLogWatcher(unittest.TestCase):
+    """Exercises the Marketlogs watcher in polling mode.
+
+    Exports are written to a temporary folder and ingested into a
+    mock market.
+    """
+
+    NAME = 'The Forge-Tritanium-2018.07.05 180744.txt'
+    T = datetime.datetime(2018, 7, 5, 18, 7, 44, tzinfo=pytz.utc)
+
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(DATA_DIR, 'My Orders-2018.07.05 1807.txt')
+        with open(path, 'rb') as f:
+            cls.content = f.read()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, self.NAME)
+        self.index_path = os.path.join(self.directory, 'index.json')
+        self.market = mock.Mock()
+        self.sut = self._watcher()
+
+    def _watcher(self, **kwargs):
+        kwargs.setdefault('settle', 0)
+        return watch.MarketLogWatcher(
+            self.market, self.directory,
+            index=watch.ExportIndex(self.index_path),
+            use_inotify=False, **kwargs
+        )
+
+    def _write(self, content, mode='wb'):
+        with open(self.path, mode) as f:
+            f.write(content)
+
+    def test_scan(self):
+        """Exports are ingested with the time in their file name."""
+        self._write(self.content)
+        self.assertEqual(self.sut.scan(), 1)
+
+        (region_id, records, t, type_id), __ = self.market.ingest.call_args
+        self.assertEqual(region_id, 10000002)
+        self.assertEqual(t, self.T)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['order_id'], 1234567890)
+        self.assertEqual(records[0]['range'], 'station')
+        self.assertEqual(records[1]['range'], 'region')
+        self.assertEqual(records[0]['issued'], '2018-06-29T18:22:34Z')
+        self.assertEqual(self.sut.stats['orders'], 2)
+
+    def test_scan__mtime(self):
+        """Without a valid time in its name, the file's mtime is used."""
+        self.path = os.path.join(self.directory,
+                                 'The Forge-Tritanium-2018.13.45 1807.txt')
+        self._write(self.content)
+        os.utime(self.path, (1531000000, 1531000000))
+        self.assertEqual(self.sut.scan(), 1)
+        (__, __, t, __), __ = self.market.ingest.call_args
+        self.assertEqual(
+            t, datetime.datetime.fromtimestamp(1531000000, pytz.utc)
+        )
+
+    def test_scan__ignores_other_files(self):
+        """Personal order exports and other files are ignored."""
+        for name in ('My Orders-2018.07.05 1807.txt', 'notes.txt'):
+            with open(os.path.join(self.directory, name), 'wb') as f:
+                f.write(self.content)
+        self.assertEqual(self.sut.scan(), 0)
+        self.assertFalse(self.market.ingest.called)
+
+    def test_scan__incremental(self):
+        """Exports are parsed as written, and ingested when settled."""
+        sut = self._watcher(settle=3600)
+        head, sep, rest = self.content.partition(b'Caldari')
+        self._write(head)
+        sut.scan()
+        tail, = sut._tails.values()
+        self.assertEqual(len(tail.records), 0)
+
+        # The last line is held until complete.
+        self._write(sep + rest.rstrip(b'\r\n'), 'ab')
+        sut.scan()
+        self.assertFalse(self.market.ingest.called)
+        self.assertEqual(len(tail.records), 1)
+
+        sut.settle = 0
+        sut.scan()
+        (__, records, __, __), __ = self.market.ingest.call_args
+        self.assertEqual(len(records), 2)
+
+    def test_scan__skips_ingested(self):
+        """Ingested exports are not parsed again, even on restart."""
+        self._write(self.content)
+        self.sut.scan()
+        self.sut.scan()
+        self._watcher().scan()
+        self.assertEqual(self.market.ingest.call_count, 1)
+
+        # A touched file is recognised by its fingerprint.
+        os.utime(self.path, ns=(0, 0))
+        self._watcher().scan()
+        self.assertEqual(self.market.ingest.call_count, 1)
+
+        # A rewritten file is ingested again.
+        self._write(self.content.replace(b'596.59', b'596.60'))
+        self._watcher().scan()
+        self.assertEqual(self.market.ingest.call_count, 2)
+
+    def test_scan__backlog(self):
+        """Exports older than the settle period are ingested at once.
+
+        They aren't held in memory, and the index is saved once per
+        scan.
+        """
+        sut = self._watcher(settle=3600)
+        for hour in range(5):
+            self.path = os.path.join(
+                self.directory,
+                'The Forge-Tritanium-2018.07.05 {:02d}0744.txt'.format(
+                    hour)
+            )
+            self._write(self.content)
+            os.utime(self.path, (1531000000, 1531000000))
+
+        with mock.patch.object(sut.index, 'save',
+                               wraps=sut.index.save) as stub_save:
+            self.assertEqual(sut.scan(), 5)
+            sut.scan()
+        self.assertEqual(sut._tails, {})
+        self.assertEqual(self.market.ingest.call_count, 5)
+        stub_save.assert_called_once_with()
+        self.assertEqual(len(watch.ExportIndex(self.index_path)), 5)
+
+    def test_scan__malformed(self):
+        """Exports with rows that can't be parsed are not ingested.
+
+        They are skipped until they change.
+        """
+        sut = self._watcher(settle=3600)
+        self._write(self.content + b'123,34\n')
+        with self.assertLogs(sut._log, 'WARNING'):
+            sut.scan()
+        tail, = sut._tails.values()
+        self.assertEqual((tail.offset, tail.records), (0, []))
+
+        sut.settle = 0
+        with mock.patch.object(tail, 'read') as stub_read:
+            sut.scan()
+        self.assertFalse(stub_read.called)
+        self.assertFalse(self.market.ingest.called)
+        self.assertEqual(sut._tails, {})
+        sut.scan()
+        self.assertFalse(self.market.ingest.called)
+
+        self._write(self.content)
+        sut.scan()
+        (__, records, __, __), __ = self.market.ingest.call_args
+        self.assertEqual(len(records), 2)
+
+    def test_scan__malformed_last_line(self):
+        """A malformed line at the end of an export isn't ingested."""
+        self._write(self.content + b'123,34')
+        with self.assertLogs(self.sut._log, 'WARNING'):
+            self.sut.scan()
+        self.assertFalse(self.market.ingest.called)
+
+    def test_scan__empty_export(self):
+        """Empty exports are identified by region and item name."""
+        self.path = os.path.join(
+            self.directory, 'Tash-Murkon-Mega Pulse Laser II'
+            '-2018.07.05 180744.txt'
+        )
+        self._write(self.content.split(b'\n')[0] + b'\n')
+        esd = mock.Mock()
+
+        def get_id(entity, name):
+            ids = {('region', 'Tash-Murkon'): 10000020,
+                   ('market_type', 'Mega Pulse Laser II'): 3057}
+            try:
+                return ids[entity, name]
+            except KeyError:
+                raise ValueError(name)
+
+        esd.get_id.side_effect = get_id
+        self.sut._esd = esd
+        self.sut.scan()
+        self.market.ingest.assert_called_once_with(10000020, [], self.T,
+                                                   3057)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import bisect
 import json
 
 import pyswagger
@@ -6,6 +7,22 @@ from . import util, place, static
 from . import LoggingObject
 
 
+def parse_issued(timestamp):
+    """Normalise an order's 'issued' field to a UTC datetime.
+
+    Depending on the source, the field may be an ISO 8601 string
+    (ESI JSON, client logs), a pyswagger `Datetime` primitive (parsed
+    ESI data) or a UNIX timestamp (EveKit).
+    """
+    if isinstance(timestamp, pyswagger.primitives.Datetime):
+        return timestamp.v
+    else:
+        try:
+            return util.parse_epoch_timestamp(timestamp)
+        except ValueError:
+            return util.parse_datetime(timestamp)
+
+
 class SimpleMarketOrder(LoggingObject):
 
     def __init__(self, data):
@@ -79,14 +96,7 @@ class SimpleMarketOrder(LoggingObject):
     @util.cached_property
     def issued(self):
         """Issue date of market order (in UTC)."""
-        timestamp = self.data['issued']
-        if isinstance(timestamp, pyswagger.primitives.Datetime):
-            return timestamp.v
-        else:
-            try:
-                return util.parse_epoch_timestamp(timestamp)
-            except ValueError:
-                return util.parse_datetime(timestamp)
+        return parse_issued(self.data['issued'])
 
     @property
     def item(self):
@@ -134,6 +144,242 @@ class MarketOrderSnapshot(SimpleMarketOrder):
         return self._t
 
 
+class CompactMarketOrder(object):
+    """A market order held in slots rather than a data dictionary.
+
+    Offers the read-only API of `SimpleMarketOrder` (`id`, `issued`,
+    `expiry`, `is_buy_order`, `location`, `item`, ...) and item access
+    to the fields in `FIELDS`, in a fraction of the memory. The source
+    record is not retained: fields other than those in `FIELDS` are
+    dropped, and `data` is a dictionary built on access.
+    """
+
+    FIELDS = (
+        'order_id', 'type_id', 'location_id', 'system_id', 'price',
+        'volume_remain', 'volume_total', 'min_volume', 'duration',
+        'issued', 'is_buy_order', 'range',
+    )
+
+    # 'issued' is held as supplied in _issued and parsed on access.
+    __slots__ = (
+        'order_id', 'type_id', 'location_id', 'system_id', 'price',
+        'volume_remain', 'volume_total', 'min_volume', 'duration',
+        '_issued', 'is_buy_order', 'range', '_issued_dt',
+    )
+
+    def __init__(self, data):
+        """
+        Parameters
+        ----------
+
+        data : dict-like or CompactMarketOrder
+            Market order data, e.g. an ESI record (see
+            SimpleMarketOrder).
+        """
+        if isinstance(data, (CompactMarketOrder, SimpleMarketOrder)):
+            data = data.data
+        get = data.get
+        self.order_id = data['order_id']
+        self.type_id = get('type_id')
+        self.location_id = get('location_id')
+        self.system_id = get('system_id')
+        self.price = get('price')
+        self.volume_remain = get('volume_remain')
+        self.volume_total = get('volume_total')
+        self.min_volume = get('min_volume')
+        self.duration = get('duration')
+        self._issued = get('issued')
+        self.is_buy_order = get('is_buy_order', False)
+        self.range = get('range')
+
+    def __getitem__(self, key):
+        if key == 'issued':
+            return self._issued
+        elif key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self.order_id)
+
+    @property
+    def data(self):
+        """Data dictionary for the market order (a new copy)."""
+        return {name: self[name] for name in self.FIELDS}
+
+    @property
+    def id(self):
+        """Order ID."""
+        return self.order_id
+
+    @property
+    def location(self):
+        """Location of market order (the station it was issued in)."""
+        return place.Station(self.location_id)
+
+    @property
+    def expiry(self):
+        """Expiry date and time of market order (in UTC)."""
+        return self.issued + util.tdelta(days=self.duration)
+
+    @property
+    def issued(self):
+        """Issue date of market order (in UTC)."""
+        try:
+            return self._issued_dt
+        except AttributeError:
+            self._issued_dt = parse_issued(self._issued)
+            return self._issued_dt
+
+    @property
+    def item(self):
+        """Trade item the market order is for."""
+        return TradeItem(self.type_id)
+
+    @property
+    def json(self):
+        """Serialised JSON string for the market order."""
+        return json.dumps(self.data)
+
+
+class CompactMarketOrderSnapshot(CompactMarketOrder):
+    """A `CompactMarketOrder` with a timestamp.
+
+    A drop-in replacement for `MarketOrderSnapshot` where memory
+    matters, e.g. as the `order_class` of `storage.TreeOrderStore`.
+    """
+
+    __slots__ = ('t',)
+
+    def __init__(self, obj, t):
+        """
+        Parameters
+        ----------
+
+        obj : dict-like, SimpleMarketOrder or CompactMarketOrder
+            Market order data.
+
+        t : datetime.datetime
+            Timestamp for the snapshot.
+        """
+        super().__init__(obj)
+        self.t = t
+
+
+class SnapshotTimeline(dict):
+    """Snapshots of a market order, keyed by ISO 8601 timestamp.
+
+    A dictionary which also keeps its snapshots in time order, so the
+    latest snapshot is found in constant time and snapshots at or
+    between given times by bisection. Adding snapshots in time order
+    (the usual case) is an append.
+    """
+
+    def __init__(self, snapshots=()):
+        super().__init__()
+        self._times = []
+        self._orders = []
+        for snapshot in snapshots:
+            self[snapshot.t.isoformat()] = snapshot
+
+    def __reduce__(self):
+        # Pickle the time order with the items: unpickling a dict
+        # subclass sets its items before any instance state.
+        return (_restore_timeline,
+                (type(self), dict(self), self._times, self._orders))
+
+    def __setitem__(self, key, snapshot):
+        if key in self:
+            self._remove(key)
+        super().__setitem__(key, snapshot)
+        t = snapshot.t
+        if not self._times or t >= self._times[-1]:
+            self._times.append(t)
+            self._orders.append(snapshot)
+        else:
+            i = bisect.bisect_right(self._times, t)
+            self._times.insert(i, t)
+            self._orders.insert(i, snapshot)
+
+    def __delitem__(self, key):
+        self._remove(key)
+        super().__delitem__(key)
+
+    def _remove(self, key):
+        # Drop the time-ordered entry for an existing key.
+        snapshot = self[key]
+        i = bisect.bisect_left(self._times, snapshot.t)
+        while self._orders[i] is not snapshot:
+            i += 1
+        del self._times[i]
+        del self._orders[i]
+
+    def clear(self):
+        super().clear()
+        self._times.clear()
+        self._orders.clear()
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        snapshot = self[key]
+        del self[key]
+        return snapshot
+
+    def popitem(self):
+        key, snapshot = next(reversed(self.items()))
+        del self[key]
+        return key, snapshot
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, snapshot in dict(*args, **kwargs).items():
+            self[key] = snapshot
+
+    @property
+    def latest(self):
+        """The snapshot with the latest timestamp.
+
+        Raises
+        ------
+
+        IndexError
+            If there are no snapshots.
+        """
+        return self._orders[-1]
+
+    def ordered(self):
+        """List of the snapshots in time order."""
+        return list(self._orders)
+
+    def at(self, t):
+        """The snapshot current at time `t`, or None if none was.
+
+        That is, the latest snapshot taken at or before `t`.
+        """
+        i = bisect.bisect_right(self._times, t)
+        return self._orders[i - 1] if i else None
+
+    def between(self, t0, t1):
+        """List of the snapshots taken from `t0` to `t1` inclusive."""
+        i = bisect.bisect_left(self._times, t0)
+        j = bisect.bisect_right(self._times, t1)
+        return self._orders[i:j]
+
+
+def _restore_timeline(cls, items, times, orders):
+    # Unpickle a SnapshotTimeline without re-sorting its snapshots.
+    inst = cls.__new__(cls)
+    dict.update(inst, items)
+    inst._times = times
+    inst._orders = orders
+    return inst
+
+
 class VersionedMarketOrder(MarketOrderSnapshot):
     """An extended market order model with a version history."""
 
@@ -144,6 +390,7 @@ class VersionedMarketOrder(MarketOrderSnapshot):
         with the addition of omitting both parameters or specifying
         them as null (in which case no snapshots will be present yet).
         """
+        self._snapshots = SnapshotTimeline()
         if any([obj, t]):
             self.add(obj, t)
 
@@ -152,11 +399,27 @@ class VersionedMarketOrder(MarketOrderSnapshot):
         """Build a VersionedMarketOrder from a sequence of snapshots.
         """
         assert len(set(order.order_id for order in snapshots)) == 1
-        snapshot_dict = {o.t.isoformat(): o for o in snapshots}
         inst = cls()
-        inst.snapshots = snapshot_dict
+        inst.snapshots = SnapshotTimeline(snapshots)
         return inst
 
+    @property
+    def snapshots(self):
+        """Snapshots/versions of this order keyed by ISO timestamp.
+
+        See `SnapshotTimeline`; a plain dict assigned to this property
+        is converted to one.
+        """
+        return self._snapshots
+
+    @snapshots.setter
+    def snapshots(self, snapshots):
+        if not isinstance(snapshots, SnapshotTimeline):
+            timeline = SnapshotTimeline()
+            timeline.update(snapshots)
+            snapshots = timeline
+        self._snapshots = snapshots
+
     @property
     def data(self):
         """The data dict of the latest snapshot/version of this order.
@@ -166,7 +429,7 @@ class VersionedMarketOrder(MarketOrderSnapshot):
     @property
     def latest(self):
         """The latest snapshot/version of this market order."""
-        return sorted(self.snapshots.items())[-1][1]
+        return self._snapshots.latest
 
     @property
     def t(self):
@@ -174,9 +437,18 @@ class VersionedMarketOrder(MarketOrderSnapshot):
         """
         return self.latest.t
 
+    def at(self, t):
+        """The snapshot/version current at time `t` (or None)."""
+        return self._snapshots.at(t)
+
+    def between(self, t0, t1):
+        """List of the snapshots/versions from `t0` to `t1` inclusive.
+        """
+        return self._snapshots.between(t0, t1)
+
     def _validate_order_id(self, other):
         # Check that the order ID of other is consistent with self.
-        if other.order_id != self.order_id:
+        if self.snapshots and other.order_id != self.order_id:
             raise ValueError(
                 "Order ID of {} is not consistent with this "
                 "order ID ({})".format(other, self.order_id)
@@ -188,14 +460,15 @@ class VersionedMarketOrder(MarketOrderSnapshot):
         Parameters
         ----------
 
-        obj : SimpleMarketOrder or dict
+        obj : SimpleMarketOrder, CompactMarketOrder or dict
             Order data, or simpler representation.
 
         t : datetime.datetime
             Timestamp (if obj is MarketOrderSnapshot it will have one
             already, and if this is provided it must be consistent).
         """
-        if isinstance(obj, MarketOrderSnapshot):
+        if isinstance(obj, (MarketOrderSnapshot,
+                            CompactMarketOrderSnapshot)):
             snapshot = obj
             if t is not None and obj.t != t:
                 raise ValueError("t provided but different to "
@@ -208,6 +481,12 @@ class VersionedMarketOrder(MarketOrderSnapshot):
                                 "MarketOrderSnapshot isn't provided.")
             snapshot = MarketOrderSnapshot(obj, t)
 
+        elif isinstance(obj, CompactMarketOrder):
+            if t is None:
+                raise TypeError("t must be specified if a "
+                                "MarketOrderSnapshot isn't provided.")
+            snapshot = CompactMarketOrderSnapshot(obj, t)
+
         else:
             raise TypeError("Unsupported parameter types.")
         self._validate_order_id(snapshot)
@@ -218,9 +497,8 @@ class TradeItem(static.StaticEntity):
     """Simple representation of a tradeable item type."""
 
     _entity_name = 'market_type'
-    _id_field = 'typeID'
     _name_field = 'typeName'
     _table = 'invTypes'
-    _cache = {}
+    _cache = static.EntityCache()
 
 
@@ -1,4 +1,5 @@
 import collections
+import collections.abc
 import datetime
 import functools
 import logging
@@ -7,6 +8,7 @@ import sys
 
 from dateutil import parser
 from dateutil.relativedelta import relativedelta as tdelta
+import numpy as np
 import pytz
 
 log = logging.getLogger(__name__)
@@ -36,6 +38,41 @@ class cached_property(object):
         setattr(obj, self.iname, value)
 
 
+class LRUCache(collections.abc.MutableMapping):
+    """Dictionary holding at most `maxsize` items.
+
+    Reading or writing an item marks it as most recently used; when
+    the cache is full, the least recently used item is evicted to
+    make room for a new one.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._data = collections.OrderedDict()
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while self.maxsize is not None and len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
 class ClassPropertyDescriptor(object):
     # https://stackoverflow.com/a/5191224/8992969
 
@@ -66,6 +103,67 @@ def get_utc_datetime():
     return datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
 
 
+# The ISO 8601 shapes used by ESI ('2018-06-21T19:59:50Z') and the
+# client's exports ('2018-06-29 18:22:34.000'), parsed without
+# dateutil.
+_ISO_PATTERN = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?)?'
+    r'(Z|[+-]\d{2}:?\d{2})?$'
+)
+
+# A newline-terminated column of strings in the shapes `_ISO_PATTERN`
+# accepts without an offset, or with a 'Z' offset.
+_ISO_COLUMN_PATTERN = re.compile(
+    r'(?:\d{4}-\d{2}-\d{2}'
+    r'(?:[T ]\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?)?Z?\n)*'
+)
+
+_DATETIME_CACHE_SIZE = 4096
+
+
+def _parse_iso(string):
+    # Parse a string of a known shape, or return None. The result is
+    # naive if the string has no UTC offset.
+    match = _ISO_PATTERN.match(string)
+    if match is None:
+        return None
+    (year, month, day, hour, minute, second, fraction,
+     offset) = match.groups()
+    if offset is None:
+        tzinfo = None
+    elif offset == 'Z':
+        tzinfo = pytz.utc
+    else:
+        minutes = int(offset[1:3]) * 60 + int(offset[-2:])
+        tzinfo = datetime.timezone(datetime.timedelta(
+            minutes=-minutes if offset[0] == '-' else minutes
+        ))
+    return datetime.datetime(
+        int(year), int(month), int(day),
+        int(hour or 0), int(minute or 0), int(second or 0),
+        int(fraction.ljust(6, '0')) if fraction else 0,
+        tzinfo=tzinfo
+    )
+
+
+@functools.lru_cache(maxsize=_DATETIME_CACHE_SIZE)
+def _parse_datetime_string(string):
+    dt = _parse_iso(string)
+    if dt is None:
+        dt = parser.parse(string)
+    return dt.astimezone(pytz.utc)
+
+
+@functools.lru_cache(maxsize=_DATETIME_CACHE_SIZE)
+def _parse_date_string(string):
+    dt = _parse_iso(string)
+    if dt is None:
+        dt = parser.parse(string)
+    dt = dt.replace(tzinfo=dt.tzinfo or pytz.utc) # UTC if naive
+    return dt.astimezone(pytz.utc).date()
+
+
 def parse_date(obj):
     """Convert a date-like object into a Python date object.
 
@@ -91,9 +189,7 @@ def parse_date(obj):
         # no-op
         return obj
     elif isinstance(obj, str):
-        dt = parser.parse(obj)
-        dt = dt.replace(tzinfo=dt.tzinfo or pytz.utc) # UTC if naive
-        return dt.astimezone(pytz.utc).date()
+        return _parse_date_string(obj)
 
 
 def parse_datetime(obj):
@@ -110,14 +206,79 @@ def parse_datetime(obj):
     -------
 
     datetime.datetime
+
+
+    Notes
+    -----
+
+    Strings in the ISO 8601 shapes used by ESI and the client are
+    parsed directly, and other strings by dateutil. Recent results
+    are cached. As for naive datetimes, naive strings are taken to be
+    in local time.
     """
     if isinstance(obj, datetime.datetime):
         dt = obj
+    elif isinstance(obj, str):
+        return _parse_datetime_string(obj)
     else:
         dt = parser.parse(obj)
     return dt.astimezone(pytz.utc)
 
 
+def parse_datetime_array(values, unit='s'):
+    """Convert a sequence of datetime-like values to datetime64.
+
+    Strings in the ISO 8601 shapes used by ESI and the client, with a
+    'Z' suffix or no offset, are converted by NumPy in one pass;
+    other values go through dateutil (or are used as is if they are
+    datetimes).
+
+
+    Parameters
+    ----------
+
+    values : sequence of str or datetime.datetime
+
+    unit : str, optional
+        Unit of the datetime64 values, e.g. 's' or 'ms'.
+
+
+    Returns
+    -------
+
+    numpy.ndarray
+        Naive UTC datetime64 values.
+
+
+    Notes
+    -----
+
+    Unlike `parse_datetime`, naive values are taken to be in UTC (as
+    EVE time is).
+    """
+    dtype = 'datetime64[{}]'.format(unit)
+    values = list(values)
+    if not values:
+        return np.array([], dtype=dtype)
+    if set(map(type, values)) == {str}:
+        # Check the shape of every string with one match over the
+        # whole column, rather than one per value.
+        text = '\n'.join(values) + '\n'
+        if _ISO_COLUMN_PATTERN.fullmatch(text):
+            strings = text.replace('Z\n', '\n')[:-1].split('\n')
+            return np.array(strings, dtype=dtype)
+
+    def to_naive_utc(value):
+        if isinstance(value, str):
+            value = _parse_iso(value) or parser.parse(value)
+        if value.tzinfo is not None:
+            value = value.astimezone(pytz.utc).replace(tzinfo=None)
+        return value
+
+    return np.array([np.datetime64(to_naive_utc(value), unit)
+                     for value in values], dtype=dtype)
+
+
 def parse_epoch_timestamp(timestamp):
     """Convert seconds or milliseconds since epoch to UTC datetime.
 
@@ -0,0 +1,399 @@
+"""Ingestion of market exports from the client's Marketlogs folder.
+
+`MarketLogWatcher` tails the folder the client exports market data
+to (see `local.MarketLogFile`), parses each regional export as it is
+written and pushes its orders into a `market.Market`, with the export
+time as the snapshot time. Exports already ingested are recorded in a
+persistent `ExportIndex` so they are not parsed again after a
+restart.
+
+Changes are picked up with inotify where the optional
+`inotify_simple` package is available (Linux), and by polling the
+folder otherwise.
+"""
+import csv
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pytz
+
+from . import local, market, static
+from . import LoggingObject, USER_DATA_DIR
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+class ExportIndex(object):
+    """Persistent record of the export files already ingested.
+
+    Each file is recorded by name with the number of bytes ingested
+    (its size), its modification time and a fingerprint of its
+    content. A file is known if its size and modification time are
+    unchanged, which costs a `stat`; if only its modification time
+    differs (e.g. it was copied), its fingerprint is compared.
+    Changes are held in memory until `save`; `modified` tells if
+    there are any.
+    """
+
+    # Bytes at the start of a file hashed for its fingerprint; the
+    # header and first orders of an export.
+    _fingerprint_size = 4096
+
+    def __init__(self, path=None):
+        """
+        Parameters
+        ----------
+
+        path : str, optional
+            Location of the index (JSON) file. Defaults to
+            'marketlogs.index.json' in the user data directory.
+        """
+        if path is None:
+            path = os.path.join(USER_DATA_DIR, 'marketlogs.index.json')
+        self.path = path
+        self.modified = False
+        try:
+            with open(path, 'r') as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def is_ingested(self, path, stat=None):
+        """Whether the file at `path` has been ingested as it is."""
+        entry = self._entries.get(os.path.basename(path))
+        if entry is None:
+            return False
+        if stat is None:
+            stat = os.stat(path)
+        if entry['offset'] != stat.st_size:
+            return False
+        if entry['mtime_ns'] == stat.st_mtime_ns:
+            return True
+        if entry['fingerprint'] == self.fingerprint(path):
+            entry['mtime_ns'] = stat.st_mtime_ns
+            self.modified = True
+            return True
+        return False
+
+    def mark(self, path, stat, offset):
+        """Record a file as ingested up to byte `offset`."""
+        self._entries[os.path.basename(path)] = {
+            'offset': offset,
+            'mtime_ns': stat.st_mtime_ns,
+            'fingerprint': self.fingerprint(path),
+        }
+        self.modified = True
+
+    def prune(self, names):
+        """Forget the files not in `names`, e.g. deleted exports."""
+        names = set(names)
+        for name in list(self._entries):
+            if name not in names:
+                del self._entries[name]
+                self.modified = True
+
+    def save(self):
+        """Write the index to disk, atomically."""
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+        self.modified = False
+
+    @classmethod
+    def fingerprint(cls, path):
+        """Hash of the start of a file."""
+        with open(path, 'rb') as f:
+            head = f.read(cls._fingerprint_size)
+        return hashlib.blake2b(head, digest_size=16).hexdigest()
+
+
+class MarketLogWatcher(LoggingObject):
+    """Tails the client's Marketlogs folder into a market.
+
+    Regional market exports ('<region>-<item>-<time>.txt') are parsed
+    incrementally as they grow. An export is ingested, replacing the
+    orders of its type in its region, once it is complete: when the
+    client closes it (with inotify) or when it has not changed for
+    `settle` seconds. Exports last modified `settle` seconds ago or
+    more are ingested as soon as they are read, so a backlog of old
+    exports is ingested file by file rather than held in memory.
+
+    Other files (e.g. 'My Orders' exports) are ignored, as are exports
+    with rows that can't be parsed; these are logged and retried only
+    if they change. The index is saved once per scan (or batch of
+    inotify events).
+    """
+
+    def __init__(self, market=None, directory=None, index=None,
+                 esd=None, settle=2.0, poll_interval=1.0,
+                 use_inotify=True):
+        """
+        Parameters
+        ----------
+
+        market : market.Market, optional
+            Market to ingest into. Defaults to `market.global_market`.
+
+        directory : str, optional
+            Folder to watch. Defaults to the client's Marketlogs
+            folder, as for `local.MarketLogFile`.
+
+        index : ExportIndex, optional
+            Record of the exports already ingested. Defaults to the
+            index in the user data directory.
+
+        esd : static.EveStaticData, optional
+            Used to identify the region and type of empty exports by
+            name. Defaults to `static.global_esd`.
+
+        settle : float, optional
+            Seconds without change after which an export being
+            polled is taken to be complete.
+
+        poll_interval : float, optional
+            Seconds between polls (or checks for `stop` with inotify).
+
+        use_inotify : bool, optional
+            Use inotify if `inotify_simple` is available.
+        """
+        self._market = market
+        self.directory = directory or local.MarketLogFile._DIR
+        self.index = index if index is not None else ExportIndex()
+        self._esd = esd
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and inotify_simple is not None
+        # path: _ExportTail
+        self._tails = {}
+        self._stopping = threading.Event()
+        self.stats = {'files': 0, 'orders': 0}
+
+    @property
+    def market(self):
+        return self._market or market.global_market
+
+    @property
+    def esd(self):
+        # Resolved late so tests may swap out the global instance.
+        return self._esd or static.global_esd
+
+    def run(self):
+        """Ingest exports, then watch for more until `stop`."""
+        self._stopping.clear()
+        self.scan()
+        if self.use_inotify:
+            self._watch_inotify()
+        else:
+            self._watch_polling()
+
+    def stop(self):
+        """Stop `run`, e.g. from another thread."""
+        self._stopping.set()
+
+    def scan(self):
+        """Check every file in the folder once.
+
+        New and grown exports are parsed and those now complete are
+        ingested. Returns the number of exports ingested.
+        """
+        names = os.listdir(self.directory)
+        ingested = sum(self._update(os.path.join(self.directory, name))
+                       for name in sorted(names))
+        ingested += self._ingest_settled()
+        self.index.prune(names)
+        self._save_index()
+        return ingested
+
+    def _watch_polling(self):
+        while not self._stopping.wait(self.poll_interval):
+            self.scan()
+
+    def _watch_inotify(self):
+        flags = inotify_simple.flags
+        with inotify_simple.INotify() as inotify:
+            inotify.add_watch(self.directory,
+                              flags.CREATE | flags.MODIFY
+                              | flags.CLOSE_WRITE | flags.MOVED_TO)
+            while not self._stopping.is_set():
+                timeout = int(self.poll_interval * 1000)
+                for event in inotify.read(timeout=timeout):
+                    closed = event.mask & (flags.CLOSE_WRITE
+                                           | flags.MOVED_TO)
+                    self._update(
+                        os.path.join(self.directory, event.name),
+                        complete=bool(closed)
+                    )
+                # In case a close was missed.
+                self._ingest_settled()
+                self._save_index()
+
+    def _save_index(self):
+        if self.index.modified:
+            self.index.save()
+
+    def _update(self, path, complete=False):
+        # Parse any growth of an export, ingesting it if complete (or
+        # unmodified for `settle` seconds). Returns whether it was
+        # ingested.
+        export = local.parse_export_name(os.path.basename(path))
+        if export is None or export[0] == local.PERSONAL_ORDERS:
+            return False
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._tails.pop(path, None)
+            return False
+
+        tail = self._tails.get(path)
+        if tail is None or stat.st_size < tail.offset:
+            # New, or rewritten.
+            if self.index.is_ingested(path, stat):
+                self._tails.pop(path, None)
+                return False
+            names, t = export
+            if t is None:
+                # No valid time in the name; use the modification time.
+                t = datetime.datetime.fromtimestamp(stat.st_mtime,
+                                                    pytz.utc)
+            tail = self._tails[path] = _ExportTail(path, names, t)
+        tail.stat = stat
+        if stat.st_size > tail.offset and stat.st_size != tail.failed_size:
+            try:
+                tail.read()
+            except local.PARSE_ERRORS as exc:
+                self._log.warning('Failed to parse %s: %r', path, exc)
+        if complete or time.time() - stat.st_mtime >= self.settle:
+            return self._ingest(tail)
+        return False
+
+    def _ingest_settled(self):
+        now = time.monotonic()
+        settled = [tail for tail in self._tails.values()
+                   if now - tail.changed >= self.settle]
+        return sum(self._ingest(tail) for tail in settled)
+
+    def _ingest(self, tail):
+        # Returns whether the export's orders were ingested.
+        del self._tails[tail.path]
+        if tail.failed_size is None:
+            try:
+                tail.finish()
+            except local.PARSE_ERRORS as exc:
+                self._log.warning('Failed to parse %s: %r', tail.path,
+                                  exc)
+        if tail.failed_size is not None:
+            # Never ingest a partly parsed export, which would replace
+            # the stored orders with an incomplete set. It is recorded
+            # as it is so it is only retried if it changes.
+            self._log.warning('Skipped %s: unparseable rows', tail.path)
+            self.index.mark(tail.path, tail.stat, tail.stat.st_size)
+            return False
+        region_id, type_id = tail.region_id, tail.type_id
+        if region_id is None:
+            region_id, type_id = self._identify(tail.names)
+        if region_id is not None:
+            self.market.ingest(region_id, tail.records, tail.t, type_id)
+            self.stats['files'] += 1
+            self.stats['orders'] += len(tail.records)
+            self._log.debug('Ingested %d orders from %s',
+                            len(tail.records), tail.path)
+        else:
+            self._log.warning('Skipped %s: unknown region or type',
+                              tail.path)
+        self.index.mark(tail.path, tail.stat, tail.offset)
+        return region_id is not None
+
+    def _identify(self, names):
+        # (region_id, type_id) from '<region>-<item>' names, which may
+        # themselves contain hyphens, or (None, None).
+        for i, char in enumerate(names):
+            if char != '-':
+                continue
+            try:
+                return (self.esd.get_id('region', names[:i]),
+                        self.esd.get_id('market_type', names[i + 1:]))
+            except ValueError:
+                continue
+        return None, None
+
+
+class _ExportTail(object):
+    # Parser state of an export being written.
+    #
+    # Complete lines are parsed as they are appended; a trailing
+    # partial line is held until the rest arrives (or the export is
+    # finished). If the lines read can't be parsed, the state is left
+    # as it was before the read and the size of the file read is kept
+    # in `failed_size`.
+
+    def __init__(self, path, names, t):
+        self.path = path
+        self.names = names
+        self.t = t
+        self.offset = 0
+        self.stat = None
+        self.changed = time.monotonic()
+        self.records = []
+        self.region_id = self.type_id = None
+        self.failed_size = None
+        self._partial = b''
+        self._parse = None
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read()
+            self.stat = os.fstat(f.fileno())
+        self.changed = time.monotonic()
+        lines = (self._partial + chunk).split(b'\n')
+        partial = lines.pop()
+        try:
+            self._parse_lines(lines)
+        except local.PARSE_ERRORS:
+            self.failed_size = self.offset + len(chunk)
+            raise
+        self.failed_size = None
+        self.offset += len(chunk)
+        self._partial = partial
+
+    def finish(self):
+        if self._partial:
+            try:
+                self._parse_lines([self._partial])
+            except local.PARSE_ERRORS:
+                self.failed_size = self.offset
+                raise
+            self._partial = b''
+
+    def _parse_lines(self, lines):
+        # Parse into local state, only kept if every line parses.
+        lines = [line.rstrip(b'\r').decode('utf-8')
+                 for line in lines if line.strip()]
+        parse = self._parse
+        region_id, type_id = self.region_id, self.type_id
+        records = []
+        for row in csv.reader(lines):
+            if parse is None:
+                parse = local.MarketLogFile.record_parser(row)
+                continue
+            data = parse(row)
+            region_id = data['region_id']
+            type_id = data['type_id']
+            records.append(local.esi_record(data))
+        self._parse = parse
+        self.region_id, self.type_id = region_id, type_id
+        self.records.extend(records)